@@ -7,7 +7,10 @@ from airport.models import (
     Airport,
     Route,
     Flight,
+    FlightCrew,
+    FlightSchedule,
     Order,
+    OrderJob,
     Ticket,
 )
 
@@ -48,9 +51,33 @@ class RouteAdmin(admin.ModelAdmin):
     list_display = ("source", "destination")
 
 
+class FlightCrewInline(admin.TabularInline):
+    model = FlightCrew
+    extra = 1
+
+
 @admin.register(Flight)
 class FlightAdmin(admin.ModelAdmin):
     list_display = ("route", "airplane", "departure_time", "arrival_time")
+    inlines = (FlightCrewInline,)
+
+
+@admin.register(FlightSchedule)
+class FlightScheduleAdmin(admin.ModelAdmin):
+    list_display = (
+        "route",
+        "airplane",
+        "weekdays",
+        "departure_time",
+        "valid_from",
+        "valid_until",
+    )
+
+
+@admin.register(OrderJob)
+class OrderJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "flight", "status", "created_at")
+    list_filter = ("status",)
 
 
 admin.site.register(Ticket)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AirportConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "airport"
+
+    def ready(self):
+        import airport.checks  # noqa: F401
+        import airport.signals  # noqa: F401
@@ -0,0 +1,131 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from airport.views import (
+    AirplaneViewSet,
+    AirportViewSet,
+    CrewViewSet,
+    RouteViewSet,
+)
+
+
+class AsyncReadOnlyView:
+    """Async list and retrieve of a read-mostly viewset.
+
+    The authentication, permissions, throttling and filters of the
+    viewset run in one short sync_to_async() call, while the count and
+    the page are loaded with the async ORM and the response is rendered
+    on the event loop, so a slow client does not hold a worker thread.
+    """
+
+    def __init__(self, viewset_class):
+        self.viewset_class = viewset_class
+
+    def get_view(self, request, action, **kwargs):
+        view = self.viewset_class(
+            action_map={"get": action},
+            args=(),
+            kwargs=kwargs,
+            format_kwarg=None,
+            # The browsable API renderer would query the database
+            renderer_classes=(JSONRenderer,),
+        )
+        view.request = view.initialize_request(request, **kwargs)
+        view.headers = view.default_response_headers
+        return view
+
+    @staticmethod
+    def get_filtered_queryset(view):
+        view.initial(view.request)
+        return view.filter_queryset(view.get_queryset())
+
+    @staticmethod
+    def finalize_response(view, response):
+        response = view.finalize_response(view.request, response)
+        response.render()
+        return response
+
+    async def paginate_queryset(self, view, queryset):
+        paginator = view.paginator
+        page_size = paginator.get_page_size(view.request)
+        django_paginator = paginator.django_paginator_class(
+            queryset,
+            page_size,
+        )
+        django_paginator.count = await queryset.acount()
+        page_number = view.request.query_params.get(
+            paginator.page_query_param,
+            1,
+        )
+
+        if page_number in paginator.last_page_strings:
+            page_number = django_paginator.num_pages
+
+        try:
+            page = django_paginator.page(page_number)
+        except InvalidPage as error:
+            raise NotFound(
+                paginator.invalid_page_message.format(
+                    page_number=page_number,
+                    message=str(error),
+                )
+            )
+
+        page.object_list = [obj async for obj in page.object_list]
+        paginator.page = page
+        paginator.request = view.request
+        return page.object_list
+
+    async def list(self, request):
+        view = self.get_view(request, "list")
+
+        try:
+            if request.method != "GET":
+                view.http_method_not_allowed(request)
+
+            queryset = await sync_to_async(self.get_filtered_queryset)(view)
+
+            if view.paginator is None:
+                objects = [obj async for obj in queryset]
+            else:
+                objects = await self.paginate_queryset(view, queryset)
+
+            data = view.get_serializer(objects, many=True).data
+
+            if view.paginator is None:
+                response = Response(data)
+            else:
+                response = view.paginator.get_paginated_response(data)
+        except Exception as error:
+            response = view.handle_exception(error)
+
+        return self.finalize_response(view, response)
+
+    async def retrieve(self, request, pk):
+        view = self.get_view(request, "retrieve", pk=pk)
+
+        try:
+            if request.method != "GET":
+                view.http_method_not_allowed(request)
+
+            queryset = await sync_to_async(self.get_filtered_queryset)(view)
+            instance = await queryset.filter(pk=pk).afirst()
+
+            if instance is None:
+                raise NotFound()
+
+            view.check_object_permissions(view.request, instance)
+            response = Response(view.get_serializer(instance).data)
+        except Exception as error:
+            response = view.handle_exception(error)
+
+        return self.finalize_response(view, response)
+
+
+airplane_view = AsyncReadOnlyView(AirplaneViewSet)
+crew_view = AsyncReadOnlyView(CrewViewSet)
+airport_view = AsyncReadOnlyView(AirportViewSet)
+route_view = AsyncReadOnlyView(RouteViewSet)
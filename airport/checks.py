@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_MEMORY_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The seat holds must be seen by every process serving the API"""
+    if settings.CACHES["default"]["BACKEND"] != LOCAL_MEMORY_CACHE:
+        return []
+
+    return [
+        Warning(
+            "The default cache is local to each process, so a seat hold "
+            "is not seen by the other processes serving the API.",
+            hint="Set CACHE_BACKEND to a shared cache, such as "
+            "django.core.cache.backends.redis.RedisCache, when running "
+            "more than one process.",
+            id="airport.W001",
+        )
+    ]
@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from airport.models import Flight
+
+Leg = namedtuple(
+    "Leg",
+    ["id", "source", "destination", "departure", "arrival", "seats"],
+)
+
+
+class ConnectionIndex:
+    """Upcoming flights of the whole route graph kept in memory: the
+    departures of every airport are sorted by time, so finding the next
+    connections from an airport is a binary search instead of a query"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.legs = {}
+        self.departures = defaultdict(list)
+        self.built_at = None
+        self.horizon = None
+
+    @staticmethod
+    def upcoming_flights(horizon):
+        """The flights that have not departed yet, up to the horizon"""
+        return Flight.objects.filter(
+            departure_time__gte=timezone.now(),
+            departure_time__lte=horizon,
+        )
+
+    @staticmethod
+    def query_legs(flights):
+        return flights.values_list(
+            "id",
+            "route__source_id",
+            "route__destination_id",
+            "departure_time",
+            "arrival_time",
+            "seats_available",
+        ).order_by()
+
+    def build(self):
+        horizon = timezone.now() + timedelta(
+            days=settings.CONNECTION_INDEX_HORIZON_DAYS
+        )
+        legs = {}
+        departures = defaultdict(list)
+
+        for leg in self.query_legs(self.upcoming_flights(horizon)).iterator(
+            chunk_size=10000
+        ):
+            leg = Leg(*leg)
+            legs[leg.id] = leg
+            departures[leg.source].append((leg.departure, leg.id))
+
+        for airport_departures in departures.values():
+            airport_departures.sort()
+
+        with self.lock:
+            self.legs = legs
+            self.departures = departures
+            self.horizon = horizon
+            self.built_at = time.monotonic()
+
+    def is_stale(self):
+        return (
+            not self.is_built()
+            or time.monotonic() - self.built_at
+            > settings.CONNECTION_INDEX_TTL
+        )
+
+    def remove_flight(self, flight_id):
+        with self.lock:
+            leg = self.legs.pop(flight_id, None)
+
+            if leg is not None:
+                airport_departures = self.departures[leg.source]
+                airport_departures.pop(
+                    bisect_left(airport_departures, (leg.departure, leg.id))
+                )
+
+    def update_flight(self, flight_id):
+        """Reload the flight from the database, as the saved instance may
+        still hold its times as strings and an unloaded route"""
+        leg = self.query_legs(
+            self.upcoming_flights(self.horizon).filter(pk=flight_id)
+        ).first()
+
+        with self.lock:
+            self.remove_flight(flight_id)
+
+            if leg is not None:
+                leg = Leg(*leg)
+                self.legs[leg.id] = leg
+                insort(self.departures[leg.source], (leg.departure, leg.id))
+
+    def is_built(self):
+        return self.built_at is not None
+
+    def invalidate(self):
+        self.built_at = None
+
+    def update_seats(self, flight_id, seats_available):
+        with self.lock:
+            if flight_id in self.legs:
+                self.legs[flight_id] = self.legs[flight_id]._replace(
+                    seats=seats_available
+                )
+
+    def departing_between(self, airport_id, earliest, latest):
+        airport_departures = self.departures.get(airport_id, [])
+        index = bisect_left(airport_departures, (earliest,))
+
+        while (
+            index < len(airport_departures)
+            and airport_departures[index][0] <= latest
+        ):
+            yield self.legs[airport_departures[index][1]]
+            index += 1
+
+    def search(
+        self,
+        source_id,
+        destination_id,
+        departure_after,
+        departure_before,
+        max_legs,
+        min_connection,
+        max_connection,
+        seats,
+        limit,
+    ):
+        """Return up to `limit` itineraries (tuples of flight ids) from
+        the source to the destination airport in the order of arrival.
+
+        This is a time-dependent Dijkstra search keeping the `limit`
+        earliest arrivals at every airport, so it finds the k earliest
+        arriving itineraries without exploring the whole graph.
+        """
+        itineraries = []
+
+        with self.lock:
+            order = itertools.count()
+            queue = [
+                (leg.arrival, next(order), (leg,))
+                for leg in self.departing_between(
+                    source_id,
+                    departure_after,
+                    departure_before,
+                )
+                if leg.seats >= seats and leg.destination != source_id
+            ]
+            heapq.heapify(queue)
+            expanded = defaultdict(int)
+
+            while queue and len(itineraries) < limit:
+                arrival, _, path = heapq.heappop(queue)
+                airport_id = path[-1].destination
+
+                if airport_id == destination_id:
+                    itineraries.append(tuple(leg.id for leg in path))
+                    continue
+
+                if len(path) == max_legs or expanded[airport_id] >= limit:
+                    continue
+
+                expanded[airport_id] += 1
+                visited = {source_id} | {leg.destination for leg in path}
+
+                for leg in self.departing_between(
+                    airport_id,
+                    arrival + min_connection,
+                    arrival + max_connection,
+                ):
+                    if leg.seats >= seats and leg.destination not in visited:
+                        heapq.heappush(
+                            queue,
+                            (leg.arrival, next(order), path + (leg,)),
+                        )
+
+        return itineraries
+
+
+connection_index = ConnectionIndex()
+
+
+def get_connection_index():
+    if connection_index.is_stale():
+        connection_index.build()
+
+    return connection_index
+
+
+def find_connections(seats, **search):
+    """Search the index and drop the itineraries that no longer have
+    enough seats, checking the counters of all their flights at once"""
+    itineraries = get_connection_index().search(seats=seats, **search)
+    seats_available = dict(
+        Flight.objects.filter(
+            id__in={flight_id for path in itineraries for flight_id in path}
+        ).values_list("id", "seats_available")
+    )
+
+    return [
+        path
+        for path in itineraries
+        if all(
+            seats_available.get(flight_id, 0) >= seats for flight_id in path
+        )
+    ]
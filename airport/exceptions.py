@@ -0,0 +1,15 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException, ErrorDetail
+
+
+class SeatsTaken(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Some of the requested seats are already taken."
+    default_code = "seats_taken"
+
+    def __init__(self, taken_seats, suggested_seats):
+        self.detail = {
+            "detail": ErrorDetail(self.default_detail, self.default_code),
+            "taken_seats": taken_seats,
+            "suggested_seats": suggested_seats,
+        }
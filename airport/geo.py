@@ -0,0 +1,36 @@
+import numpy as np
+
+# Earth radius in kilometers
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(src_lat, src_long, dst_lat, dst_long):
+    """Great-circle distances in kilometers between the coordinates
+    (in degrees) of the source and destination arrays, element-wise"""
+    src_lat, src_long, dst_lat, dst_long = (
+        np.radians(np.asarray(coordinates, dtype=np.float64))
+        for coordinates in (src_lat, src_long, dst_lat, dst_long)
+    )
+
+    a = (
+        np.sin((dst_lat - src_lat) / 2) ** 2
+        + np.cos(src_lat)
+        * np.cos(dst_lat)
+        * np.sin((dst_long - src_long) / 2) ** 2
+    )
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(latitudes, longitudes):
+    """Square matrix of the distances in kilometers between all pairs
+    of the coordinates (in degrees), broadcast from one haversine"""
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    return haversine_km(
+        latitudes[:, np.newaxis],
+        longitudes[:, np.newaxis],
+        latitudes[np.newaxis, :],
+        longitudes[np.newaxis, :],
+    )
@@ -0,0 +1,130 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+def seat_hold_key(flight_id, row, seat):
+    return f"seat-hold:{flight_id}:{row}:{seat}"
+
+
+def hold_key(hold_id):
+    return f"hold:{hold_id}"
+
+
+def user_hold_slot_key(user_id, slot):
+    return f"user-hold-slot:{user_id}:{slot}"
+
+
+class HoldLimitReached(Exception):
+    """The user already has SEAT_HOLD_MAX_PER_USER active holds"""
+
+
+def take_user_hold_slot(user_id, hold_id, timeout):
+    """Take one of the SEAT_HOLD_MAX_PER_USER slots of the user for the hold,
+    expiring along with it, and return its number, or None if all of them
+    are taken by the other active holds of the user"""
+    for slot in range(settings.SEAT_HOLD_MAX_PER_USER):
+        if cache.add(user_hold_slot_key(user_id, slot), hold_id, timeout):
+            return slot
+
+    return None
+
+
+def create_hold(user_id, flight_id, seats):
+    """Hold all the (row, seat) pairs of the flight or none of them.
+
+    Return the hold and an empty list, or None and the seats
+    that are already held by somebody else. Raise HoldLimitReached
+    if the user cannot hold any more seats until a hold is released.
+    """
+    hold_id = uuid.uuid4().hex
+    timeout = settings.SEAT_HOLD_TTL
+    slot = take_user_hold_slot(user_id, hold_id, timeout)
+
+    if slot is None:
+        raise HoldLimitReached()
+
+    held_seats = []
+    taken_seats = []
+
+    for row, seat in seats:
+        # Expired holds are evicted by the cache itself,
+        # so their seats can be added again.
+        if cache.add(seat_hold_key(flight_id, row, seat), hold_id, timeout):
+            held_seats.append((row, seat))
+        else:
+            taken_seats.append((row, seat))
+
+    if taken_seats:
+        cache.delete_many(
+            [seat_hold_key(flight_id, row, seat) for row, seat in held_seats]
+            + [user_hold_slot_key(user_id, slot)]
+        )
+        return None, taken_seats
+
+    hold = {
+        "id": hold_id,
+        "user": user_id,
+        "flight": flight_id,
+        "slot": slot,
+        "seats": [{"row": row, "seat": seat} for row, seat in held_seats],
+        "expires_at": timezone.now() + timedelta(seconds=timeout),
+    }
+    cache.set(hold_key(hold_id), hold, timeout)
+    return hold, []
+
+
+def get_hold(hold_id):
+    return cache.get(hold_key(hold_id))
+
+
+def get_seat_holders(flight_id, seats):
+    """Map the held (row, seat) pairs of the flight to their hold ids"""
+    keys = {
+        seat_hold_key(flight_id, row, seat): (row, seat)
+        for row, seat in seats
+    }
+    return {
+        keys[key]: hold_id
+        for key, hold_id in cache.get_many(list(keys)).items()
+    }
+
+
+def get_held_seats(flight_id, seat_map, except_hold_id=None):
+    """Return the free (row, seat) pairs of the flight that are held"""
+    seat_holders = get_seat_holders(
+        flight_id,
+        [
+            (row, seat)
+            for row in range(1, seat_map.rows + 1)
+            for seat in range(1, seat_map.seats_in_row + 1)
+            if not seat_map.is_taken(row, seat)
+        ],
+    )
+    return {
+        seat
+        for seat, hold_id in seat_holders.items()
+        if hold_id != except_hold_id
+    }
+
+
+def release_hold(hold):
+    seat_holders = get_seat_holders(
+        hold["flight"],
+        [(seat["row"], seat["seat"]) for seat in hold["seats"]],
+    )
+    slot_key = user_hold_slot_key(hold["user"], hold["slot"])
+    # The slot may have expired and been taken by another hold of the user
+    slot_keys = [slot_key] if cache.get(slot_key) == hold["id"] else []
+    cache.delete_many(
+        [
+            seat_hold_key(hold["flight"], row, seat)
+            for (row, seat), hold_id in seat_holders.items()
+            if hold_id == hold["id"]
+        ]
+        + [hold_key(hold["id"])]
+        + slot_keys
+    )
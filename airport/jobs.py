@@ -0,0 +1,125 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction, DatabaseError
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from airport.models import OrderJob
+from airport.serializers import OrderSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def claim_order_jobs(batch_size, stale_after):
+    """Claim the oldest pending jobs of one flight for this worker.
+
+    Jobs locked by another worker are skipped, and jobs that have been
+    processing for longer than stale_after are claimed again.
+    """
+    claimable_jobs = OrderJob.objects.filter(
+        status=OrderJob.JobStatus.PENDING,
+    ) | OrderJob.objects.filter(
+        status=OrderJob.JobStatus.PROCESSING,
+        started_at__lt=timezone.now() - stale_after,
+    )
+
+    with transaction.atomic():
+        first_job = (
+            claimable_jobs
+            .select_for_update(skip_locked=True)
+            .order_by("id")
+            .first()
+        )
+
+        if first_job is None:
+            return []
+
+        jobs = list(
+            claimable_jobs
+            .filter(flight_id=first_job.flight_id)
+            .select_for_update(skip_locked=True, of=("self",))
+            .select_related("user")
+            .order_by("id")[:batch_size]
+        )
+        started_at = timezone.now()
+        OrderJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=OrderJob.JobStatus.PROCESSING,
+            started_at=started_at,
+        )
+
+    for job in jobs:
+        job.status = OrderJob.JobStatus.PROCESSING
+        job.started_at = started_at
+
+    return jobs
+
+
+class JobReclaimed(Exception):
+    """The job has been claimed again by another worker"""
+
+
+def finish_job(job, **fields):
+    """Save the final state of the job unless it has been claimed again
+    or finished by another worker since this worker claimed it"""
+    return bool(
+        OrderJob.objects.filter(
+            pk=job.pk,
+            status=OrderJob.JobStatus.PROCESSING,
+            started_at=job.started_at,
+        ).update(processed_at=timezone.now(), **fields)
+    )
+
+
+def process_order_job(job):
+    serializer = OrderSerializer(
+        data=job.payload,
+        context={"user": job.user},
+    )
+
+    try:
+        # The order and the job result are committed together,
+        # so a job claimed again after a crash cannot book twice
+        with transaction.atomic():
+            serializer.is_valid(raise_exception=True)
+            order = serializer.save(user=job.user)
+
+            if not finish_job(
+                job,
+                status=OrderJob.JobStatus.SUCCEEDED,
+                order=order,
+                result=serializer.data,
+            ):
+                # The order is booked by the worker that owns the job now
+                raise JobReclaimed()
+    except APIException as error:
+        save_failed_job(job, error.detail)
+    except JobReclaimed:
+        pass
+    except Exception:
+        # An unexpected error, ex. a deadlock, fails the job instead of
+        # stopping the worker and leaving the job to be claimed forever
+        logger.exception("The order job %s failed.", job.pk)
+
+        try:
+            save_failed_job(
+                job,
+                {"detail": "The order could not be processed."},
+            )
+        except DatabaseError:
+            # The job is claimed again once stale
+            logger.exception("The order job %s could not be saved.", job.pk)
+
+
+def save_failed_job(job, errors):
+    return finish_job(job, status=OrderJob.JobStatus.FAILED, result=errors)
+
+
+def process_order_jobs(batch_size=50, stale_after=timedelta(minutes=5)):
+    """Process one batch of jobs and return the number of processed jobs"""
+    jobs = claim_order_jobs(batch_size, stale_after)
+
+    for job in jobs:
+        process_order_job(job)
+
+    return len(jobs)
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from airport.models import Flight
+
+
+def find_conflicts(assignments):
+    """Sweep the (resource id, flight id, departure, arrival) rows sorted
+    by resource and departure, yielding (resource id, earlier flight id,
+    flight id) for every flight departing before the latest arrival of
+    the earlier flights of the same resource"""
+    resource_id = latest_flight_id = latest_arrival = None
+
+    for (
+        flight_resource_id,
+        flight_id,
+        departure_time,
+        arrival_time,
+    ) in assignments:
+        if flight_resource_id != resource_id:
+            resource_id = flight_resource_id
+            latest_flight_id = latest_arrival = None
+
+        if latest_arrival is not None and departure_time < latest_arrival:
+            yield resource_id, latest_flight_id, flight_id
+
+        if latest_arrival is None or arrival_time > latest_arrival:
+            latest_flight_id, latest_arrival = flight_id, arrival_time
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the airplanes and crew members assigned "
+        "to overlapping flights across the whole schedule"
+    )
+
+    def handle(self, *args, **options):
+        airplane_assignments = (
+            Flight.objects.values_list(
+                "airplane_id",
+                "id",
+                "departure_time",
+                "arrival_time",
+            )
+            .order_by("airplane_id", "departure_time", "id")
+            .iterator(chunk_size=10000)
+        )
+        crew_assignments = (
+            Flight.crews.through.objects.values_list(
+                "crew_id",
+                "flight_id",
+                "flight__departure_time",
+                "flight__arrival_time",
+            )
+            .order_by("crew_id", "flight__departure_time", "flight_id")
+            .iterator(chunk_size=10000)
+        )
+        conflicts = 0
+
+        for resource_name, assignments in (
+            ("Airplane", airplane_assignments),
+            ("Crew member", crew_assignments),
+        ):
+            for resource_id, flight_id, other_flight_id in find_conflicts(
+                assignments
+            ):
+                conflicts += 1
+                self.stdout.write(
+                    f"{resource_name} {resource_id}: flights {flight_id} "
+                    f"and {other_flight_id} overlap."
+                )
+
+        style = self.style.WARNING if conflicts else self.style.SUCCESS
+        self.stdout.write(style(f"Found {conflicts} conflicts."))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from airport.models import Route
+from airport.response_cache import response_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored distances of all routes from the coordinates "
+        "of their airports and save the ones that have changed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of routes saved per query.",
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.perf_counter()
+        updated = Route.update_distances(
+            Route.objects.all(),
+            batch_size=options["batch_size"],
+        )
+
+        if updated:
+            # bulk_update() sends no signals to invalidate the responses
+            response_cache.invalidate(Route)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {updated} route distances in "
+                f"{time.perf_counter() - started_at:.2f}s."
+            )
+        )
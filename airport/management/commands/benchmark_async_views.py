@@ -0,0 +1,131 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from airport.urls import async_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the requests per second of the sync and the async "
+        "list endpoints of the reference data, served in-process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "resources",
+            nargs="*",
+            help="The resources to benchmark: "
+            f"{', '.join(prefix for prefix, _, _ in async_views)} "
+            "(all by default).",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="The number of requests per endpoint.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=20,
+            help="The number of requests in flight at the same time.",
+        )
+        parser.add_argument(
+            "--email",
+            help="The email of the user making the requests "
+            "(the first active user by default).",
+        )
+
+    # The test clients send requests to the "testserver" host
+    @override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+
+        if options["email"]:
+            users = users.filter(email=options["email"])
+
+        user = users.order_by("id").first()
+
+        if user is None:
+            raise CommandError("There is no active user to make requests.")
+
+        unknown_resources = set(options["resources"]) - {
+            prefix for prefix, _, _ in async_views
+        }
+
+        if unknown_resources:
+            raise CommandError(
+                f"Unknown resources: {', '.join(sorted(unknown_resources))}."
+            )
+
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+        for prefix, basename, view in async_views:
+            if options["resources"] and prefix not in options["resources"]:
+                continue
+
+            viewset_class = view.viewset_class
+            throttle_classes = viewset_class.throttle_classes
+            # The benchmark would only measure the throttling otherwise
+            viewset_class.throttle_classes = ()
+
+            try:
+                sync_rate = self.benchmark_sync(
+                    reverse(f"airport:{basename}-list"),
+                    headers,
+                    options["requests"],
+                    options["concurrency"],
+                )
+                async_rate = asyncio.run(
+                    self.benchmark_async(
+                        reverse(f"airport:async-{basename}-list"),
+                        headers,
+                        options["requests"],
+                        options["concurrency"],
+                    )
+                )
+            finally:
+                viewset_class.throttle_classes = throttle_classes
+
+            self.stdout.write(
+                f"{prefix}: sync {sync_rate:.1f} req/s, "
+                f"async {async_rate:.1f} req/s "
+                f"({async_rate / sync_rate:.2f}x)."
+            )
+
+    def check_response(self, response):
+        if response.status_code != 200:
+            raise CommandError(
+                f"The benchmark request failed with {response.status_code}."
+            )
+
+    def benchmark_sync(self, url, headers, requests, concurrency):
+        def get(_):
+            self.check_response(Client().get(url, headers=headers))
+
+        started_at = time.perf_counter()
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(get, range(requests)))
+
+        return requests / (time.perf_counter() - started_at)
+
+    async def benchmark_async(self, url, headers, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get():
+            async with semaphore:
+                self.check_response(await client.get(url, headers=headers))
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(get() for _ in range(requests)))
+        return requests / (time.perf_counter() - started_at)
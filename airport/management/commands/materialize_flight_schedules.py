@@ -0,0 +1,53 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from airport.models import FlightSchedule
+from airport.schedules import materialize_schedule
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the missing flights of the flight schedules, "
+        "skipping the ones already created"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "schedules",
+            nargs="*",
+            type=int,
+            help="Ids of the schedules to materialize (all by default).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="The number of flights created per query.",
+        )
+
+    def handle(self, *args, **options):
+        schedules = FlightSchedule.objects.select_related("airplane")
+
+        if options["schedules"]:
+            schedules = schedules.filter(id__in=options["schedules"])
+
+        created = 0
+
+        for schedule in schedules:
+            try:
+                created += materialize_schedule(
+                    schedule,
+                    batch_size=options["batch_size"],
+                )
+            except ValidationError as error:
+                self.stderr.write(
+                    f"Skipped the schedule {schedule.id} "
+                    f"({schedule}): {' '.join(error.messages)}"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Materialized {len(schedules)} schedules: "
+                f"{created} flights created."
+            )
+        )
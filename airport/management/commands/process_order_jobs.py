@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from airport.jobs import process_order_jobs
+
+
+class Command(BaseCommand):
+    help = "Run a pool of booking workers processing the queued orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="The number of worker threads.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="The maximum number of jobs of one flight claimed at once.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1,
+            help="Seconds to wait when there are no queued orders.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=300,
+            help="Seconds after which a processing job is claimed again.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] == 1:
+            self.work(**options)
+        else:
+            workers = [
+                threading.Thread(target=self.work_in_thread, kwargs=options)
+                for _ in range(options["workers"])
+            ]
+
+            for worker in workers:
+                worker.start()
+
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS("The booking workers stopped."))
+
+    def work_in_thread(self, **options):
+        try:
+            self.work(**options)
+        finally:
+            # Every thread has its own database connection
+            connection.close()
+
+    def work(self, batch_size, sleep, stale_after, once, **options):
+        while True:
+            processed = process_order_jobs(
+                batch_size=batch_size,
+                stale_after=timedelta(seconds=stale_after),
+            )
+
+            if processed:
+                self.stdout.write(f"Processed {processed} orders.")
+            elif once:
+                break
+            else:
+                time.sleep(sleep)
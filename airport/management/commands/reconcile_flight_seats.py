@@ -0,0 +1,95 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from airport.models import Flight, Ticket
+from airport.seating import SeatMap
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the seat maps and available seat counters of flights "
+        "from their tickets and fix the ones that have drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="The number of flights checked per query.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the drifted flights.",
+        )
+
+    def handle(self, *args, **options):
+        flights = (
+            Flight.objects
+            .select_related("airplane")
+            .only(
+                "seat_map",
+                "seats_available",
+                "airplane__rows",
+                "airplane__seats_in_row",
+            )
+            .order_by("id")
+        )
+        checked = drifted = 0
+        batch = []
+
+        for flight in flights.iterator(chunk_size=options["batch_size"]):
+            batch.append(flight)
+
+            if len(batch) == options["batch_size"]:
+                drifted += self.reconcile(batch, options["dry_run"])
+                checked += len(batch)
+                batch = []
+
+        if batch:
+            drifted += self.reconcile(batch, options["dry_run"])
+            checked += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} flights: {drifted} "
+                f"{'drifted' if options['dry_run'] else 'reconciled'}."
+            )
+        )
+
+    def reconcile(self, flights, dry_run):
+        tickets_seats = defaultdict(list)
+
+        for flight_id, row, seat in Ticket.objects.filter(
+            flight__in=flights,
+        ).values_list("flight_id", "row", "seat"):
+            tickets_seats[flight_id].append((row, seat))
+
+        drifted = 0
+
+        for flight in flights:
+            seat_map = SeatMap(
+                flight.airplane.rows,
+                flight.airplane.seats_in_row,
+            )
+
+            for row, seat in tickets_seats[flight.id]:
+                if seat_map.contains(row, seat):
+                    seat_map.take(row, seat)
+
+            if (
+                bytes(flight.seat_map) == seat_map.to_bytes()
+                and flight.seats_available
+                == seat_map.capacity - seat_map.taken_count
+            ):
+                continue
+
+            drifted += 1
+            self.stdout.write(f"Flight {flight.id} has drifted.")
+
+            if not dry_run:
+                flight.rebuild_seat_map()
+
+        return drifted
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+def fill_seat_maps(apps, schema_editor):
+    from airport.seating import SeatMap
+
+    Flight = apps.get_model("airport", "Flight")
+
+    for flight in Flight.objects.select_related("airplane"):
+        seat_map = SeatMap(flight.airplane.rows, flight.airplane.seats_in_row)
+
+        for row, seat in flight.tickets.values_list("row", "seat"):
+            if seat_map.contains(row, seat):
+                seat_map.take(row, seat)
+
+        flight.seat_map = seat_map.to_bytes()
+        flight.save(update_fields=["seat_map"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="seat_map",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(fill_seat_maps, migrations.RunPython.noop),
+    ]
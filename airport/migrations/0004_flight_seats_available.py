@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+def fill_seats_available(apps, schema_editor):
+    from airport.seating import SeatMap
+
+    Flight = apps.get_model("airport", "Flight")
+
+    for flight in Flight.objects.select_related("airplane"):
+        seat_map = SeatMap(
+            flight.airplane.rows,
+            flight.airplane.seats_in_row,
+            flight.seat_map,
+        )
+        flight.seats_available = seat_map.capacity - seat_map.taken_count
+        flight.save(update_fields=["seats_available"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0003_flight_seat_map"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="seats_available",
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_seats_available, migrations.RunPython.noop),
+    ]
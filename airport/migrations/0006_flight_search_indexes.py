@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0005_orderjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["route", "departure_time"],
+                include=("seats_available",),
+                name="flight_route_departure_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="route",
+            index=models.Index(
+                fields=["source", "destination"], name="airport_rou_source__5c8f4c_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:48
+
+from django.db import migrations, models
+
+
+def fill_distance_km(apps, schema_editor):
+    from airport.geo import haversine_km
+
+    Route = apps.get_model("airport", "Route")
+    routes = list(
+        Route.objects.select_related("source", "destination").order_by()
+    )
+
+    if not routes:
+        return
+
+    distances = haversine_km(
+        [route.source.latitude for route in routes],
+        [route.source.longitude for route in routes],
+        [route.destination.latitude for route in routes],
+        [route.destination.longitude for route in routes],
+    )
+
+    for route, distance in zip(routes, distances):
+        route.distance_km = float(distance)
+
+    Route.objects.bulk_update(routes, ["distance_km"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0006_flight_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="route",
+            name="distance_km",
+            field=models.FloatField(db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_distance_km, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0007_route_distance_km"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["-departure_time", "-id"],
+                name="flight_departure_cursor_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="order_user_created_cursor_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.5 on 2026-10-17 05:00
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0008_cursor_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlightSchedule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "weekdays",
+                    models.CharField(
+                        max_length=7,
+                        validators=[
+                            django.core.validators.RegexValidator(
+                                "^(?!.*(.).*\\1)[1-7]+$",
+                                "Weekdays must be distinct ISO weekday numbers (1-7).",
+                            )
+                        ],
+                    ),
+                ),
+                ("departure_time", models.TimeField()),
+                ("duration", models.DurationField()),
+                ("valid_from", models.DateField()),
+                ("valid_until", models.DateField()),
+            ],
+            options={
+                "ordering": ["valid_from", "departure_time"],
+            },
+        ),
+        migrations.AddField(
+            model_name="flightschedule",
+            name="airplane",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="schedules",
+                to="airport.airplane",
+            ),
+        ),
+        migrations.AddField(
+            model_name="flightschedule",
+            name="crews",
+            field=models.ManyToManyField(
+                blank=True, related_name="schedules", to="airport.crew"
+            ),
+        ),
+        migrations.AddField(
+            model_name="flightschedule",
+            name="route",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="schedules",
+                to="airport.route",
+            ),
+        ),
+        migrations.AddField(
+            model_name="flight",
+            name="schedule",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="flights",
+                to="airport.flightschedule",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="flight",
+            constraint=models.UniqueConstraint(
+                fields=("schedule", "departure_time"),
+                name="flight_schedule_departure_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.5 on 2026-10-17 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0009_flightschedule"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["airplane", "departure_time"],
+                include=("arrival_time",),
+                name="flight_airplane_departure_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.5 on 2026-10-17 05:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0010_flight_airplane_departure_idx"),
+    ]
+
+    operations = [
+        # The explicit through model takes over the existing table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="FlightCrew",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "crew",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="airport.crew",
+                            ),
+                        ),
+                        (
+                            "flight",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="airport.flight",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "airport_flight_crews",
+                        "unique_together": {("flight", "crew")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="flight",
+                    name="crews",
+                    field=models.ManyToManyField(
+                        related_name="flights",
+                        through="airport.FlightCrew",
+                        to="airport.crew",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["departure_time", "arrival_time"],
+                name="flight_departure_arrival_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="flightcrew",
+            index=models.Index(
+                fields=["crew", "flight"],
+                name="flight_crew_crew_flight_idx",
+            ),
+        ),
+    ]
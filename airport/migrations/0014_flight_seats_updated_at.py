@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-17 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("airport", "0013_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="seats_updated_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,13 +1,26 @@
 import os
 import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
 from math import radians, cos, sin, asin, sqrt
 
+import numpy as np
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import RegexValidator
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import gettext as _
 
+from airport.geo import haversine_km
+from airport.seating import SeatMap, seats_changed
+
+
+# Flights cannot be longer, which bounds the overlap lookups
+MAX_FLIGHT_DURATION = timedelta(hours=settings.MAX_FLIGHT_DURATION_HOURS)
+
 
 def create_custom_image_file_path(instance, filename):
     _, extension = os.path.splitext(filename)
@@ -36,6 +49,7 @@ class AirplaneType(models.Model):
         choices=TypeName.choices,
         default=TypeName.NARROW_BODY,
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -55,6 +69,7 @@ class Airplane(models.Model):
         blank=True,
         upload_to=create_custom_image_file_path,
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["name"]
@@ -91,6 +106,7 @@ class Crew(models.Model):
         blank=True,
         upload_to=create_custom_image_file_path,
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["position", "last_name"]
@@ -125,7 +141,7 @@ def calculate_distance_between_two_coordinates(
     # Earth radius in kilometers. Use 3956 for miles.
     r = 6371
 
-    return f"{round(c * r, 2)} km"
+    return c * r
 
 
 class Airport(models.Model):
@@ -140,6 +156,7 @@ class Airport(models.Model):
         blank=True,
         upload_to=create_custom_image_file_path,
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["country", "name"]
@@ -160,20 +177,181 @@ class Route(models.Model):
         related_name="destination",
     )
 
+    distance_km = models.FloatField(null=True, editable=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["source", "destination"]),
+        ]
+
+    def save(
+        self,
+        force_insert=False,
+        force_update=False,
+        using=None,
+        update_fields=None,
+    ):
+        if update_fields is None or {"source", "destination"} & set(
+            update_fields
+        ):
+            self.distance_km = calculate_distance_between_two_coordinates(
+                self.source.latitude,
+                self.source.longitude,
+                self.destination.latitude,
+                self.destination.longitude,
+            )
+
+            if update_fields is not None:
+                update_fields = {*update_fields, "distance_km"}
+
+        return super(Route, self).save(
+            force_insert,
+            force_update,
+            using,
+            update_fields,
+        )
+
+    @staticmethod
+    def update_distances(routes, batch_size=1000):
+        """Recompute the distances of the routes with one query and one
+        vectorized haversine, writing only the ones that have changed"""
+        rows = list(
+            routes.values_list(
+                "id",
+                "distance_km",
+                "source__latitude",
+                "source__longitude",
+                "destination__latitude",
+                "destination__longitude",
+            ).order_by()
+        )
+
+        if not rows:
+            return 0
+
+        ids, stored, *coordinates = zip(*rows)
+        distances = haversine_km(*coordinates)
+        stored = np.array(stored, dtype=np.float64)
+        changed = ~np.isclose(distances, stored)
+        # bulk_update() does not apply auto_now
+        updated_at = timezone.now()
+
+        Route.objects.bulk_update(
+            [
+                Route(
+                    id=ids[index],
+                    distance_km=float(distances[index]),
+                    updated_at=updated_at,
+                )
+                for index in np.flatnonzero(changed)
+            ],
+            ["distance_km", "updated_at"],
+            batch_size=batch_size,
+        )
+        return int(changed.sum())
+
     @property
     def distance(self):
-        return calculate_distance_between_two_coordinates(
-            self.source.latitude,
-            self.source.longitude,
-            self.destination.latitude,
-            self.destination.longitude,
-        )
+        return f"{round(self.distance_km, 2)} km"
 
     def __str__(self):
         return f"{self.source} - {self.destination}"
 
 
+class FlightSchedule(models.Model):
+    route = models.ForeignKey(
+        Route,
+        on_delete=models.CASCADE,
+        related_name="schedules",
+    )
+    airplane = models.ForeignKey(
+        Airplane,
+        on_delete=models.CASCADE,
+        related_name="schedules",
+    )
+    crews = models.ManyToManyField(
+        Crew,
+        related_name="schedules",
+        blank=True,
+    )
+    # ISO weekday numbers of the flights, ex. "135" for Mon, Wed and Fri
+    weekdays = models.CharField(
+        max_length=7,
+        validators=[
+            RegexValidator(
+                r"^(?!.*(.).*\1)[1-7]+$",
+                _("Weekdays must be distinct ISO weekday numbers (1-7)."),
+            )
+        ],
+    )
+    departure_time = models.TimeField()
+    duration = models.DurationField()
+    valid_from = models.DateField()
+    valid_until = models.DateField()
+
+    class Meta:
+        ordering = ["valid_from", "departure_time"]
+
+    @staticmethod
+    def validate_period(valid_from, valid_until, error_to_raise):
+        if valid_until < valid_from:
+            raise error_to_raise(
+                {
+                    "valid_until": "The validity period cannot end "
+                    "before it starts."
+                }
+            )
+
+    @staticmethod
+    def validate_duration(duration, error_to_raise):
+        if not timedelta(0) < duration <= MAX_FLIGHT_DURATION:
+            raise error_to_raise(
+                {
+                    "duration": "The flight duration must be positive "
+                    "and no longer than "
+                    f"{MAX_FLIGHT_DURATION // timedelta(hours=1)} hours."
+                }
+            )
+
+    def clean(self):
+        FlightSchedule.validate_period(
+            self.valid_from,
+            self.valid_until,
+            ValidationError,
+        )
+
+        if self.duration is not None:
+            FlightSchedule.validate_duration(self.duration, ValidationError)
+
+    def departures(self):
+        """Yield the aware departure times of the schedule, in the
+        order of dates within the validity period"""
+        day = self.valid_from
+
+        while day <= self.valid_until:
+            if str(day.isoweekday()) in self.weekdays:
+                yield timezone.make_aware(
+                    datetime.combine(day, self.departure_time)
+                )
+
+            day += timedelta(days=1)
+
+    def __str__(self):
+        return (
+            f"{self.route} {self.departure_time:%H:%M} ({self.weekdays}) "
+            f"{self.valid_from} - {self.valid_until}"
+        )
+
+
 class Flight(models.Model):
+    schedule = models.ForeignKey(
+        FlightSchedule,
+        on_delete=models.SET_NULL,
+        related_name="flights",
+        null=True,
+        blank=True,
+    )
     route = models.ForeignKey(
         Route,
         on_delete=models.CASCADE,
@@ -187,16 +365,370 @@ class Flight(models.Model):
     crews = models.ManyToManyField(
         Crew,
         related_name="flights",
+        through="FlightCrew",
     )
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
+    seat_map = models.BinaryField(default=bytes, editable=False)
+    seats_available = models.IntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    # Written along with the seat map, apart from updated_at,
+    # so the cached static parts of the flight details outlive it
+    seats_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ["-departure_time"]
+        indexes = [
+            models.Index(
+                fields=["route", "departure_time"],
+                include=["seats_available"],
+                name="flight_route_departure_idx",
+            ),
+            models.Index(
+                fields=["-departure_time", "-id"],
+                name="flight_departure_cursor_idx",
+            ),
+            models.Index(
+                fields=["airplane", "departure_time"],
+                include=["arrival_time"],
+                name="flight_airplane_departure_idx",
+            ),
+            models.Index(
+                fields=["departure_time", "arrival_time"],
+                name="flight_departure_arrival_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["schedule", "departure_time"],
+                name="flight_schedule_departure_unique",
+            ),
+        ]
 
     def __str__(self):
         return f"{str(self.departure_time)} {self.route}"
 
+    def save(
+        self,
+        force_insert=False,
+        force_update=False,
+        using=None,
+        update_fields=None,
+    ):
+        if self._state.adding:
+            self.seats_available = self.airplane.capacity
+        elif update_fields is None:
+            # The seat map and its counter are only written by
+            # store_seat_map() while the flight row is locked
+            update_fields = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name
+                not in ("seat_map", "seats_available", "seats_updated_at")
+            ]
+
+        return super(Flight, self).save(
+            force_insert,
+            force_update,
+            using,
+            update_fields,
+        )
+
+    def get_seat_map(self):
+        return SeatMap(
+            self.airplane.rows,
+            self.airplane.seats_in_row,
+            self.seat_map,
+        )
+
+    @property
+    def taken_seats(self):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in self.get_seat_map().taken_seats()
+        ]
+
+    @staticmethod
+    def find_overlapping(
+        departure_time,
+        arrival_time,
+        airplane_id=None,
+        crew_ids=(),
+        exclude_id=None,
+    ):
+        """Return the ids of the flights of the airplane and of every
+        crew member that overlap the time range, using the departure time
+        indexes: no flight can depart earlier than the longest allowed
+        flight before the range starts"""
+        overlapping = {
+            "departure_time__lt": arrival_time,
+            "departure_time__gt": departure_time - MAX_FLIGHT_DURATION,
+            "arrival_time__gt": departure_time,
+        }
+        airplane_flights = []
+        crew_flights = defaultdict(list)
+
+        if airplane_id is not None:
+            airplane_flights = list(
+                Flight.objects.filter(airplane_id=airplane_id, **overlapping)
+                .exclude(pk=exclude_id)
+                .values_list("id", flat=True)
+                .order_by("departure_time")
+            )
+
+        if crew_ids:
+            for crew_id, flight_id in (
+                Flight.crews.through.objects.filter(
+                    crew_id__in=crew_ids,
+                    **{
+                        f"flight__{lookup}": value
+                        for lookup, value in overlapping.items()
+                    },
+                )
+                .exclude(flight_id=exclude_id)
+                .values_list("crew_id", "flight_id")
+                .order_by("flight__departure_time")
+            ):
+                crew_flights[crew_id].append(flight_id)
+
+        return airplane_flights, dict(crew_flights)
+
+    @staticmethod
+    def validate_times(departure_time, arrival_time, error_to_raise):
+        """The overlap lookups rely on no flight lasting longer
+        than MAX_FLIGHT_DURATION"""
+        if not departure_time < arrival_time <= (
+            departure_time + MAX_FLIGHT_DURATION
+        ):
+            raise error_to_raise(
+                {
+                    "arrival_time": "The flight must arrive after departure "
+                    "and last no longer than "
+                    f"{MAX_FLIGHT_DURATION // timedelta(hours=1)} hours."
+                }
+            )
+
+    @staticmethod
+    def validate_overlapping(
+        departure_time,
+        arrival_time,
+        airplane_id,
+        crews,
+        error_to_raise,
+        exclude_id=None,
+    ):
+        airplane_flights, crew_flights = Flight.find_overlapping(
+            departure_time,
+            arrival_time,
+            airplane_id=airplane_id,
+            crew_ids=[crew.id for crew in crews],
+            exclude_id=exclude_id,
+        )
+        errors = {}
+
+        if airplane_flights:
+            errors["airplane"] = (
+                "The airplane is already assigned to the overlapping "
+                f"flights {', '.join(map(str, airplane_flights))}."
+            )
+
+        if crew_flights:
+            errors["crews"] = [
+                f"{crew} is already assigned to the overlapping flights "
+                f"{', '.join(map(str, crew_flights[crew.id]))}."
+                for crew in crews
+                if crew.id in crew_flights
+            ]
+
+        if errors:
+            raise error_to_raise(errors)
+
+    def clean(self):
+        """Run by full_clean() only, ex. in the admin: save() and the bulk
+        methods do not check the flight, and the API checks it under
+        the locks taken by FlightSerializer before saving it"""
+        if (
+            self.departure_time is None
+            or self.arrival_time is None
+            or self.airplane_id is None
+        ):
+            return
+
+        Flight.validate_times(
+            self.departure_time,
+            self.arrival_time,
+            ValidationError,
+        )
+        # The crews being assigned are checked by FlightCrew.clean()
+        Flight.validate_overlapping(
+            self.departure_time,
+            self.arrival_time,
+            self.airplane_id,
+            list(self.crews.all()) if self.pk else [],
+            ValidationError,
+            exclude_id=self.pk,
+        )
+
+    def rebuild_seat_map(self):
+        seat_map = SeatMap(self.airplane.rows, self.airplane.seats_in_row)
+
+        with transaction.atomic():
+            # Lock the flight row before reading its tickets
+            Flight.objects.select_for_update().filter(pk=self.pk).first()
+
+            for row, seat in self.tickets.values_list("row", "seat"):
+                if seat_map.contains(row, seat):
+                    seat_map.take(row, seat)
+
+            Flight.store_seat_map(self.pk, seat_map)
+
+        self.seat_map = seat_map.to_bytes()
+        self.seats_available = seat_map.capacity - seat_map.taken_count
+
+    @staticmethod
+    def store_seat_map(flight_id, seat_map):
+        seats_available = seat_map.capacity - seat_map.taken_count
+        transaction.on_commit(
+            lambda: seats_changed.send(
+                sender=Flight,
+                flight_id=flight_id,
+                seats_available=seats_available,
+            )
+        )
+        return Flight.objects.filter(pk=flight_id).update(
+            seat_map=seat_map.to_bytes(),
+            seats_available=seats_available,
+            seats_updated_at=timezone.now(),
+        )
+
+    @staticmethod
+    def lock_flights(flight_ids):
+        """Lock the flight rows in pk order for the rest of the transaction.
+
+        Taken before inserting tickets of the flights: the foreign key
+        checks of the inserts hold key-share locks on the flight rows,
+        which would deadlock with the seat map updates of concurrent
+        orders asking for the same rows.
+        """
+        return list(
+            Flight.objects.select_for_update()
+            .filter(pk__in=flight_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    @staticmethod
+    def lock_assignees(airplane_id, crew_ids):
+        """Lock the airplane and crew rows for the rest of the transaction.
+
+        Taken before checking a flight being saved for overlaps, so that
+        concurrent saves of the flights sharing the airplane or a crew
+        member are checked one after another instead of all passing.
+        """
+        list(
+            Airplane.objects.select_for_update()
+            .filter(pk=airplane_id)
+            .values_list("pk", flat=True)
+        )
+        list(
+            Crew.objects.select_for_update()
+            .filter(pk__in=crew_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    @staticmethod
+    def update_seat_map(flight_id, seats, taken=True):
+        """Mark the (row, seat) pairs as taken or free on the flight,
+        locking the flight row for the rest of the transaction"""
+        with transaction.atomic():
+            flight = (
+                Flight.objects
+                .select_for_update(of=("self",))
+                .select_related("airplane")
+                .filter(pk=flight_id)
+                .first()
+            )
+
+            if flight is None:
+                return
+
+            seat_map = flight.get_seat_map()
+
+            for row, seat in seats:
+                if seat_map.contains(row, seat):
+                    if taken:
+                        seat_map.take(row, seat)
+                    else:
+                        seat_map.release(row, seat)
+
+            Flight.store_seat_map(flight_id, seat_map)
+
+    @staticmethod
+    def update_seat_maps(tickets_seats, taken=True):
+        """Apply (flight_id, row, seat) triples flight by flight,
+        always locking the flights in the same order"""
+        seats_by_flight = defaultdict(list)
+
+        for flight_id, row, seat in tickets_seats:
+            seats_by_flight[flight_id].append((row, seat))
+
+        for flight_id in sorted(seats_by_flight):
+            Flight.update_seat_map(
+                flight_id,
+                seats_by_flight[flight_id],
+                taken=taken,
+            )
+
+
+class FlightCrew(models.Model):
+    """The crews of the flights, indexed by crew member as well,
+    for looking up the flights of the crew members"""
+
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE)
+    crew = models.ForeignKey(Crew, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = "airport_flight_crews"
+        unique_together = ("flight", "crew")
+        indexes = [
+            models.Index(
+                fields=["crew", "flight"],
+                name="flight_crew_crew_flight_idx",
+            ),
+        ]
+
+    def clean(self):
+        flight = self.flight
+
+        if flight.departure_time is None or flight.arrival_time is None:
+            return
+
+        _, crew_flights = Flight.find_overlapping(
+            flight.departure_time,
+            flight.arrival_time,
+            crew_ids=[self.crew_id],
+            exclude_id=flight.pk,
+        )
+
+        if crew_flights:
+            raise ValidationError(
+                {
+                    "crew": f"{self.crew} is already assigned to the "
+                    "overlapping flights "
+                    f"{', '.join(map(str, crew_flights[self.crew_id]))}."
+                }
+            )
+
 
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -208,10 +740,101 @@ class Order(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="order_user_created_cursor_idx",
+            ),
+        ]
 
     def __str__(self):
         return str(self.created_at)
 
+    def release_seats(self):
+        Flight.update_seat_maps(
+            self.tickets.values_list("flight_id", "row", "seat"),
+            taken=False,
+        )
+
+
+class OrderJob(models.Model):
+    class JobStatus(models.TextChoices):
+        PENDING = "PND", _("Pending")
+        PROCESSING = "PRC", _("Processing")
+        SUCCEEDED = "SCS", _("Succeeded")
+        FAILED = "FLD", _("Failed")
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="order_jobs",
+    )
+    flight = models.ForeignKey(
+        Flight,
+        on_delete=models.CASCADE,
+        related_name="order_jobs",
+    )
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=3,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING,
+    )
+    order = models.OneToOneField(
+        Order,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="job",
+    )
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "flight", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_status_display()} job {self.id} ({self.user})"
+
+
+class IdempotencyKey(models.Model):
+    """The Idempotency-Key of a create request and its stored response,
+    unique per user, so that a retry reaching any worker is replayed"""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    # The basename of the viewset the key was used with
+    scope = models.CharField(max_length=63)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # Both empty while the request is being processed
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_data = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=DjangoJSONEncoder,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"],
+                name="unique_idempotency_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.user})"
+
 
 class Ticket(models.Model):
     row = models.IntegerField()
@@ -253,6 +876,31 @@ class Ticket(models.Model):
                     }
                 )
 
+    @staticmethod
+    def find_taken_seats(tickets_data):
+        """Return the indexes of tickets_data whose seats are already booked,
+        using one query per flight."""
+        requested_seats = defaultdict(dict)
+        taken_indexes = set()
+
+        for index, ticket_data in enumerate(tickets_data):
+            requested_seats[ticket_data["flight"].id][
+                (ticket_data["row"], ticket_data["seat"])
+            ] = index
+
+        for flight_id, flight_seats in requested_seats.items():
+            booked_seats = Ticket.objects.filter(
+                flight_id=flight_id,
+                row__in={row for row, seat in flight_seats},
+                seat__in={seat for row, seat in flight_seats},
+            ).values_list("row", "seat")
+
+            for seat in booked_seats:
+                if seat in flight_seats:
+                    taken_indexes.add(flight_seats[seat])
+
+        return taken_indexes
+
     def clean(self):
         Ticket.validate_ticket(
             self.row,
@@ -269,9 +917,23 @@ class Ticket(models.Model):
         update_fields=None,
     ):
         self.full_clean()
-        return super(Ticket, self).save(
-            force_insert,
-            force_update,
-            using,
-            update_fields,
-        )
+        flight_ids = {self.flight_id}
+
+        if not self._state.adding:
+            flight_ids.update(
+                Ticket.objects.filter(pk=self.pk).values_list(
+                    "flight_id",
+                    flat=True,
+                )
+            )
+
+        with transaction.atomic(using=using):
+            # The seat maps of the old and the new flight are updated
+            # by take_ticket_seat() after the ticket is written
+            Flight.lock_flights(flight_ids)
+            return super(Ticket, self).save(
+                force_insert,
+                force_update,
+                using,
+                update_fields,
+            )
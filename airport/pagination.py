@@ -1,4 +1,73 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class OptionalCursorPaginationMixin:
+    """Switch to keyset pagination with ?pagination=cursor, so deep pages
+    are filtered by the last seen key instead of skipped with OFFSET and
+    no COUNT(*) is issued"""
+
+    cursor_pagination_class = None
+    pagination_query_param = "pagination"
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.pagination_query_param) == "cursor"
+            or self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset,
+                request,
+                view,
+            )
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.pagination_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Set to cursor for cursor pagination.",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_pagination_class.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+        ]
+
+
+class ActionOrderingCursorPagination(CursorPagination):
+    """Cursor pagination in the ordering of the action when the view sets
+    one in action_orderings, like a search ordering its own queryset,
+    so both pagination modes return the same order"""
+
+    def get_ordering(self, request, queryset, view):
+        action_ordering = getattr(view, "action_orderings", {}).get(
+            getattr(view, "action", None)
+        )
+
+        if action_ordering:
+            return tuple(action_ordering)
+
+        return super().get_ordering(request, queryset, view)
 
 
 class AirplanePagination(PageNumberPagination):
@@ -25,13 +94,29 @@ class RoutePagination(PageNumberPagination):
     max_page_size = 100
 
 
-class FlightPagination(PageNumberPagination):
+class FlightCursorPagination(ActionOrderingCursorPagination):
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-departure_time", "-id")
+
+
+class FlightPagination(OptionalCursorPaginationMixin, PageNumberPagination):
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_pagination_class = FlightCursorPagination
+
+
+class OrderCursorPagination(ActionOrderingCursorPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 100
+    ordering = ("-created_at", "-id")
 
 
-class OrderPagination(PageNumberPagination):
+class OrderPagination(OptionalCursorPaginationMixin, PageNumberPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 100
+    cursor_pagination_class = OrderCursorPagination
@@ -0,0 +1,168 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ResponseCache:
+    """Response data of the read endpoints kept in the cache configured by
+    RESPONSE_CACHE_ALIAS, an in-process LRU or a shared cache.
+
+    Every cached response is keyed by the versions of the models it is
+    built from, so saving or deleting any of their instances only has to
+    bump the version of the model, and the stale responses are never
+    read again and are evicted by the cache itself. Narrower scopes,
+    such as a single flight, are versioned by name the same way.
+
+    The responses built through get_or_set() are coalesced: a single
+    worker rebuilds a missing or expiring response while the others
+    serve the stale copy, kept RESPONSE_CACHE_STALE_TTL longer, or wait
+    for the rebuilt one for up to RESPONSE_CACHE_LOCK_WAIT.
+    """
+
+    # How eagerly the responses are rebuilt before they expire, the higher
+    # the earlier (see "Optimal Probabilistic Cache Stampede Prevention")
+    early_refresh_beta = 1.0
+    # How often (in seconds) a waiting worker looks for the rebuilt response
+    lock_poll_interval = 0.05
+
+    @property
+    def backend(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    @staticmethod
+    def version_key(scope):
+        if not isinstance(scope, str):
+            scope = scope._meta.label_lower
+
+        return f"response-version:{scope}"
+
+    def get_versions(self, scopes):
+        keys = [self.version_key(scope) for scope in scopes]
+        versions = self.backend.get_many(keys)
+
+        for key in keys:
+            if key not in versions:
+                # A concurrent request may have added the version first
+                self.backend.add(key, time.time_ns(), None)
+                versions[key] = self.backend.get(key)
+
+        return [versions[key] for key in keys]
+
+    def response_key(self, request_key, scopes):
+        """The key of the response with the current versions of the scopes,
+        taken before building the response, so that a response built
+        during a change is stored under the outdated versions"""
+        request_hash = hashlib.sha256(request_key.encode()).hexdigest()
+        versions = ":".join(
+            str(version) for version in self.get_versions(scopes)
+        )
+        return f"response:{request_hash}:{versions}"
+
+    def is_expiring(self, entry):
+        """Whether the entry has expired or is rebuilt early, with a chance
+        growing as it gets closer to its expiry and with the time it took
+        to build, so that a hot response is rebuilt by a single worker
+        before it expires instead of by all of them once it has"""
+        return (
+            time.time()
+            - entry["build_time"]
+            * self.early_refresh_beta
+            * math.log(1 - random.random())
+            >= entry["expires_at"]
+        )
+
+    def wait_for(self, response_key):
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            entry = self.backend.get(response_key)
+
+            if entry is not None:
+                return entry
+
+        return None
+
+    def build(self, response_key, build, timeout):
+        started_at = time.monotonic()
+        data = build()
+        build_time = time.monotonic() - started_at
+        self.backend.set(
+            response_key,
+            {
+                "data": data,
+                "expires_at": time.time() + timeout,
+                "build_time": build_time,
+            },
+            # The stale copy is served while the response is rebuilt
+            timeout + settings.RESPONSE_CACHE_STALE_TTL,
+        )
+        return data
+
+    def get_or_set(self, response_key, build, timeout=None):
+        """The cached data of the response, or the data returned by build()
+        and cached, along with whether it was a "HIT", a "MISS" or "STALE".
+
+        Only the worker that takes the lock of the key rebuilds it, the
+        lock expiring after RESPONSE_CACHE_LOCK_TIMEOUT in case the worker
+        dies. The others serve the stale data, or wait for the rebuilt
+        data and build it themselves if the rebuild takes too long.
+        """
+        timeout = timeout or settings.RESPONSE_CACHE_TTL
+        entry = self.backend.get(response_key)
+
+        if entry is not None and not self.is_expiring(entry):
+            return entry["data"], "HIT"
+
+        lock_key = f"{response_key}:lock"
+        token = uuid.uuid4().hex
+
+        if self.backend.add(
+            lock_key,
+            token,
+            settings.RESPONSE_CACHE_LOCK_TIMEOUT,
+        ):
+            try:
+                return self.build(response_key, build, timeout), "MISS"
+            finally:
+                # The lock may have expired and been taken by another worker
+                if self.backend.get(lock_key) == token:
+                    self.backend.delete(lock_key)
+
+        if entry is not None:
+            # Refreshed early by another worker, or expired and being rebuilt
+            state = "HIT" if time.time() < entry["expires_at"] else "STALE"
+            return entry["data"], state
+
+        entry = self.wait_for(response_key)
+
+        if entry is not None:
+            return entry["data"], "HIT"
+
+        return self.build(response_key, build, timeout), "MISS"
+
+    def invalidate(self, scope):
+        # A new version instead of an increment, so that a version evicted
+        # from the cache can never come back and match stale responses
+        self.backend.set(self.version_key(scope), time.time_ns(), None)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def flight_scope(flight_id):
+    """The scope of the static parts of the flight details"""
+    return f"flight:{flight_id}"
+
+
+def flight_seats_scope(flight_id):
+    """The scope of the seat occupancy of the flight details"""
+    return f"flight-seats:{flight_id}"
+
+
+response_cache = ResponseCache()
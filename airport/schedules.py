@@ -0,0 +1,152 @@
+from bisect import bisect_left, bisect_right
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from airport.connections import connection_index
+from airport.models import (
+    MAX_FLIGHT_DURATION,
+    Flight,
+    FlightCrew,
+    FlightSchedule,
+)
+
+
+def find_overlapping_flights(schedule, flights, crew_ids):
+    """Map the departure times of the new flights to the ids of the
+    flights of the airplane or of the crews they overlap, None standing
+    for another new flight, with a single query for all of them"""
+    busy_flights = sorted(
+        [
+            *Flight.objects.filter(
+                Q(airplane_id=schedule.airplane_id) | Q(crews__in=crew_ids),
+                departure_time__lt=flights[-1].arrival_time,
+                departure_time__gt=flights[0].departure_time
+                - MAX_FLIGHT_DURATION,
+                arrival_time__gt=flights[0].departure_time,
+            )
+            .order_by()
+            .distinct()
+            .values_list("departure_time", "arrival_time", "id"),
+            *(
+                (flight.departure_time, flight.arrival_time, None)
+                for flight in flights
+            ),
+        ],
+        key=lambda busy_flight: busy_flight[0],
+    )
+    departures = [departure for departure, _, _ in busy_flights]
+    overlapping = {}
+
+    for flight in flights:
+        for departure, arrival, flight_id in busy_flights[
+            bisect_right(
+                departures,
+                flight.departure_time - MAX_FLIGHT_DURATION,
+            ):bisect_left(departures, flight.arrival_time)
+        ]:
+            if arrival > flight.departure_time and not (
+                flight_id is None and departure == flight.departure_time
+            ):
+                overlapping.setdefault(flight.departure_time, []).append(
+                    flight_id
+                )
+
+    return overlapping
+
+
+def describe_overlapping(departure, flight_ids):
+    overlapped = []
+    existing_ids = [flight_id for flight_id in flight_ids if flight_id]
+
+    if existing_ids:
+        overlapped.append(
+            f"the flights {', '.join(map(str, existing_ids))} "
+            "of the airplane or of the crews"
+        )
+
+    if None in flight_ids:
+        overlapped.append("another flight of the schedule")
+
+    return (
+        f"The flight departing at {departure.isoformat()} overlaps "
+        f"{' and '.join(overlapped)}."
+    )
+
+
+def validate_flights(schedule, flights, crew_ids, error_to_raise):
+    FlightSchedule.validate_duration(schedule.duration, error_to_raise)
+    overlapping = find_overlapping_flights(schedule, flights, crew_ids)
+
+    if overlapping:
+        raise error_to_raise(
+            {
+                "flights": [
+                    describe_overlapping(departure, flight_ids)
+                    for departure, flight_ids in overlapping.items()
+                ]
+            }
+        )
+
+
+def materialize_schedule(
+    schedule,
+    batch_size=1000,
+    error_to_raise=ValidationError,
+):
+    """Create the flights of the schedule that do not exist yet, with
+    their crews, in batches. Return the number of created flights.
+
+    Running it again only fills the gaps: the existing departures of
+    the schedule are skipped, and concurrent runs of the schedule wait
+    for each other on its row lock, so they never insert the same
+    departure twice. bulk_create() skips the validation of the flights,
+    so none is created when any of them lasts too long or overlaps
+    a flight of the airplane or of the crews.
+    """
+    with transaction.atomic():
+        list(
+            FlightSchedule.objects.select_for_update()
+            .filter(pk=schedule.pk)
+            .values_list("pk", flat=True)
+        )
+        existing_departures = set(
+            schedule.flights.values_list("departure_time", flat=True)
+        )
+        capacity = schedule.airplane.capacity
+        flights = [
+            # bulk_create() skips Flight.save(), so set the counter here
+            Flight(
+                schedule=schedule,
+                route_id=schedule.route_id,
+                airplane_id=schedule.airplane_id,
+                departure_time=departure_time,
+                arrival_time=departure_time + schedule.duration,
+                seats_available=capacity,
+            )
+            for departure_time in schedule.departures()
+            if departure_time not in existing_departures
+        ]
+
+        if not flights:
+            return 0
+
+        crew_ids = list(schedule.crews.values_list("id", flat=True))
+        Flight.lock_assignees(schedule.airplane_id, crew_ids)
+        validate_flights(schedule, flights, crew_ids, error_to_raise)
+
+        for start in range(0, len(flights), batch_size):
+            batch = flights[start:start + batch_size]
+            Flight.objects.bulk_create(batch)
+            FlightCrew.objects.bulk_create(
+                [
+                    FlightCrew(flight_id=flight.id, crew_id=crew_id)
+                    for flight in batch
+                    for crew_id in crew_ids
+                ]
+            )
+
+    # bulk_create() sends no signals to update the index
+    connection_index.invalidate()
+    return len(flights)
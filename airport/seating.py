@@ -0,0 +1,220 @@
+import base64
+
+from django.dispatch import Signal
+
+# Sent with flight_id and seats_available once a seat map change is committed
+seats_changed = Signal()
+
+
+class SeatMap:
+    """Occupancy bitset of a flight: one bit per seat, row after row"""
+
+    def __init__(self, rows, seats_in_row, bits=b""):
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        size = (self.capacity + 7) // 8
+        self.bits = bytearray(bytes(bits)[:size]).ljust(size, b"\0")
+
+    @property
+    def capacity(self):
+        return self.rows * self.seats_in_row
+
+    @property
+    def taken_count(self):
+        return int.from_bytes(self.bits, "little").bit_count()
+
+    def contains(self, row, seat):
+        return 1 <= row <= self.rows and 1 <= seat <= self.seats_in_row
+
+    def _position(self, row, seat):
+        if not self.contains(row, seat):
+            raise IndexError(f"There is no seat {seat} in row {row}.")
+
+        index = (row - 1) * self.seats_in_row + seat - 1
+        return index // 8, 1 << index % 8
+
+    def is_taken(self, row, seat):
+        byte, mask = self._position(row, seat)
+        return bool(self.bits[byte] & mask)
+
+    def take(self, row, seat):
+        byte, mask = self._position(row, seat)
+        self.bits[byte] |= mask
+
+    def release(self, row, seat):
+        byte, mask = self._position(row, seat)
+        self.bits[byte] &= ~mask
+
+    def taken_seats(self):
+        """Yield the (row, seat) pairs of the taken seats in seat order"""
+        for byte_index, byte in enumerate(self.bits):
+            while byte:
+                lowest_bit = byte & -byte
+                index = byte_index * 8 + lowest_bit.bit_length() - 1
+                row, seat = divmod(index, self.seats_in_row)
+                yield row + 1, seat + 1
+                byte ^= lowest_bit
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    def to_base64(self):
+        return base64.b64encode(self.bits).decode()
+
+    def to_run_lengths(self):
+        """Lengths of alternating runs of free and taken seats,
+        always starting with a (possibly empty) run of free seats"""
+        run_lengths = []
+        current_value = 0
+        current_length = 0
+
+        for index in range(self.capacity):
+            value = self.bits[index // 8] >> index % 8 & 1
+
+            if value != current_value:
+                run_lengths.append(current_length)
+                current_value = value
+                current_length = 0
+
+            current_length += 1
+
+        run_lengths.append(current_length)
+        return run_lengths
+
+
+def find_free_runs(seat_map, unavailable=frozenset()):
+    """Yield (row, first seat, length) for every run of adjacent free seats"""
+    for row in range(1, seat_map.rows + 1):
+        first_seat = None
+
+        for seat in range(1, seat_map.seats_in_row + 2):
+            is_free = (
+                seat <= seat_map.seats_in_row
+                and not seat_map.is_taken(row, seat)
+                and (row, seat) not in unavailable
+            )
+
+            if is_free and first_seat is None:
+                first_seat = seat
+            elif not is_free and first_seat is not None:
+                yield row, first_seat, seat - first_seat
+                first_seat = None
+
+
+def allocate_seats(
+    seat_map,
+    passengers,
+    together=True,
+    window=False,
+    front=False,
+    unavailable=frozenset(),
+):
+    """Choose the best free seats for the passengers.
+
+    Return the list of (row, seat) pairs and whether they are all
+    adjacent in one row, or None when there are not enough free seats.
+    A window seat is preferred over a front row, and without the front
+    preference the tightest fitting run of free seats wins, so that
+    bigger runs stay available for bigger parties.
+    """
+    runs = list(find_free_runs(seat_map, unavailable))
+
+    if sum(length for _, _, length in runs) < passengers:
+        return None
+
+    def misses_window(first_seat, count):
+        return window and not (
+            first_seat == 1
+            or first_seat + count - 1 == seat_map.seats_in_row
+        )
+
+    if together:
+        blocks = [
+            (
+                misses_window(first_seat, passengers),
+                row if front else 0,
+                length - passengers,
+                row,
+                first_seat,
+            )
+            for row, run_first_seat, length in runs
+            if length >= passengers
+            for first_seat in range(
+                run_first_seat,
+                run_first_seat + length - passengers + 1,
+            )
+        ]
+
+        if blocks:
+            *_, row, first_seat = min(blocks)
+            return [
+                (row, seat)
+                for seat in range(first_seat, first_seat + passengers)
+            ], True
+
+    # Split the party over the fewest and biggest runs of free seats
+    runs.sort(
+        key=lambda run: (
+            misses_window(run[1], run[2]),
+            run[0] if front else 0,
+            -run[2],
+            run[0],
+        )
+    )
+    seats = []
+
+    for row, first_seat, length in runs:
+        count = min(length, passengers - len(seats))
+
+        if (
+            window
+            and first_seat != 1
+            and first_seat + length - 1 == seat_map.seats_in_row
+        ):
+            first_seat += length - count
+
+        seats.extend(
+            (row, seat) for seat in range(first_seat, first_seat + count)
+        )
+
+        if len(seats) == passengers:
+            break
+
+    seats.sort()
+    return seats, is_block(seats)
+
+
+def is_block(seats):
+    """Whether the sorted (row, seat) pairs are adjacent seats of one row"""
+    first_row, first_seat = seats[0]
+    last_row, last_seat = seats[-1]
+    return first_row == last_row and last_seat - first_seat == len(seats) - 1
+
+
+def suggest_nearby_seats(seat_map, seats, unavailable=frozenset()):
+    """Pick the closest free seat for every (row, seat) pair,
+    preferring the same row and then the nearest rows"""
+    free_seats = [
+        (row, seat)
+        for row in range(1, seat_map.rows + 1)
+        for seat in range(1, seat_map.seats_in_row + 1)
+        if not seat_map.is_taken(row, seat) and (row, seat) not in unavailable
+    ]
+    suggested_seats = []
+
+    for row, seat in seats:
+        if not free_seats:
+            break
+
+        nearest_seat = min(
+            free_seats,
+            key=lambda free_seat: (
+                abs(free_seat[0] - row),
+                abs(free_seat[1] - seat),
+                free_seat,
+            ),
+        )
+        free_seats.remove(nearest_seat)
+        suggested_seats.append(nearest_seat)
+
+    return suggested_seats
@@ -1,7 +1,21 @@
-from django.db import transaction
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
+
+from airport.exceptions import SeatsTaken
+from airport.holds import (
+    HoldLimitReached,
+    create_hold,
+    get_hold,
+    get_held_seats,
+    get_seat_holders,
+    release_hold,
+)
 from airport.models import (
     AirplaneType,
     Airplane,
@@ -9,9 +23,48 @@ from airport.models import (
     Airport,
     Route,
     Flight,
+    FlightSchedule,
     Order,
+    OrderJob,
     Ticket,
 )
+from airport.seating import allocate_seats, suggest_nearby_seats
+
+
+def parse_field_names(request, param):
+    return {
+        field_name.strip()
+        for field_name in request.query_params.get(param, "").split(",")
+        if field_name.strip()
+    }
+
+
+class SparseFieldsetMixin:
+    """Render only the fields listed in ?fields= and the nested
+    representations of the fields listed in ?expand="""
+
+    # Field name -> callable returning the expanded field
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+
+        if request is None:
+            return
+
+        expand = parse_field_names(request, "expand") & set(
+            self.expandable_fields
+        )
+
+        for field_name in expand:
+            self.fields[field_name] = self.expandable_fields[field_name]()
+
+        fields = parse_field_names(request, "fields")
+
+        if fields:
+            for field_name in set(self.fields) - fields - expand:
+                self.fields.pop(field_name)
 
 
 class AirplaneTypeSerializer(serializers.ModelSerializer):
@@ -32,7 +85,14 @@ class AirplaneSerializer(serializers.ModelSerializer):
         )
 
 
-class AirplaneListSerializer(serializers.ModelSerializer):
+class AirplaneListSerializer(
+    SparseFieldsetMixin,
+    serializers.ModelSerializer,
+):
+    expandable_fields = {
+        "airplane_type": lambda: AirplaneTypeSerializer(read_only=True),
+    }
+
     airplane_type = serializers.SlugRelatedField(
         many=False,
         read_only=True,
@@ -87,7 +147,7 @@ class CrewSerializer(serializers.ModelSerializer):
         )
 
 
-class CrewListSerializer(serializers.ModelSerializer):
+class CrewListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Crew
         fields = (
@@ -99,6 +159,22 @@ class CrewListSerializer(serializers.ModelSerializer):
         )
 
 
+class CrewAvailabilitySerializer(serializers.Serializer):
+    position = serializers.ChoiceField(
+        choices=Crew.CrewPosition.choices,
+        required=False,
+    )
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    rest_minutes = serializers.IntegerField(min_value=0, default=0)
+
+    def validate(self, attrs):
+        if attrs["end"] <= attrs["start"]:
+            raise ValidationError({"end": "The end must be after the start."})
+
+        return attrs
+
+
 class CrewDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Crew
@@ -131,7 +207,10 @@ class AirportSerializer(serializers.ModelSerializer):
         )
 
 
-class AirportListSerializer(serializers.ModelSerializer):
+class AirportListSerializer(
+    SparseFieldsetMixin,
+    serializers.ModelSerializer,
+):
     class Meta:
         model = Airport
         fields = (
@@ -165,6 +244,60 @@ class AirportImageSerializer(serializers.ModelSerializer):
         fields = ("id", "image")
 
 
+class NearbyAirportSearchSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(
+        min_value=0,
+        max_value=20040,
+        default=200,
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class NearbyAirportSerializer(AirportListSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Airport
+        fields = AirportListSerializer.Meta.fields + ("distance_km",)
+
+
+class DistanceMatrixSearchSerializer(serializers.Serializer):
+    MAX_AIRPORTS = 200
+
+    iata = serializers.CharField()
+
+    def validate_iata(self, iata):
+        iata_codes = list(
+            dict.fromkeys(
+                iata_code.strip().upper()
+                for iata_code in iata.split(",")
+                if iata_code.strip()
+            )
+        )
+
+        if not iata_codes:
+            raise ValidationError("At least one IATA code is required.")
+
+        if any(len(iata_code) != 3 for iata_code in iata_codes):
+            raise ValidationError("IATA codes must have 3 characters.")
+
+        if len(iata_codes) > self.MAX_AIRPORTS:
+            raise ValidationError(
+                f"No more than {self.MAX_AIRPORTS} airports are allowed."
+            )
+
+        return iata_codes
+
+
+class DistanceMatrixSerializer(serializers.Serializer):
+    iata_codes = serializers.ListField(child=serializers.CharField())
+    distances_km = serializers.ListField(
+        child=serializers.ListField(child=serializers.FloatField())
+    )
+
+
 class RouteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Route
@@ -172,10 +305,11 @@ class RouteSerializer(serializers.ModelSerializer):
             "id",
             "source",
             "destination",
+            "distance_km",
         )
 
 
-class RouteListSerializer(RouteSerializer):
+class RouteListSerializer(SparseFieldsetMixin, RouteSerializer):
     source = AirportListSerializer(
         many=False,
         read_only=True,
@@ -203,10 +337,117 @@ class RouteDetailSerializer(serializers.ModelSerializer):
             "source",
             "destination",
             "distance",
+            "distance_km",
+        )
+
+
+TAKEN_SEAT_ERROR = UniqueTogetherValidator.message.format(
+    field_names="flight, row, seat",
+)
+
+
+HELD_SEAT_ERROR = "The seat is held by another customer."
+
+
+def taken_seat_error():
+    return {api_settings.NON_FIELD_ERRORS_KEY: [TAKEN_SEAT_ERROR]}
+
+
+def held_seat_error():
+    return {api_settings.NON_FIELD_ERRORS_KEY: [HELD_SEAT_ERROR]}
+
+
+def seats_taken(tickets_data, taken_indexes, hold_id=None):
+    """Build the conflict error for the taken tickets seats,
+    suggesting the nearest seats the order can book instead"""
+    flights = {}
+    requested_seats = defaultdict(set)
+    conflicting_seats = defaultdict(list)
+
+    for index, ticket_data in enumerate(tickets_data):
+        flight = ticket_data["flight"]
+        seat = (ticket_data["row"], ticket_data["seat"])
+        flights[flight.id] = flight
+        requested_seats[flight.id].add(seat)
+
+        if index in taken_indexes:
+            conflicting_seats[flight.id].append(seat)
+
+    taken_seats = []
+    suggested_seats = []
+
+    for flight_id, seats in conflicting_seats.items():
+        flight = flights[flight_id]
+        flight.refresh_from_db(fields=["seat_map"])
+        seat_map = flight.get_seat_map()
+        unavailable = requested_seats[flight_id] | get_held_seats(
+            flight_id,
+            seat_map,
+            except_hold_id=hold_id,
+        )
+
+        taken_seats.extend(
+            {"flight": flight_id, "row": row, "seat": seat}
+            for row, seat in seats
         )
+        suggested_seats.extend(
+            {"flight": flight_id, "row": row, "seat": seat}
+            for row, seat in suggest_nearby_seats(seat_map, seats, unavailable)
+        )
+
+    return SeatsTaken(taken_seats, suggested_seats)
+
+
+class TicketFlightField(serializers.PrimaryKeyRelatedField):
+    """Resolve every flight (with its airplane) only once per payload"""
+
+    def __init__(self, **kwargs):
+        super(TicketFlightField, self).__init__(**kwargs)
+        self._flights = {}
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (int, str)):
+            return super(TicketFlightField, self).to_internal_value(data)
+
+        if str(data) not in self._flights:
+            self._flights[str(data)] = super(
+                TicketFlightField,
+                self,
+            ).to_internal_value(data)
+
+        return self._flights[str(data)]
+
+
+class TicketBulkSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        tickets_data = super(TicketBulkSerializer, self).to_internal_value(
+            data
+        )
+        requested_seats = set()
+        errors = []
+
+        for ticket_data in tickets_data:
+            seat = (
+                ticket_data["flight"].id,
+                ticket_data["row"],
+                ticket_data["seat"],
+            )
+            errors.append(
+                taken_seat_error() if seat in requested_seats else {}
+            )
+            requested_seats.add(seat)
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        return tickets_data
 
 
 class TicketSerializer(serializers.ModelSerializer):
+    flight = TicketFlightField(
+        queryset=Flight.objects.select_related("airplane"),
+    )
+
     def validate(self, attrs):
         data = super(TicketSerializer, self).validate(attrs=attrs)
         Ticket.validate_ticket(
@@ -225,6 +466,11 @@ class TicketSerializer(serializers.ModelSerializer):
             "seat",
             "flight",
         )
+        # Seat uniqueness is checked for the whole payload at once
+        # (TicketBulkSerializer and OrderSerializer.validate)
+        # instead of a query per ticket.
+        validators = ()
+        list_serializer_class = TicketBulkSerializer
 
 
 class TicketSeatSerializer(TicketSerializer):
@@ -234,6 +480,12 @@ class TicketSeatSerializer(TicketSerializer):
 
 
 class FlightSerializer(serializers.ModelSerializer):
+    # Declared explicitly, as DRF makes through model relations read-only
+    crews = serializers.PrimaryKeyRelatedField(
+        many=True,
+        queryset=Crew.objects.all(),
+    )
+
     class Meta:
         model = Flight
         fields = (
@@ -245,8 +497,78 @@ class FlightSerializer(serializers.ModelSerializer):
             "arrival_time",
         )
 
+    def get_flight_attrs(self, attrs):
+        """The times, the airplane and the crews of the flight,
+        as given or as already saved"""
+        instance = self.instance
+        departure_time = attrs.get(
+            "departure_time",
+            getattr(instance, "departure_time", None),
+        )
+        arrival_time = attrs.get(
+            "arrival_time",
+            getattr(instance, "arrival_time", None),
+        )
+        airplane = attrs.get("airplane", getattr(instance, "airplane", None))
+        crews = (
+            attrs["crews"]
+            if "crews" in attrs
+            else list(instance.crews.all()) if instance else []
+        )
+        return departure_time, arrival_time, airplane, crews
+
+    def validate(self, attrs):
+        data = super(FlightSerializer, self).validate(attrs=attrs)
+        departure_time, arrival_time, _, _ = self.get_flight_attrs(attrs)
+        Flight.validate_times(departure_time, arrival_time, ValidationError)
+        return data
+
+    def check_overlapping(self, validated_data):
+        """Check the other flights of the airplane and of the crews,
+        which cannot change until the flight is saved, as their rows
+        are locked for the rest of the transaction"""
+        departure_time, arrival_time, airplane, crews = (
+            self.get_flight_attrs(validated_data)
+        )
+        Flight.lock_assignees(airplane.id, [crew.id for crew in crews])
+
+        try:
+            Flight.validate_overlapping(
+                departure_time,
+                arrival_time,
+                airplane.id,
+                crews,
+                ValidationError,
+                exclude_id=getattr(self.instance, "id", None),
+            )
+        except ValidationError as error:
+            # Shaped like the errors of is_valid(), as raised after it
+            raise ValidationError(serializers.as_serializer_error(error))
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.check_overlapping(validated_data)
+            return super(FlightSerializer, self).create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.check_overlapping(validated_data)
+            return super(FlightSerializer, self).update(
+                instance,
+                validated_data,
+            )
+
+
+class FlightListSerializer(
+    SparseFieldsetMixin,
+    serializers.ModelSerializer,
+):
+    expandable_fields = {
+        "route": lambda: RouteListSerializer(read_only=True),
+        "airplane": lambda: AirplaneListSerializer(read_only=True),
+        "crews": lambda: CrewListSerializer(many=True, read_only=True),
+    }
 
-class FlightListSerializer(serializers.ModelSerializer):
     route = serializers.StringRelatedField(many=False)
     airplane_name = serializers.CharField(
         source="airplane.name",
@@ -257,7 +579,10 @@ class FlightListSerializer(serializers.ModelSerializer):
         read_only=True,
     )
     crews = serializers.StringRelatedField(many=True)
-    tickets_available = serializers.IntegerField(read_only=True)
+    tickets_available = serializers.IntegerField(
+        source="seats_available",
+        read_only=True,
+    )
 
     class Meta:
         model = Flight
@@ -273,6 +598,95 @@ class FlightListSerializer(serializers.ModelSerializer):
         )
 
 
+class FlightScheduleSerializer(serializers.ModelSerializer):
+    # Annotated by FlightScheduleViewSet
+    flights_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = FlightSchedule
+        fields = (
+            "id",
+            "route",
+            "airplane",
+            "crews",
+            "weekdays",
+            "departure_time",
+            "duration",
+            "valid_from",
+            "valid_until",
+            "flights_count",
+        )
+
+    def validate(self, attrs):
+        data = super(FlightScheduleSerializer, self).validate(attrs=attrs)
+        FlightSchedule.validate_period(
+            attrs.get(
+                "valid_from",
+                getattr(self.instance, "valid_from", None),
+            ),
+            attrs.get(
+                "valid_until",
+                getattr(self.instance, "valid_until", None),
+            ),
+            ValidationError,
+        )
+        FlightSchedule.validate_duration(
+            attrs.get("duration", getattr(self.instance, "duration", None)),
+            ValidationError,
+        )
+        return data
+
+
+class FlightSearchSerializer(serializers.Serializer):
+    source = serializers.CharField(min_length=3, max_length=3)
+    destination = serializers.CharField(min_length=3, max_length=3)
+    date_from = serializers.DateField()
+    date_to = serializers.DateField(required=False)
+    min_seats = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_source(self, source):
+        return source.upper()
+
+    def validate_destination(self, destination):
+        return destination.upper()
+
+    def validate(self, attrs):
+        attrs.setdefault("date_to", attrs["date_from"])
+
+        if attrs["date_to"] < attrs["date_from"]:
+            raise ValidationError(
+                {"date_to": "The date cannot be earlier than date_from."}
+            )
+
+        return attrs
+
+
+class ConnectionSearchSerializer(FlightSearchSerializer):
+    max_legs = serializers.IntegerField(min_value=1, max_value=4, default=3)
+    min_connection = serializers.IntegerField(min_value=0, default=60)
+    max_connection = serializers.IntegerField(min_value=0, default=24 * 60)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+
+        if attrs["max_connection"] < attrs["min_connection"]:
+            raise ValidationError(
+                {
+                    "max_connection": "The connection time cannot be "
+                    "shorter than min_connection."
+                }
+            )
+
+        return attrs
+
+
+class ConnectionSerializer(serializers.Serializer):
+    departure_time = serializers.DateTimeField(read_only=True)
+    arrival_time = serializers.DateTimeField(read_only=True)
+    legs = FlightListSerializer(many=True, read_only=True)
+
+
 class FlightDetailSerializer(FlightSerializer):
     route = RouteDetailSerializer(
         many=False,
@@ -287,7 +701,6 @@ class FlightDetailSerializer(FlightSerializer):
         read_only=True,
     )
     taken_seats = TicketSeatSerializer(
-        source="tickets",
         many=True,
         read_only=True,
     )
@@ -305,6 +718,152 @@ class FlightDetailSerializer(FlightSerializer):
         )
 
 
+class SeatSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    seat = serializers.IntegerField()
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    id = serializers.CharField(read_only=True)
+    flight = serializers.IntegerField(read_only=True)
+    seats = SeatSerializer(many=True, allow_empty=False)
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    def validate_seats(self, seats):
+        if len(seats) > settings.SEAT_HOLD_MAX_SEATS:
+            raise ValidationError(
+                f"No more than {settings.SEAT_HOLD_MAX_SEATS} seats "
+                "can be held at once."
+            )
+
+        flight = self.context["flight"]
+        seat_map = flight.get_seat_map()
+        errors = []
+        requested_seats = set()
+
+        for seat_data in seats:
+            row, seat = seat_data["row"], seat_data["seat"]
+
+            try:
+                Ticket.validate_ticket(
+                    row,
+                    seat,
+                    flight.airplane,
+                    ValidationError,
+                )
+            except ValidationError as error:
+                errors.append(serializers.as_serializer_error(error))
+                continue
+
+            if seat_map.is_taken(row, seat) or (row, seat) in requested_seats:
+                errors.append(taken_seat_error())
+            else:
+                errors.append({})
+
+            requested_seats.add((row, seat))
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        return seats
+
+    def create(self, validated_data):
+        try:
+            hold, taken_seats = create_hold(
+                self.context["request"].user.id,
+                self.context["flight"].id,
+                [
+                    (seat_data["row"], seat_data["seat"])
+                    for seat_data in validated_data["seats"]
+                ],
+            )
+        except HoldLimitReached:
+            raise ValidationError(
+                f"No more than {settings.SEAT_HOLD_MAX_PER_USER} holds "
+                "can be active at once, release one of them first."
+            )
+
+        if hold is None:
+            raise ValidationError(
+                {
+                    "seats": [
+                        held_seat_error()
+                        if (seat_data["row"], seat_data["seat"]) in taken_seats
+                        else {}
+                        for seat_data in validated_data["seats"]
+                    ]
+                }
+            )
+
+        return hold
+
+
+class SeatAllocationSerializer(serializers.Serializer):
+    passengers = serializers.IntegerField(min_value=1, write_only=True)
+    together = serializers.BooleanField(default=True, write_only=True)
+    window = serializers.BooleanField(default=False, write_only=True)
+    front = serializers.BooleanField(default=False, write_only=True)
+    seats = SeatSerializer(many=True, read_only=True)
+    seated_together = serializers.BooleanField(read_only=True)
+
+    def validate(self, attrs):
+        flight = self.context["flight"]
+        seat_map = flight.get_seat_map()
+        allocation = allocate_seats(
+            seat_map,
+            attrs["passengers"],
+            together=attrs["together"],
+            window=attrs["window"],
+            front=attrs["front"],
+            unavailable=get_held_seats(flight.id, seat_map),
+        )
+
+        if allocation is None:
+            raise ValidationError(
+                {"passengers": "There are not enough free seats."}
+            )
+
+        seats, attrs["seated_together"] = allocation
+        attrs["seats"] = [{"row": row, "seat": seat} for row, seat in seats]
+        return attrs
+
+
+class FlightSeatMapSerializer(serializers.ModelSerializer):
+    rows = serializers.IntegerField(source="airplane.rows", read_only=True)
+    seats_in_row = serializers.IntegerField(
+        source="airplane.seats_in_row",
+        read_only=True,
+    )
+    seats_taken = serializers.SerializerMethodField()
+    encoding = serializers.SerializerMethodField()
+    seat_map = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Flight
+        fields = (
+            "id",
+            "rows",
+            "seats_in_row",
+            "seats_taken",
+            "encoding",
+            "seat_map",
+        )
+
+    def get_seats_taken(self, flight):
+        return flight.get_seat_map().taken_count
+
+    def get_encoding(self, flight):
+        return self.context.get("encoding", "base64")
+
+    def get_seat_map(self, flight):
+        seat_map = flight.get_seat_map()
+
+        if self.get_encoding(flight) == "rle":
+            return seat_map.to_run_lengths()
+
+        return seat_map.to_base64()
+
+
 class TicketListSerializer(TicketSerializer):
     flight = FlightListSerializer(
         many=False,
@@ -318,6 +877,7 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only=False,
         allow_empty=False,
     )
+    hold = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = Order
@@ -325,15 +885,103 @@ class OrderSerializer(serializers.ModelSerializer):
             "id",
             "tickets",
             "created_at",
+            "hold",
         )
 
+    def get_request_user(self):
+        if "user" in self.context:
+            return self.context["user"]
+
+        return self.context["request"].user
+
+    def validate_hold(self, hold_id):
+        hold = get_hold(hold_id)
+
+        if hold is None or hold["user"] != self.get_request_user().id:
+            raise ValidationError("The hold does not exist or has expired.")
+
+        return hold
+
+    def validate(self, attrs):
+        data = super(OrderSerializer, self).validate(attrs)
+        tickets_data = attrs["tickets"]
+        hold_id = attrs["hold"]["id"] if attrs.get("hold") else None
+        taken_indexes = Ticket.find_taken_seats(tickets_data)
+        flights_seats = defaultdict(dict)
+
+        for index, ticket_data in enumerate(tickets_data):
+            flights_seats[ticket_data["flight"].id][
+                (ticket_data["row"], ticket_data["seat"])
+            ] = index
+
+        for flight_id, flight_seats in flights_seats.items():
+            for seat, seat_hold_id in get_seat_holders(
+                flight_id,
+                flight_seats,
+            ).items():
+                if seat_hold_id != hold_id:
+                    taken_indexes.add(flight_seats[seat])
+
+        if taken_indexes:
+            raise seats_taken(tickets_data, taken_indexes, hold_id)
+
+        return data
+
     def create(self, validated_data):
-        with transaction.atomic():
-            tickets_data = validated_data.pop("tickets")
-            order = Order.objects.create(**validated_data)
-            for ticket_data in tickets_data:
-                Ticket.objects.create(order=order, **ticket_data)
-            return order
+        tickets_data = validated_data.pop("tickets")
+        hold = validated_data.pop("hold", None)
+
+        try:
+            with transaction.atomic():
+                Flight.lock_flights(
+                    {ticket_data["flight"].id for ticket_data in tickets_data}
+                )
+                order = Order.objects.create(**validated_data)
+                Ticket.objects.bulk_create(
+                    Ticket(order=order, **ticket_data)
+                    for ticket_data in tickets_data
+                )
+                Flight.update_seat_maps(
+                    (
+                        ticket_data["flight"].id,
+                        ticket_data["row"],
+                        ticket_data["seat"],
+                    )
+                    for ticket_data in tickets_data
+                )
+        except IntegrityError:
+            taken_indexes = Ticket.find_taken_seats(tickets_data)
+
+            # Another constraint failed, ex. the flight has been deleted
+            if not taken_indexes:
+                raise
+
+            # Another order has taken some of the seats since the validation
+            raise seats_taken(
+                tickets_data,
+                taken_indexes,
+                hold["id"] if hold else None,
+            )
+
+        if hold is not None:
+            release_hold(hold)
+
+        return order
+
+
+class OrderJobSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source="get_status_display", read_only=True)
+
+    class Meta:
+        model = OrderJob
+        fields = (
+            "id",
+            "status",
+            "order",
+            "result",
+            "created_at",
+            "processed_at",
+        )
 
 
 class OrderListSerializer(OrderSerializer):
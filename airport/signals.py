@@ -0,0 +1,244 @@
+from django.db.models import Q, QuerySet
+from django.db.models.signals import (
+    m2m_changed,
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from airport.connections import connection_index
+from airport.models import (
+    AirplaneType,
+    Airplane,
+    Crew,
+    Airport,
+    Flight,
+    Order,
+    Route,
+    Ticket,
+)
+from airport.response_cache import (
+    flight_scope,
+    flight_seats_scope,
+    response_cache,
+)
+from airport.seating import seats_changed
+from airport.spatial import airport_index
+from airport.streams import seat_notifier
+
+
+def is_deleted_with(origin, model):
+    return isinstance(origin, model) or (
+        isinstance(origin, QuerySet) and origin.model is model
+    )
+
+
+@receiver(pre_save, sender=Airport)
+def remember_airport_coordinates(sender, instance, **kwargs):
+    instance._previous_coordinates = (
+        None
+        if instance._state.adding
+        else Airport.objects.filter(pk=instance.pk)
+        .values_list("latitude", "longitude")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Airport)
+def update_airport_coordinates(sender, instance, created, **kwargs):
+    previous_coordinates = getattr(instance, "_previous_coordinates", None)
+
+    if not created and previous_coordinates == (
+        instance.latitude,
+        instance.longitude,
+    ):
+        return
+
+    airport_index.invalidate()
+
+    if not created:
+        Route.update_distances(
+            Route.objects.filter(Q(source=instance) | Q(destination=instance))
+        )
+
+
+@receiver(post_delete, sender=Airport)
+def remove_indexed_airport(sender, instance, **kwargs):
+    airport_index.invalidate()
+
+
+@receiver(pre_save, sender=Airplane)
+def remember_airplane_geometry(sender, instance, **kwargs):
+    instance._previous_geometry = (
+        None
+        if instance._state.adding
+        else Airplane.objects.filter(pk=instance.pk)
+        .values_list("rows", "seats_in_row")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Airplane)
+def rebuild_airplane_seat_maps(sender, instance, created, **kwargs):
+    previous_geometry = getattr(instance, "_previous_geometry", None)
+
+    if created or previous_geometry == (instance.rows, instance.seats_in_row):
+        return
+
+    for flight in instance.flights.select_related("airplane"):
+        flight.rebuild_seat_map()
+
+
+@receiver(pre_save, sender=Flight)
+def remember_flight_airplane(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and "airplane" not in update_fields:
+        instance._previous_airplane_id = instance.airplane_id
+        return
+
+    instance._previous_airplane_id = (
+        None
+        if instance._state.adding
+        else Flight.objects.filter(pk=instance.pk)
+        .values_list("airplane_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Flight)
+def rebuild_flight_seat_map(sender, instance, created, **kwargs):
+    previous_airplane_id = getattr(instance, "_previous_airplane_id", None)
+
+    if not created and previous_airplane_id != instance.airplane_id:
+        instance.rebuild_seat_map()
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_ticket_seat(sender, instance, **kwargs):
+    instance._previous_seat = (
+        None
+        if instance._state.adding
+        else Ticket.objects.filter(pk=instance.pk)
+        .values_list("flight_id", "row", "seat")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Ticket)
+def take_ticket_seat(sender, instance, **kwargs):
+    previous_seat = getattr(instance, "_previous_seat", None)
+    current_seat = (instance.flight_id, instance.row, instance.seat)
+
+    if previous_seat == current_seat:
+        return
+
+    if previous_seat is not None:
+        flight_id, row, seat = previous_seat
+        Flight.update_seat_map(flight_id, [(row, seat)], taken=False)
+
+    Flight.update_seat_map(
+        instance.flight_id,
+        [(instance.row, instance.seat)],
+    )
+
+
+@receiver(pre_delete, sender=Order)
+def release_order_seats(sender, instance, **kwargs):
+    instance.release_seats()
+
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_seat(sender, instance, origin=None, **kwargs):
+    # Only the tickets deleted themselves: the tickets deleted along with
+    # their orders, ex. of a deleted user, are released in bulk by
+    # release_order_seats, and the others are deleted along with their
+    # flights, whose seats do not need to be released at all.
+    if not is_deleted_with(origin, Ticket):
+        return
+
+    Flight.update_seat_map(
+        instance.flight_id,
+        [(instance.row, instance.seat)],
+        taken=False,
+    )
+
+
+@receiver(post_save, sender=Flight)
+def update_indexed_flight(sender, instance, **kwargs):
+    if connection_index.is_built():
+        connection_index.update_flight(instance.id)
+
+
+@receiver(post_delete, sender=Flight)
+def remove_indexed_flight(sender, instance, **kwargs):
+    if connection_index.is_built():
+        connection_index.remove_flight(instance.id)
+
+
+@receiver(post_save, sender=Route)
+def invalidate_connection_index(sender, instance, created, **kwargs):
+    if not created:
+        connection_index.invalidate()
+
+
+@receiver(seats_changed)
+def update_indexed_seats(sender, flight_id, seats_available, **kwargs):
+    if connection_index.is_built():
+        connection_index.update_seats(flight_id, seats_available)
+
+
+@receiver(seats_changed)
+def notify_seat_watchers(sender, flight_id, seats_available, **kwargs):
+    seat_notifier.publish(flight_id, seats_available)
+
+
+@receiver(post_save, sender=AirplaneType)
+@receiver(post_delete, sender=AirplaneType)
+@receiver(post_save, sender=Airplane)
+@receiver(post_delete, sender=Airplane)
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=Crew)
+@receiver(post_delete, sender=Crew)
+def invalidate_cached_responses(sender, **kwargs):
+    response_cache.invalidate(sender)
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def invalidate_cached_flight_details(sender, instance, **kwargs):
+    response_cache.invalidate(flight_scope(instance.id))
+
+
+@receiver(seats_changed)
+def invalidate_cached_flight_seats(sender, flight_id, **kwargs):
+    response_cache.invalidate(flight_seats_scope(flight_id))
+
+
+@receiver(m2m_changed, sender=Flight.crews.through)
+def touch_flights_of_changed_crews(
+    sender,
+    instance,
+    action,
+    reverse,
+    pk_set,
+    **kwargs,
+):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    # Assignments are not saved with the flights, but change their payloads
+    flight_ids = (pk_set or ()) if reverse else (instance.pk,)
+    Flight.objects.filter(pk__in=flight_ids).update(updated_at=timezone.now())
+
+    for flight_id in flight_ids:
+        response_cache.invalidate(flight_scope(flight_id))
+
+
+@receiver(pre_delete, sender=Crew)
+def touch_flights_of_deleted_crew(sender, instance, **kwargs):
+    instance.flights.update(updated_at=timezone.now())
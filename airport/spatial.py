@@ -0,0 +1,165 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from airport.geo import EARTH_RADIUS_KM
+from airport.models import Airport
+
+
+def to_unit_vectors(latitudes, longitudes):
+    """Points (in degrees) on the unit sphere as rows of x, y, z"""
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    return np.column_stack(
+        (
+            np.cos(latitudes) * np.cos(longitudes),
+            np.cos(latitudes) * np.sin(longitudes),
+            np.sin(latitudes),
+        )
+    )
+
+
+def chord_length(distance_km):
+    """Straight line length through the unit sphere of the arc"""
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def arc_length_km(chords):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords / 2, 0, 1))
+
+
+class KDTree:
+    """Static 3-d tree over the points: every node keeps its bounding
+    box and the range of its points, which are stored in tree order,
+    so a leaf is a contiguous slice checked with one vectorized step"""
+
+    LEAF_SIZE = 32
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.order = np.arange(len(points))
+        # start, end, lower corner, upper corner, left child, right child
+        self.nodes = []
+
+        if len(points):
+            self.build(points, 0, len(points))
+
+        self.points = points[self.order]
+
+    def build(self, points, start, end):
+        indexes = self.order[start:end]
+        node_points = points[indexes]
+        lower = node_points.min(axis=0)
+        upper = node_points.max(axis=0)
+        node = len(self.nodes)
+        self.nodes.append([start, end, lower, upper, None, None])
+
+        if end - start > self.LEAF_SIZE:
+            axis = np.argmax(upper - lower)
+            middle = (start + end) // 2
+            partition = np.argpartition(node_points[:, axis], middle - start)
+            self.order[start:end] = indexes[partition]
+            self.nodes[node][4] = self.build(points, start, middle)
+            self.nodes[node][5] = self.build(points, middle, end)
+
+        return node
+
+    def query_ball(self, point, radius):
+        """Return the positions (in the original order) of the points
+        within the radius of the point and their distances"""
+        point = np.asarray(point, dtype=np.float64)
+        found = []
+        stack = [0] if self.nodes else []
+
+        while stack:
+            start, end, lower, upper, left, right = self.nodes[stack.pop()]
+            gap = np.maximum(lower - point, 0) + np.maximum(point - upper, 0)
+
+            if gap @ gap > radius * radius:
+                continue
+
+            reach = np.maximum(np.abs(lower - point), np.abs(upper - point))
+
+            if left is not None and reach @ reach > radius * radius:
+                stack.extend((left, right))
+                continue
+
+            # A leaf or a node whose whole box lies within the radius
+            distances = np.linalg.norm(self.points[start:end] - point, axis=1)
+            inside = np.flatnonzero(distances <= radius)
+
+            if len(inside):
+                found.append((start + inside, distances[inside]))
+
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        positions, distances = map(np.concatenate, zip(*found))
+        return self.order[positions], distances
+
+
+class AirportIndex:
+    """KD-tree of all airports on the unit sphere, rebuilt lazily after
+    an airport changes or when it gets older than AIRPORT_INDEX_TTL"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.airport_ids = np.empty(0, dtype=np.int64)
+        self.tree = KDTree([])
+        self.built_at = None
+
+    def build(self):
+        rows = list(
+            Airport.objects.values_list("id", "latitude", "longitude")
+            .order_by()
+        )
+        airport_ids, latitudes, longitudes = (
+            zip(*rows) if rows else ((), (), ())
+        )
+        tree = KDTree(to_unit_vectors(latitudes, longitudes))
+
+        with self.lock:
+            self.airport_ids = np.array(airport_ids, dtype=np.int64)
+            self.tree = tree
+            self.built_at = time.monotonic()
+
+    def is_stale(self):
+        return (
+            self.built_at is None
+            or time.monotonic() - self.built_at > settings.AIRPORT_INDEX_TTL
+        )
+
+    def invalidate(self):
+        self.built_at = None
+
+    def nearby(self, latitude, longitude, radius_km, limit):
+        """Return up to `limit` (airport id, distance in km) pairs
+        of the airports within the radius, the nearest first"""
+        with self.lock:
+            airport_ids, tree = self.airport_ids, self.tree
+
+        positions, chords = tree.query_ball(
+            to_unit_vectors([latitude], [longitude])[0],
+            chord_length(radius_km),
+        )
+        nearest = np.argsort(chords, kind="stable")[:limit]
+
+        return list(
+            zip(
+                airport_ids[positions[nearest]].tolist(),
+                arc_length_km(chords[nearest]).tolist(),
+            )
+        )
+
+
+airport_index = AirportIndex()
+
+
+def get_airport_index():
+    if airport_index.is_stale():
+        airport_index.build()
+
+    return airport_index
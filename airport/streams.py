@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from airport.models import Flight
+
+
+class SeatNotifier:
+    """Seat availability of the watched flights, shared by all the
+    streams of the worker: the changes made in this process arrive with
+    the seats_changed signal, and a single polling query for all the
+    watched flights picks up the changes made by other processes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seats = {}
+        self.watchers = defaultdict(set)
+        self.poller = None
+
+    def publish(self, flight_id, seats_available):
+        """Store the seats of the flight and wake up its watchers,
+        which can be called from any thread"""
+        with self.lock:
+            if (
+                flight_id not in self.watchers
+                or self.seats.get(flight_id) == seats_available
+            ):
+                return
+
+            self.seats[flight_id] = seats_available
+            watchers = list(self.watchers.get(flight_id, ()))
+
+        for loop, event in watchers:
+            loop.call_soon_threadsafe(event.set)
+
+    def subscribe(self, flight_id, seats_available):
+        loop = asyncio.get_running_loop()
+        watcher = loop, asyncio.Event()
+
+        with self.lock:
+            # Another stream may already know of a newer change
+            if self.seats.setdefault(flight_id, seats_available) != (
+                seats_available
+            ):
+                watcher[1].set()
+
+            self.watchers[flight_id].add(watcher)
+
+        if (
+            self.poller is None
+            or self.poller.done()
+            or self.poller.get_loop() is not loop
+        ):
+            self.poller = loop.create_task(self.poll())
+
+        return watcher
+
+    def unsubscribe(self, flight_id, watcher):
+        with self.lock:
+            self.watchers[flight_id].discard(watcher)
+
+            if not self.watchers[flight_id]:
+                del self.watchers[flight_id]
+                self.seats.pop(flight_id, None)
+
+    def get_seats(self, flight_id):
+        return self.seats.get(flight_id)
+
+    async def poll(self):
+        while self.watchers:
+            await asyncio.sleep(settings.SEAT_STREAM_POLL_INTERVAL)
+
+            with self.lock:
+                flight_ids = list(self.watchers)
+
+            async for flight_id, seats_available in Flight.objects.filter(
+                pk__in=flight_ids
+            ).values_list("id", "seats_available"):
+                self.publish(flight_id, seats_available)
+
+    async def watch(self, flight_id, seats_available):
+        """Yield the seats of the flight whenever they change,
+        or None after a heartbeat interval without changes"""
+        loop, event = watcher = self.subscribe(flight_id, seats_available)
+
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(
+                        event.wait(),
+                        settings.SEAT_STREAM_HEARTBEAT_INTERVAL,
+                    )
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+
+                event.clear()
+                yield self.get_seats(flight_id)
+        finally:
+            self.unsubscribe(flight_id, watcher)
+
+
+seat_notifier = SeatNotifier()
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_seats(flight_id, seats_available):
+    """Server-Sent Events with the current seats of the flight followed by
+    the deltas, where a slow client only gets the latest change"""
+    yield format_event(
+        "seats",
+        {"flight": flight_id, "seats_available": seats_available, "delta": 0},
+    )
+
+    async for seats in seat_notifier.watch(flight_id, seats_available):
+        if seats is None:
+            yield ": keep-alive\n\n"
+        elif seats != seats_available:
+            yield format_event(
+                "seats",
+                {
+                    "flight": flight_id,
+                    "seats_available": seats,
+                    "delta": seats - seats_available,
+                },
+            )
+            seats_available = seats
@@ -6,12 +6,14 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from airport.models import Airplane, AirplaneType
+from airport.response_cache import response_cache
 from airport.serializers import (
     AirplaneListSerializer,
     AirplaneDetailSerializer,
 )
 
 AIRPLANE_URL = reverse("airport:airplane-list")
+ASYNC_AIRPLANE_URL = reverse("airport:async-airplane-list")
 
 
 def sample_airplane(**params):
@@ -52,6 +54,7 @@ class AuthenticatedAirplaneApiTests(TestCase):
             "test_pass",
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_list_airplanes(self):
         sample_airplane()
@@ -103,6 +106,42 @@ class AuthenticatedAirplaneApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_200_OK)
         self.assertEquals(res.data, serializer.data)
 
+    def test_async_list_airplanes(self):
+        airplane = sample_airplane()
+        sample_airplane()
+
+        res = self.client.get(
+            ASYNC_AIRPLANE_URL,
+            {"airplane_type": airplane.airplane_type_id},
+        )
+
+        serializer = AirplaneListSerializer(airplane)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data["results"], [serializer.data])
+
+    def test_async_retrieve_airplane_detail(self):
+        airplane = sample_airplane()
+
+        res = self.client.get(
+            reverse("airport:async-airplane-detail", args=[airplane.id])
+        )
+
+        serializer = AirplaneDetailSerializer(airplane)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data, serializer.data)
+
+    def test_cached_airplanes_invalidated_by_new_airplane(self):
+        sample_airplane()
+        self.client.get(AIRPLANE_URL)
+
+        sample_airplane()
+        res = self.client.get(AIRPLANE_URL)
+
+        self.assertEquals(res["X-Cache"], "MISS")
+        self.assertEquals(res.data["count"], 2)
+
     def test_create_airplane_forbidden(self):
         airplane_type = AirplaneType.objects.create(
             name="NB",
@@ -148,6 +187,7 @@ class AdminAirplaneApiTests(TestCase):
             is_staff=True,
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_create_airplane(self):
         airplane_type = AirplaneType.objects.create(
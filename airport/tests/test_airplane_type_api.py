@@ -6,6 +6,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from airport.models import AirplaneType
+from airport.response_cache import response_cache
 from airport.serializers import AirplaneTypeSerializer
 
 AIRPLANE_TYPE_URL = reverse("airport:airplanetype-list")
@@ -42,6 +43,7 @@ class AuthenticatedAirplaneTypeApiTests(TestCase):
             "test_pass",
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_list_airplane_types(self):
         sample_airplane_type()
@@ -104,6 +106,7 @@ class AdminAirplaneTypeApiTests(TestCase):
             is_staff=True,
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_create_airplane_type(self):
         payload = {
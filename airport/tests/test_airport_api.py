@@ -1,17 +1,31 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
-from airport.models import Airport
+from airport.models import (
+    Airport,
+    calculate_distance_between_two_coordinates,
+)
+from airport.response_cache import response_cache
+from airport.spatial import airport_index
 from airport.serializers import (
     AirportListSerializer,
     AirportDetailSerializer,
 )
 
 AIRPORT_URL = reverse("airport:airport-list")
+DISTANCE_MATRIX_URL = reverse("airport:airport-distance-matrix")
+NEARBY_URL = reverse("airport:airport-nearby")
+ASYNC_AIRPORT_URL = reverse("airport:async-airport-list")
 
 
 def sample_airport(**params):
@@ -30,6 +44,10 @@ def detail_url(airport_id):
     return reverse("airport:airport-detail", args=[airport_id])
 
 
+def async_detail_url(airport_id):
+    return reverse("airport:async-airport-detail", args=[airport_id])
+
+
 class UnauthenticatedAirportApiTests(TestCase):
     def setUp(self) -> None:
         self.client = APIClient()
@@ -39,6 +57,11 @@ class UnauthenticatedAirportApiTests(TestCase):
 
         self.assertEquals(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    async def test_async_auth_required(self):
+        res = await self.async_client.get(ASYNC_AIRPORT_URL)
+
+        self.assertEquals(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
 
 class AuthenticatedAirportApiTests(TestCase):
     def setUp(self) -> None:
@@ -48,6 +71,8 @@ class AuthenticatedAirportApiTests(TestCase):
             "test_pass",
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
+        airport_index.invalidate()
 
     def test_list_airports(self):
         sample_airport(
@@ -123,6 +148,87 @@ class AuthenticatedAirportApiTests(TestCase):
         self.assertIn(serializer2.data, res.data["results"])
         self.assertNotIn(serializer3.data, res.data["results"])
 
+    def test_list_airports_not_modified(self):
+        airport = sample_airport(name="Test Name A", iata_code="AAA")
+        res = self.client.get(AIRPORT_URL, {"city": "Test City"})
+
+        with self.assertNumQueries(1):
+            res_not_modified = self.client.get(
+                AIRPORT_URL,
+                {"city": "Test City"},
+                HTTP_IF_NONE_MATCH=res["ETag"],
+            )
+
+        airport.name = "Renamed"
+        airport.save()
+        res_modified = self.client.get(
+            AIRPORT_URL,
+            {"city": "Test City"},
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+        res_other_query = self.client.get(
+            AIRPORT_URL,
+            {"city": "Test City", "page_size": 5},
+            HTTP_IF_NONE_MATCH=res_modified["ETag"],
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            res_not_modified.status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEquals(res_not_modified["ETag"], res["ETag"])
+        self.assertEquals(res_not_modified.content, b"")
+        self.assertEquals(res_modified.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(res_modified["ETag"], res["ETag"])
+        self.assertEquals(res_other_query.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_airport_not_modified_since(self):
+        airport = sample_airport(name="Test Name A", iata_code="AAA")
+        # Changed in an earlier second than the current one
+        Airport.objects.filter(pk=airport.id).update(
+            updated_at=timezone.now() - timedelta(minutes=1)
+        )
+        res = self.client.get(detail_url(airport.id))
+
+        res_not_modified = self.client.get(
+            detail_url(airport.id),
+            HTTP_IF_MODIFIED_SINCE=res["Last-Modified"],
+        )
+
+        self.assertEquals(
+            res_not_modified.status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+    def test_retrieve_airport_changed_this_second(self):
+        airport = sample_airport(name="Test Name A", iata_code="AAA")
+
+        res = self.client.get(detail_url(airport.id))
+
+        self.assertNotIn("Last-Modified", res)
+        self.assertIn("ETag", res)
+
+    def test_list_airports_modified_by_delete(self):
+        sample_airport(name="Test Name A", iata_code="AAA")
+        airport = sample_airport(name="Test Name B", iata_code="BBB")
+        res = self.client.get(AIRPORT_URL)
+        airport.delete()
+
+        res_deleted = self.client.get(
+            AIRPORT_URL,
+            HTTP_IF_MODIFIED_SINCE=http_date(),
+        )
+
+        self.assertNotIn("Last-Modified", res)
+        self.assertEquals(res_deleted.status_code, status.HTTP_200_OK)
+        self.assertEquals(res_deleted.data["count"], 1)
+
+    def test_retrieve_unknown_airport_with_etag(self):
+        res = self.client.get(detail_url(0), HTTP_IF_NONE_MATCH="*")
+
+        self.assertEquals(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_retrieve_airport_detail(self):
         airport = sample_airport(
             name="Test Name A",
@@ -137,6 +243,117 @@ class AuthenticatedAirportApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_200_OK)
         self.assertEquals(res.data, serializer.data)
 
+    def test_nearby_airports(self):
+        kbp = sample_airport(
+            name="Boryspil",
+            iata_code="KBP",
+            latitude=50.345,
+            longitude=30.8947,
+        )
+        iev = sample_airport(
+            name="Zhuliany",
+            iata_code="IEV",
+            latitude=50.4017,
+            longitude=30.4497,
+        )
+        sample_airport(
+            name="Heathrow",
+            iata_code="LHR",
+            latitude=51.4706,
+            longitude=-0.461941,
+        )
+
+        res = self.client.get(
+            NEARBY_URL,
+            {"lat": 50.4501, "lon": 30.5234, "radius_km": 100},
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [airport["id"] for airport in res.data],
+            [iev.id, kbp.id],
+        )
+        self.assertAlmostEqual(res.data[0]["distance_km"], 7.3, delta=0.5)
+
+        res_limited = self.client.get(
+            NEARBY_URL,
+            {"lat": 50.4501, "lon": 30.5234, "radius_km": 100, "limit": 1},
+        )
+
+        self.assertEquals(
+            [airport["id"] for airport in res_limited.data],
+            [iev.id],
+        )
+
+    def test_nearby_airports_follow_airport_changes(self):
+        search = {"lat": 10, "lon": 10, "radius_km": 50}
+        airport = sample_airport(name="Moved", iata_code="MVD")
+        self.client.get(NEARBY_URL, search)
+
+        airport.latitude = 10
+        airport.longitude = 10.1
+        airport.save()
+        res = self.client.get(NEARBY_URL, search)
+
+        self.assertEquals(
+            [airport["id"] for airport in res.data],
+            [airport.id],
+        )
+
+    def test_nearby_airports_invalid_coordinates(self):
+        res = self.client.get(NEARBY_URL, {"lat": 91, "lon": 10})
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("lat", res.data)
+
+    def test_distance_matrix(self):
+        airports = [
+            sample_airport(
+                name="Boryspil",
+                iata_code="KBP",
+                latitude=50.345,
+                longitude=30.8947,
+            ),
+            sample_airport(
+                name="Heathrow",
+                iata_code="LHR",
+                latitude=51.4706,
+                longitude=-0.461941,
+            ),
+            sample_airport(
+                name="Kennedy",
+                iata_code="JFK",
+                latitude=40.6413,
+                longitude=-73.7781,
+            ),
+        ]
+
+        res = self.client.get(DISTANCE_MATRIX_URL, {"iata": "kbp,LHR, JFK"})
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data["iata_codes"], ["KBP", "LHR", "JFK"])
+
+        for i, source in enumerate(airports):
+            for j, destination in enumerate(airports):
+                self.assertAlmostEqual(
+                    res.data["distances_km"][i][j],
+                    calculate_distance_between_two_coordinates(
+                        source.latitude,
+                        source.longitude,
+                        destination.latitude,
+                        destination.longitude,
+                    ),
+                    places=1,
+                )
+
+    def test_distance_matrix_unknown_airports(self):
+        sample_airport(name="Boryspil", iata_code="KBP")
+
+        res = self.client.get(DISTANCE_MATRIX_URL, {"iata": "KBP,XXX"})
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("XXX", str(res.data["iata"]))
+
     def test_create_airport_forbidden(self):
         payload = {
             "name": "Test Name",
@@ -177,6 +394,80 @@ class AuthenticatedAirportApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class AsyncAirportApiTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "test_pass",
+        )
+        self.headers = {
+            "Authorization": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        response_cache.clear()
+
+        for i in range(7):
+            sample_airport(
+                name=f"Test Name {i}",
+                city=f"Test City {i % 2}",
+                iata_code=f"A{i}",
+            )
+
+    async def test_async_list_airports(self):
+        params = {"city": "Test City 0", "page": 2, "page_size": 3}
+
+        res = await self.async_client.get(
+            ASYNC_AIRPORT_URL,
+            params,
+            headers=self.headers,
+        )
+        sync_res = await sync_to_async(self.client.get)(AIRPORT_URL, params)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.json()["count"], 4)
+        self.assertEquals(
+            res.json()["previous"],
+            "http://testserver" + ASYNC_AIRPORT_URL
+            + "?city=Test+City+0&page_size=3",
+        )
+        self.assertEquals(
+            res.json()["results"],
+            sync_res.json()["results"],
+        )
+
+    async def test_async_list_airports_invalid_page(self):
+        res = await self.async_client.get(
+            ASYNC_AIRPORT_URL,
+            {"page": 10},
+            headers=self.headers,
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_retrieve_airport(self):
+        airport = await Airport.objects.aget(iata_code="A3")
+
+        res = await self.async_client.get(
+            async_detail_url(airport.id),
+            headers=self.headers,
+        )
+        sync_res = await sync_to_async(self.client.get)(
+            detail_url(airport.id)
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.json(), sync_res.json())
+
+    async def test_async_retrieve_unknown_airport(self):
+        res = await self.async_client.get(
+            async_detail_url(0),
+            headers=self.headers,
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
 class AdminAirportApiTests(TestCase):
     def setUp(self) -> None:
         self.client = APIClient()
@@ -186,6 +477,7 @@ class AdminAirportApiTests(TestCase):
             is_staff=True,
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_create_airport(self):
         payload = {
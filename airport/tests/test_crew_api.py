@@ -10,8 +10,11 @@ from airport.serializers import (
     CrewListSerializer,
     CrewDetailSerializer,
 )
+from airport.tests.test_order_api import sample_flight
 
 CREW_URL = reverse("airport:crew-list")
+CREW_AVAILABLE_URL = reverse("airport:crew-available")
+ASYNC_CREW_URL = reverse("airport:async-crew-list")
 
 
 def sample_crew(**params):
@@ -60,6 +63,55 @@ class AuthenticatedCrewApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_200_OK)
         self.assertEquals(res.data["results"], serializer.data)
 
+    def test_available_crews(self):
+        free = sample_crew(position="FO")
+        flying = sample_crew(position="FO")
+        resting = sample_crew(position="FO")
+        sample_crew(position="CPT")
+        sample_flight(
+            departure_time="2023-09-15 15:00+03:00",
+            arrival_time="2023-09-15 17:00+03:00",
+        ).crews.add(flying)
+        sample_flight(
+            route=flying.flights.get().route,
+            airplane=flying.flights.get().airplane,
+            departure_time="2023-09-15 10:00+03:00",
+            arrival_time="2023-09-15 13:30+03:00",
+        ).crews.add(resting)
+        search = {
+            "position": "FO",
+            "start": "2023-09-15 14:00+03:00",
+            "end": "2023-09-15 20:00+03:00",
+        }
+
+        res = self.client.get(CREW_AVAILABLE_URL, search)
+        res_rested = self.client.get(
+            CREW_AVAILABLE_URL,
+            {**search, "rest_minutes": 60},
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            {crew["id"] for crew in res.data["results"]},
+            {free.id, resting.id},
+        )
+        self.assertEquals(
+            [crew["id"] for crew in res_rested.data["results"]],
+            [free.id],
+        )
+
+    def test_available_crews_invalid_period(self):
+        res = self.client.get(
+            CREW_AVAILABLE_URL,
+            {
+                "start": "2023-09-15 20:00+03:00",
+                "end": "2023-09-15 14:00+03:00",
+            },
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("end", res.data)
+
     def test_filter_crew_by_position(self):
         crew1 = sample_crew()
         crew2 = sample_crew()
@@ -78,6 +130,25 @@ class AuthenticatedCrewApiTests(TestCase):
         self.assertIn(serializer2.data, res.data["results"])
         self.assertNotIn(serializer3.data, res.data["results"])
 
+    def test_async_filter_crew_by_position(self):
+        crew = sample_crew(position="CPT")
+        sample_crew()
+
+        res = self.client.get(ASYNC_CREW_URL, {"position": "CPT"})
+
+        serializer = CrewListSerializer(crew)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data["results"], [serializer.data])
+
+    def test_async_create_crew_not_allowed(self):
+        res = self.client.post(ASYNC_CREW_URL, {"first_name": "Test"})
+
+        self.assertEquals(
+            res.status_code,
+            status.HTTP_405_METHOD_NOT_ALLOWED,
+        )
+
     def test_retrieve_crew_detail(self):
         crew = sample_crew()
 
@@ -1,23 +1,45 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
+from airport.connections import connection_index
+from airport.holds import create_hold
 from airport.models import (
     Flight,
+    FlightCrew,
+    Ticket,
     Airport,
     Route,
     Crew,
 )
+from airport.response_cache import response_cache
 from airport.serializers import (
     FlightListSerializer,
     FlightDetailSerializer,
+    RouteListSerializer,
 )
 from airport.tests.test_airplane_api import sample_airplane
+from airport.tests.test_order_api import sample_flight, sample_order
+from airport.streams import seat_notifier
+from airport.tests.test_route_api import sample_airport
 
 FLIGHT_URL = reverse("airport:flight-list")
+FLIGHT_SEARCH_URL = reverse("airport:flight-search")
+FLIGHT_CONNECTIONS_URL = reverse("airport:flight-connections")
 NUMBER_OF_FLIGHTS = 5
 PAGINATION_COUNT = 5
 
@@ -82,6 +104,94 @@ def detail_url(flight_id):
     return reverse("airport:flight-detail", args=[flight_id])
 
 
+def seat_map_url(flight_id):
+    return reverse("airport:flight-seat-map", args=[flight_id])
+
+
+def holds_url(flight_id):
+    return reverse("airport:flight-hold-seats", args=[flight_id])
+
+
+def hold_detail_url(flight_id, hold_id):
+    return reverse(
+        "airport:flight-release-seats-hold",
+        args=[flight_id, hold_id],
+    )
+
+
+def allocate_seats_url(flight_id):
+    return reverse("airport:flight-allocate-seats", args=[flight_id])
+
+
+def seats_stream_url(flight_id):
+    return reverse("airport:flight-seats-stream", args=[flight_id])
+
+
+def read_event(chunk):
+    event, data = chunk.decode().strip().split("\n")
+    return event.removeprefix("event: "), json.loads(
+        data.removeprefix("data: ")
+    )
+
+
+def sample_route_between(source_iata, destination_iata):
+    return Route.objects.create(
+        source=sample_airport(name=source_iata, iata_code=source_iata),
+        destination=sample_airport(
+            name=destination_iata,
+            iata_code=destination_iata,
+        ),
+    )
+
+
+def create_connection_network():
+    kbp = sample_airport(name="Boryspil", iata_code="KBP")
+    waw = sample_airport(name="Chopin", iata_code="WAW")
+    lhr = sample_airport(name="Heathrow", iata_code="LHR")
+    airplane = sample_airplane()
+
+    return {
+        "direct": sample_flight(
+            route=Route.objects.create(source=kbp, destination=lhr),
+            airplane=airplane,
+            departure_time="2023-09-15 10:00+03:00",
+            arrival_time="2023-09-15 16:00+03:00",
+        ),
+        "first_leg": sample_flight(
+            route=Route.objects.create(source=kbp, destination=waw),
+            airplane=airplane,
+            departure_time="2023-09-15 08:00+03:00",
+            arrival_time="2023-09-15 09:30+03:00",
+        ),
+        "tight_leg": sample_flight(
+            route=Route.objects.create(source=waw, destination=lhr),
+            airplane=airplane,
+            departure_time="2023-09-15 09:50+03:00",
+            arrival_time="2023-09-15 12:00+03:00",
+        ),
+        "second_leg": sample_flight(
+            route=Route.objects.get(source=waw, destination=lhr),
+            airplane=airplane,
+            departure_time="2023-09-15 11:00+03:00",
+            arrival_time="2023-09-15 13:30+03:00",
+        ),
+    }
+
+
+def connection_search(**params):
+    search = {
+        "source": "KBP",
+        "destination": "LHR",
+        "date_from": "2023-09-15",
+    }
+    search.update(params)
+    return search
+
+
+def hold_payload(seats):
+    return {"seats": [{"row": row, "seat": seat} for row, seat in seats]}
+
+
 class UnauthenticatedFlightApiTests(TestCase):
     def setUp(self) -> None:
         self.client = APIClient()
@@ -100,6 +210,17 @@ class AuthenticatedFlightApiTests(TestCase):
             "test_pass",
         )
         self.client.force_authenticate(self.user)
+        cache.clear()
+        response_cache.clear()
+        connection_index.invalidate()
+        # The sample flights depart in 2023, so the connection index
+        # is built as if they had not departed yet
+        self.set_connection_index_time("2023-09-01 00:00+00:00")
+
+    def set_connection_index_time(self, now):
+        patcher = patch("airport.connections.timezone")
+        patcher.start().now.return_value = datetime.fromisoformat(now)
+        self.addCleanup(patcher.stop)
 
     def test_list_flights(self):
         airports = create_airports()
@@ -111,7 +232,7 @@ class AuthenticatedFlightApiTests(TestCase):
 
         res = self.client.get(FLIGHT_URL)
 
-        flights = Flight.objects.order_by("id")
+        flights = Flight.objects.all()
         serializer = FlightListSerializer(flights, many=True)
 
         self.assertEquals(res.status_code, status.HTTP_200_OK)
@@ -123,6 +244,82 @@ class AuthenticatedFlightApiTests(TestCase):
                     serializer.data[i][key],
                 )
 
+    def test_list_flights_with_cursor_pagination(self):
+        route = sample_route_between("CUA", "CUB")
+        airplane = sample_airplane()
+        flights = [
+            sample_flight(
+                route=route,
+                airplane=airplane,
+                departure_time=f"2023-09-{15 + i // 2} 12:00+03:00",
+                arrival_time=f"2023-09-{15 + i // 2} 15:00+03:00",
+            )
+            for i in range(7)
+        ]
+        expected_ids = [
+            flight.id
+            for flight in sorted(
+                flights,
+                key=lambda flight: (flight.departure_time, flight.id),
+                reverse=True,
+            )
+        ]
+
+        # No COUNT(*): the flights page and the crews prefetch only
+        with self.assertNumQueries(2):
+            res = self.client.get(FLIGHT_URL, {"pagination": "cursor"})
+
+        next_res = self.client.get(res.data["next"])
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertEquals(
+            [flight["id"] for flight in res.data["results"]]
+            + [flight["id"] for flight in next_res.data["results"]],
+            expected_ids,
+        )
+        self.assertIsNone(next_res.data["next"])
+
+    def test_list_flights_with_sparse_fields(self):
+        flight = sample_flight()
+        flight.crews.add(*create_crews(2))
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                FLIGHT_URL,
+                {"fields": "id,departure_time,tickets_available"},
+            )
+
+        result = res.data["results"][0]
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            set(result),
+            {"id", "departure_time", "tickets_available"},
+        )
+        self.assertEquals(result["id"], flight.id)
+        self.assertEquals(result["tickets_available"], 50)
+
+    def test_list_flights_with_expanded_fields(self):
+        flight = sample_flight()
+        crews = create_crews(2)
+        flight.crews.add(*crews)
+
+        res = self.client.get(
+            FLIGHT_URL,
+            {"fields": "id", "expand": "route,crews"},
+        )
+
+        result = res.data["results"][0]
+        self.assertEquals(set(result), {"id", "route", "crews"})
+        self.assertEquals(
+            result["route"],
+            RouteListSerializer(flight.route).data,
+        )
+        self.assertEquals(
+            [crew["id"] for crew in result["crews"]],
+            [crew.id for crew in Crew.objects.all()],
+        )
+
     def test_retrieve_flight_detail(self):
         airports = create_airports()
         routes = create_routes(airports)
@@ -141,6 +338,677 @@ class AuthenticatedFlightApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_200_OK)
         self.assertEquals(res.data, serializer.data)
 
+    def test_flight_detail_modified_by_seats_and_crews(self):
+        flight = sample_flight()
+        res = self.client.get(detail_url(flight.id))
+
+        res_not_modified = self.client.get(
+            detail_url(flight.id),
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_order(self.user, flight, [(1, 1)])
+
+        res_seats = self.client.get(
+            detail_url(flight.id),
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+        flight.crews.add(*create_crews(1))
+        res_crews = self.client.get(
+            detail_url(flight.id),
+            HTTP_IF_NONE_MATCH=res_seats["ETag"],
+        )
+
+        self.assertEquals(
+            res_not_modified.status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEquals(res_seats.status_code, status.HTTP_200_OK)
+        self.assertEquals(res_seats.data["taken_seats"], [{"row": 1, "seat": 1}])
+        self.assertEquals(res_crews.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(res_crews.data["crews"]), 1)
+
+    def test_flight_detail_rebuilds_seats_only_on_ticket_change(self):
+        flight = sample_flight()
+        self.client.get(detail_url(flight.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sample_order(self.user, flight, [(2, 3)])
+
+        # The ETag aggregate and the seat map of the flight only
+        with self.assertNumQueries(2):
+            res = self.client.get(detail_url(flight.id))
+
+        with self.assertNumQueries(1):
+            res_cached = self.client.get(detail_url(flight.id))
+
+        self.assertEquals(res.data["taken_seats"], [{"row": 2, "seat": 3}])
+        self.assertEquals(res_cached.data, res.data)
+        self.assertEquals(
+            res.data,
+            FlightDetailSerializer(Flight.objects.get(id=flight.id)).data,
+        )
+
+    def test_flight_detail_seats_changed_by_another_worker(self):
+        flight = sample_flight()
+        res = self.client.get(detail_url(flight.id))
+        # Not invalidated here, as if another worker sold the seat
+        sample_order(self.user, flight, [(2, 3)])
+
+        res_changed = self.client.get(
+            detail_url(flight.id),
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+
+        self.assertEquals(res_changed.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            res_changed.data["taken_seats"],
+            [{"row": 2, "seat": 3}],
+        )
+
+    def test_flight_detail_static_part_invalidated(self):
+        flight = sample_flight()
+        self.client.get(detail_url(flight.id))
+
+        flight.route.source.name = "Renamed"
+        flight.route.source.save()
+        res = self.client.get(detail_url(flight.id))
+
+        self.assertEquals(res.data["route"]["source"]["name"], "Renamed")
+
+    def test_retrieve_flight_taken_seats(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(2, 3), (1, 5)])
+
+        res = self.client.get(detail_url(flight.id))
+
+        self.assertEquals(
+            res.data["taken_seats"],
+            [{"row": 1, "seat": 5}, {"row": 2, "seat": 3}],
+        )
+
+    def test_retrieve_flight_seat_map(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 1), (1, 2), (2, 4)])
+
+        res = self.client.get(seat_map_url(flight.id))
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data["rows"], 10)
+        self.assertEquals(res.data["seats_in_row"], 5)
+        self.assertEquals(res.data["seats_taken"], 3)
+        self.assertEquals(res.data["encoding"], "base64")
+        self.assertEquals(res.data["seat_map"], "AwEAAAAAAA==")
+
+    def test_retrieve_flight_seat_map_run_lengths(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 1), (1, 2), (2, 4)])
+
+        res = self.client.get(seat_map_url(flight.id), {"encoding": "rle"})
+
+        self.assertEquals(res.data["seat_map"], [0, 2, 6, 1, 41])
+
+    def test_retrieve_flight_seat_map_invalid_encoding(self):
+        flight = sample_flight()
+
+        res = self.client.get(seat_map_url(flight.id), {"encoding": "png"})
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_seat_map_released_on_order_delete(self):
+        flight = sample_flight()
+        order = sample_order(self.user, flight, [(1, 1), (3, 3)])
+        sample_order(self.user, flight, [(4, 4)])
+
+        order.delete()
+
+        res = self.client.get(seat_map_url(flight.id), {"encoding": "rle"})
+
+        self.assertEquals(res.data["seats_taken"], 1)
+        self.assertEquals(res.data["seat_map"], [18, 1, 31])
+
+    def test_filter_flights_by_seats_available(self):
+        flight_with_seats = sample_flight()
+        full_flight = sample_flight(
+            route=flight_with_seats.route,
+            airplane=sample_airplane(rows=1, seats_in_row=2),
+        )
+        sample_order(self.user, full_flight, [(1, 1), (1, 2)])
+
+        res = self.client.get(FLIGHT_URL, {"seats_available__gte": 1})
+
+        self.assertEquals(
+            [flight["id"] for flight in res.data["results"]],
+            [flight_with_seats.id],
+        )
+
+    def test_order_flights_by_seats_available(self):
+        flight1 = sample_flight()
+        flight2 = sample_flight(
+            route=flight1.route,
+            departure_time="2023-09-14 12:00+03:00",
+        )
+        sample_order(self.user, flight1, [(1, 1), (1, 2)])
+
+        res = self.client.get(FLIGHT_URL, {"ordering": "seats_available"})
+
+        self.assertEquals(
+            [
+                (flight["id"], flight["tickets_available"])
+                for flight in res.data["results"]
+            ],
+            [(flight1.id, 48), (flight2.id, 50)],
+        )
+
+    def test_reconcile_flight_seats(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 1), (2, 2)])
+        Flight.objects.filter(pk=flight.id).update(
+            seat_map=b"",
+            seats_available=0,
+        )
+        out = StringIO()
+
+        call_command("reconcile_flight_seats", stdout=out)
+
+        flight.refresh_from_db()
+        self.assertIn("1 reconciled", out.getvalue())
+        self.assertEquals(flight.seats_available, 48)
+        self.assertEquals(
+            flight.taken_seats,
+            [{"row": 1, "seat": 1}, {"row": 2, "seat": 2}],
+        )
+
+    def test_hold_seats(self):
+        flight = sample_flight()
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1), (1, 2)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(res.data["flight"], flight.id)
+        self.assertEquals(
+            res.data["seats"],
+            [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}],
+        )
+        self.assertIn("expires_at", res.data)
+
+    def test_hold_seats_held_by_another_user(self):
+        flight = sample_flight()
+        self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1)]),
+            format="json",
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("other@test.com", "pass")
+        )
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 2), (1, 1)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(res.data["seats"][0], {})
+        self.assertIn("non_field_errors", res.data["seats"][1])
+
+    @override_settings(SEAT_HOLD_TTL=0)
+    def test_hold_seats_after_hold_expired(self):
+        flight = sample_flight()
+        self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1)]),
+            format="json",
+        )
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+
+    def test_hold_booked_or_invalid_seats(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(2, 2)])
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(2, 2), (11, 1)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", res.data["seats"][0])
+        self.assertIn("row", res.data["seats"][1])
+
+    def test_release_seats_hold(self):
+        flight = sample_flight()
+        hold = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1)]),
+            format="json",
+        ).data
+
+        res = self.client.delete(hold_detail_url(flight.id, hold["id"]))
+        self.assertEquals(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("other@test.com", "pass")
+        )
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1)]),
+            format="json",
+        )
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(SEAT_HOLD_MAX_SEATS=2)
+    def test_hold_too_many_seats(self):
+        flight = sample_flight()
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1), (1, 2), (1, 3)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("seats", res.data)
+
+    @override_settings(SEAT_HOLD_MAX_PER_USER=2)
+    def test_hold_seats_over_user_holds_limit(self):
+        flight = sample_flight()
+        holds = [
+            self.client.post(
+                holds_url(flight.id),
+                hold_payload([(1, seat)]),
+                format="json",
+            ).data
+            for seat in (1, 2)
+        ]
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 3)]),
+            format="json",
+        )
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.delete(hold_detail_url(flight.id, holds[0]["id"]))
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 3)]),
+            format="json",
+        )
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(SEAT_HOLD_MAX_PER_USER=1)
+    def test_failed_hold_does_not_count_to_user_holds_limit(self):
+        flight = sample_flight()
+        create_hold(self.user.id + 1, flight.id, [(1, 1)])
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 1)]),
+            format="json",
+        )
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(
+            holds_url(flight.id),
+            hold_payload([(1, 2)]),
+            format="json",
+        )
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+
+    def test_allocate_seats_together(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 3)])
+
+        res = self.client.get(allocate_seats_url(flight.id), {"passengers": 2})
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            res.data,
+            {
+                "seats": [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}],
+                "seated_together": True,
+            },
+        )
+
+    def test_allocate_seats_by_window(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 1)])
+
+        res = self.client.get(
+            allocate_seats_url(flight.id),
+            {"passengers": 3, "window": "true"},
+        )
+
+        self.assertEquals(
+            res.data["seats"],
+            [
+                {"row": 1, "seat": 3},
+                {"row": 1, "seat": 4},
+                {"row": 1, "seat": 5},
+            ],
+        )
+
+    def test_allocate_seats_in_front_rows(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 5), (2, 4)])
+
+        best_fit_res = self.client.get(
+            allocate_seats_url(flight.id),
+            {"passengers": 3},
+        )
+        front_res = self.client.get(
+            allocate_seats_url(flight.id),
+            {"passengers": 3, "front": "true"},
+        )
+
+        self.assertEquals(best_fit_res.data["seats"][0], {"row": 2, "seat": 1})
+        self.assertEquals(front_res.data["seats"][0], {"row": 1, "seat": 1})
+
+    def test_allocate_seats_split_party(self):
+        flight = sample_flight(
+            airplane=sample_airplane(rows=3, seats_in_row=2),
+        )
+        create_hold(self.user.id, flight.id, [(1, 1)])
+
+        res = self.client.get(allocate_seats_url(flight.id), {"passengers": 3})
+
+        self.assertEquals(
+            res.data,
+            {
+                "seats": [
+                    {"row": 2, "seat": 1},
+                    {"row": 2, "seat": 2},
+                    {"row": 3, "seat": 1},
+                ],
+                "seated_together": False,
+            },
+        )
+
+    def test_allocate_seats_not_enough_free_seats(self):
+        flight = sample_flight(
+            airplane=sample_airplane(rows=1, seats_in_row=2),
+        )
+
+        res = self.client.get(allocate_seats_url(flight.id), {"passengers": 3})
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_book_allocated_seats(self):
+        flight = sample_flight()
+
+        res = self.client.post(
+            allocate_seats_url(flight.id),
+            {"passengers": 2},
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(
+            [(ticket["row"], ticket["seat"]) for ticket in res.data["tickets"]],
+            [(1, 1), (1, 2)],
+        )
+        self.assertEquals(
+            Ticket.objects.filter(order__user=self.user).count(),
+            2,
+        )
+
+    def test_search_flights(self):
+        kbp = sample_airport(name="Boryspil", iata_code="KBP")
+        lhr = sample_airport(name="Heathrow", iata_code="LHR")
+        route = Route.objects.create(source=kbp, destination=lhr)
+        back_route = Route.objects.create(source=lhr, destination=kbp)
+        airplane = sample_airplane()
+        small_airplane = sample_airplane(rows=1, seats_in_row=1)
+        flight1 = sample_flight(
+            route=route,
+            airplane=airplane,
+            departure_time="2023-09-15 06:00+03:00",
+        )
+        flight2 = sample_flight(
+            route=route,
+            airplane=airplane,
+            departure_time="2023-09-16 23:30+03:00",
+        )
+        sample_flight(
+            route=route,
+            airplane=airplane,
+            departure_time="2023-09-17 00:30+03:00",
+        )
+        sample_flight(
+            route=back_route,
+            airplane=airplane,
+            departure_time="2023-09-15 12:00+03:00",
+        )
+        full_flight = sample_flight(
+            route=route,
+            airplane=small_airplane,
+            departure_time="2023-09-15 12:00+03:00",
+        )
+        sample_order(self.user, full_flight, [(1, 1)])
+
+        res = self.client.get(
+            FLIGHT_SEARCH_URL,
+            {
+                "source": "kbp",
+                "destination": "LHR",
+                "date_from": "2023-09-15",
+                "date_to": "2023-09-16",
+            },
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [flight["id"] for flight in res.data["results"]],
+            [flight1.id, flight2.id],
+        )
+
+    def test_search_flights_with_cursor_pagination(self):
+        route = Route.objects.create(
+            source=sample_airport(name="Boryspil", iata_code="KBP"),
+            destination=sample_airport(name="Heathrow", iata_code="LHR"),
+        )
+        airplane = sample_airplane()
+        flights = [
+            sample_flight(
+                route=route,
+                airplane=airplane,
+                departure_time=f"2023-09-15 {hour:02}:00+03:00",
+                arrival_time=f"2023-09-15 {hour + 1:02}:00+03:00",
+            )
+            for hour in (12, 6, 18)
+        ]
+        search = {
+            "source": "KBP",
+            "destination": "LHR",
+            "date_from": "2023-09-15",
+            "date_to": "2023-09-15",
+            "page_size": 2,
+        }
+
+        res = self.client.get(FLIGHT_SEARCH_URL, search)
+        cursor_res = self.client.get(
+            FLIGHT_SEARCH_URL,
+            {**search, "pagination": "cursor"},
+        )
+        next_res = self.client.get(cursor_res.data["next"])
+
+        self.assertEquals(
+            [flight["id"] for flight in res.data["results"]],
+            [flights[1].id, flights[0].id],
+        )
+        self.assertEquals(
+            [flight["id"] for flight in cursor_res.data["results"]],
+            [flights[1].id, flights[0].id],
+        )
+        self.assertEquals(
+            [flight["id"] for flight in next_res.data["results"]],
+            [flights[2].id],
+        )
+
+    def test_search_flights_with_min_seats(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 1)])
+        search = {
+            "source": flight.route.source.iata_code,
+            "destination": flight.route.destination.iata_code,
+            "date_from": "2023-09-15",
+        }
+
+        res_fits = self.client.get(
+            FLIGHT_SEARCH_URL,
+            {**search, "min_seats": 49},
+        )
+        res_too_many = self.client.get(
+            FLIGHT_SEARCH_URL,
+            {**search, "min_seats": 50},
+        )
+
+        self.assertEquals(res_fits.data["count"], 1)
+        self.assertEquals(res_too_many.data["count"], 0)
+
+    def test_search_flights_invalid_window(self):
+        res = self.client.get(
+            FLIGHT_SEARCH_URL,
+            {
+                "source": "KBP",
+                "destination": "LHR",
+                "date_from": "2023-09-15",
+                "date_to": "2023-09-14",
+            },
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("date_to", res.data)
+
+    def test_search_connections(self):
+        flights = create_connection_network()
+
+        res = self.client.get(FLIGHT_CONNECTIONS_URL, connection_search())
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [
+                [leg["id"] for leg in connection["legs"]]
+                for connection in res.data
+            ],
+            [
+                [flights["first_leg"].id, flights["second_leg"].id],
+                [flights["direct"].id],
+            ],
+        )
+        self.assertEquals(
+            res.data[0]["departure_time"],
+            res.data[0]["legs"][0]["departure_time"],
+        )
+        self.assertEquals(
+            res.data[0]["arrival_time"],
+            res.data[0]["legs"][1]["arrival_time"],
+        )
+
+    def test_search_connections_with_limits(self):
+        flights = create_connection_network()
+
+        res_tight = self.client.get(
+            FLIGHT_CONNECTIONS_URL,
+            connection_search(min_connection=20, limit=1),
+        )
+        res_direct = self.client.get(
+            FLIGHT_CONNECTIONS_URL,
+            connection_search(max_legs=1),
+        )
+
+        self.assertEquals(
+            [leg["id"] for leg in res_tight.data[0]["legs"]],
+            [flights["first_leg"].id, flights["tight_leg"].id],
+        )
+        self.assertEquals(len(res_tight.data), 1)
+        self.assertEquals(
+            [leg["id"] for leg in res_direct.data[0]["legs"]],
+            [flights["direct"].id],
+        )
+        self.assertEquals(len(res_direct.data), 1)
+
+    def test_search_connections_with_min_seats(self):
+        flights = create_connection_network()
+        self.client.get(FLIGHT_CONNECTIONS_URL, connection_search())
+        sample_order(self.user, flights["second_leg"], [(1, 1)])
+
+        res = self.client.get(
+            FLIGHT_CONNECTIONS_URL,
+            connection_search(min_seats=50),
+        )
+
+        self.assertEquals(
+            [[leg["id"] for leg in connection["legs"]] for connection in res.data],
+            [[flights["direct"].id]],
+        )
+
+    def test_connection_index_follows_flight_changes(self):
+        flights = create_connection_network()
+        self.client.get(FLIGHT_CONNECTIONS_URL, connection_search())
+        flights["direct"].delete()
+        new_flight = sample_flight(
+            route=flights["second_leg"].route,
+            airplane=flights["second_leg"].airplane,
+            departure_time="2023-09-15 10:30+03:00",
+            arrival_time="2023-09-15 12:30+03:00",
+        )
+
+        res = self.client.get(FLIGHT_CONNECTIONS_URL, connection_search())
+
+        self.assertEquals(
+            [[leg["id"] for leg in connection["legs"]] for connection in res.data],
+            [
+                [flights["first_leg"].id, new_flight.id],
+                [flights["first_leg"].id, flights["second_leg"].id],
+            ],
+        )
+
+    def test_connection_index_skips_departed_flights(self):
+        flights = create_connection_network()
+        self.set_connection_index_time("2023-09-15 09:00+03:00")
+
+        res = self.client.get(FLIGHT_CONNECTIONS_URL, connection_search())
+
+        self.assertEquals(
+            [[leg["id"] for leg in connection["legs"]] for connection in res.data],
+            [[flights["direct"].id]],
+        )
+
+    @override_settings(CONNECTION_INDEX_HORIZON_DAYS=1)
+    def test_connection_index_skips_flights_beyond_horizon(self):
+        flights = create_connection_network()
+        self.set_connection_index_time("2023-09-14 10:00+03:00")
+
+        res = self.client.get(FLIGHT_CONNECTIONS_URL, connection_search())
+
+        self.assertEquals(
+            [[leg["id"] for leg in connection["legs"]] for connection in res.data],
+            [[flights["direct"].id]],
+        )
+
+    def test_search_connections_invalid_connection_window(self):
+        res = self.client.get(
+            FLIGHT_CONNECTIONS_URL,
+            connection_search(min_connection=120, max_connection=60),
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("max_connection", res.data)
+
     def test_create_flight_forbidden(self):
         airports = create_airports()
         routes = create_routes(airports)
@@ -202,6 +1070,7 @@ class AdminFlightApiTests(TestCase):
             is_staff=True,
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_create_flight(self):
         airports = create_airports()
@@ -224,3 +1093,273 @@ class AdminFlightApiTests(TestCase):
         self.assertEquals(routes[0], getattr(flight, "route"))
         self.assertEquals(airplane, getattr(flight, "airplane"))
         self.assertEquals(crews.count(), 4)
+        self.assertEquals(flight.seats_available, airplane.capacity)
+
+    def test_create_flight_with_busy_airplane_and_crew(self):
+        flight = sample_flight()
+        crews = create_crews(2)
+        flight.crews.add(crews[0])
+        payload = {
+            "route": flight.route.id,
+            "airplane": flight.airplane.id,
+            "crews": [crew.id for crew in crews],
+            "departure_time": "2023-09-15 15:00+03:00",
+            "arrival_time": "2023-09-15 18:00+03:00",
+        }
+
+        res = self.client.post(FLIGHT_URL, payload)
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(flight.id), res.data["airplane"][0])
+        self.assertEquals(len(res.data["crews"]), 1)
+        self.assertIn(str(crews[0]), res.data["crews"][0])
+
+    def test_create_flight_locks_airplane_and_crews(self):
+        flight = sample_flight()
+        crews = create_crews(2)
+        payload = {
+            "route": flight.route.id,
+            "airplane": flight.airplane.id,
+            "crews": [crew.id for crew in crews],
+            "departure_time": "2023-09-16 15:00+03:00",
+            "arrival_time": "2023-09-16 18:00+03:00",
+        }
+
+        with patch.object(
+            Flight,
+            "lock_assignees",
+            wraps=Flight.lock_assignees,
+        ) as lock_assignees:
+            res = self.client.post(FLIGHT_URL, payload)
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        lock_assignees.assert_called_once_with(
+            flight.airplane.id,
+            [crew.id for crew in crews],
+        )
+
+    def test_create_flight_after_previous_one(self):
+        flight = sample_flight()
+        crew = create_crews(1)[0]
+        flight.crews.add(crew)
+        payload = {
+            "route": flight.route.id,
+            "airplane": flight.airplane.id,
+            "crews": [crew.id],
+            "departure_time": "2023-09-15 15:30+03:00",
+            "arrival_time": "2023-09-15 18:00+03:00",
+        }
+
+        res = self.client.post(FLIGHT_URL, payload)
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+
+    def test_update_flight_into_overlap(self):
+        flight = sample_flight()
+        other_flight = sample_flight(
+            route=flight.route,
+            airplane=flight.airplane,
+            departure_time="2023-09-16 12:00+03:00",
+            arrival_time="2023-09-16 15:30+03:00",
+        )
+
+        res_self = self.client.patch(
+            detail_url(flight.id),
+            {"arrival_time": "2023-09-15 16:00+03:00"},
+        )
+        res_overlap = self.client.patch(
+            detail_url(other_flight.id),
+            {
+                "departure_time": "2023-09-15 15:00+03:00",
+                "arrival_time": "2023-09-15 18:00+03:00",
+            },
+        )
+
+        self.assertEquals(res_self.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            res_overlap.status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+        self.assertIn("airplane", res_overlap.data)
+
+    def test_create_flight_invalid_times(self):
+        flight = sample_flight()
+        payload = {
+            "route": flight.route.id,
+            "airplane": flight.airplane.id,
+            "crews": [create_crews(1)[0].id],
+            "departure_time": "2023-09-20 15:00+03:00",
+            "arrival_time": "2023-09-20 14:00+03:00",
+        }
+
+        res = self.client.post(FLIGHT_URL, payload)
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("arrival_time", res.data)
+
+    def test_flight_clean_rejects_too_long_flight(self):
+        flight = Flight.objects.get(id=sample_flight().id)
+        long_flight = Flight(
+            route=flight.route,
+            airplane=sample_airplane(),
+            departure_time=flight.departure_time,
+            arrival_time=flight.departure_time + timedelta(days=3),
+        )
+
+        with self.assertRaises(ValidationError) as error:
+            long_flight.full_clean()
+
+        self.assertIn("arrival_time", error.exception.message_dict)
+
+    def test_flight_clean_rejects_overlapping_flights(self):
+        flight = Flight.objects.get(id=sample_flight().id)
+        crew = create_crews(1)[0]
+        crew.flights.add(flight)
+        overlapping_flight = Flight(
+            route=flight.route,
+            airplane=flight.airplane,
+            departure_time=flight.departure_time + timedelta(hours=1),
+            arrival_time=flight.arrival_time + timedelta(hours=1),
+        )
+
+        with self.assertRaises(ValidationError) as error:
+            overlapping_flight.full_clean()
+
+        overlapping_flight.airplane = sample_airplane()
+        overlapping_flight.save()
+
+        with self.assertRaises(ValidationError) as crew_error:
+            FlightCrew(flight=overlapping_flight, crew=crew).full_clean()
+
+        self.assertIn("airplane", error.exception.message_dict)
+        self.assertIn(str(flight.id), crew_error.exception.messages[0])
+
+    def test_audit_flight_conflicts(self):
+        flight = sample_flight()
+        overlapping_flight = sample_flight(
+            route=flight.route,
+            airplane=flight.airplane,
+            departure_time="2023-09-15 14:00+03:00",
+            arrival_time="2023-09-15 17:00+03:00",
+        )
+        later_flight = sample_flight(
+            route=flight.route,
+            airplane=sample_airplane(),
+            departure_time="2023-09-15 16:00+03:00",
+            arrival_time="2023-09-15 18:00+03:00",
+        )
+        crew = create_crews(1)[0]
+        crew.flights.add(flight, later_flight)
+        out = StringIO()
+
+        call_command("audit_flight_conflicts", stdout=out)
+
+        self.assertIn(
+            f"Airplane {flight.airplane.id}: flights {flight.id} "
+            f"and {overlapping_flight.id} overlap.",
+            out.getvalue(),
+        )
+        self.assertIn("Found 1 conflicts.", out.getvalue())
+
+    def test_update_flight_keeps_seats_available(self):
+        flight = sample_flight()
+        stale_flight = Flight.objects.get(id=flight.id)
+        sample_order(self.user, flight, [(1, 1)])
+
+        stale_flight.departure_time = "2023-09-15 13:00+03:00"
+        stale_flight.save()
+
+        flight.refresh_from_db()
+        self.assertEquals(flight.seats_available, 49)
+
+    def test_update_flight_airplane_recounts_seats(self):
+        flight = sample_flight()
+        sample_order(self.user, flight, [(1, 1)])
+        airplane = sample_airplane(rows=2, seats_in_row=2)
+
+        res = self.client.patch(detail_url(flight.id), {"airplane": airplane.id})
+
+        flight.refresh_from_db()
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(flight.seats_available, 3)
+
+
+class FlightSeatsStreamTests(TestCase):
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "test_pass",
+        )
+        self.headers = {
+            "Authorization": f"Bearer {AccessToken.for_user(self.user)}"
+        }
+        self.flight = sample_flight()
+
+    async def test_auth_required(self):
+        res = await self.async_client.get(seats_stream_url(self.flight.id))
+
+        self.assertEquals(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_unknown_flight(self):
+        res = await self.async_client.get(
+            seats_stream_url(self.flight.id + 1),
+            headers=self.headers,
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stream_not_served_over_wsgi(self):
+        res = self.client.get(
+            seats_stream_url(self.flight.id),
+            headers=self.headers,
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_stream_seat_changes(self):
+        def take_seats():
+            with self.captureOnCommitCallbacks(execute=True):
+                sample_order(self.user, self.flight, [(1, 1), (1, 2)])
+
+        res = await self.async_client.get(
+            seats_stream_url(self.flight.id),
+            headers=self.headers,
+        )
+        stream = res.streaming_content
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res["Content-Type"], "text/event-stream")
+        self.assertEquals(
+            read_event(await anext(stream)),
+            (
+                "seats",
+                {"flight": self.flight.id, "seats_available": 50, "delta": 0},
+            ),
+        )
+
+        await sync_to_async(take_seats)()
+
+        self.assertEquals(
+            read_event(await anext(stream)),
+            (
+                "seats",
+                {"flight": self.flight.id, "seats_available": 48, "delta": -2},
+            ),
+        )
+
+    async def test_watchers_share_notifier(self):
+        first_watch = seat_notifier.watch(self.flight.id, 50)
+        second_watch = seat_notifier.watch(self.flight.id, 50)
+        first_change = asyncio.ensure_future(anext(first_watch))
+        second_change = asyncio.ensure_future(anext(second_watch))
+        await asyncio.sleep(0)
+
+        seat_notifier.publish(self.flight.id, 45)
+
+        self.assertEquals(await first_change, 45)
+        self.assertEquals(await second_change, 45)
+
+        await first_watch.aclose()
+        await second_watch.aclose()
+
+        self.assertNotIn(self.flight.id, seat_notifier.watchers)
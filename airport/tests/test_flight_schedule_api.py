@@ -0,0 +1,298 @@
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from airport.models import Crew, Flight, FlightSchedule
+from airport.tests.test_airplane_api import sample_airplane
+from airport.tests.test_route_api import sample_route
+
+FLIGHT_SCHEDULE_URL = reverse("airport:flightschedule-list")
+
+
+def sample_schedule(**params):
+    defaults = {
+        # Mon, Wed and Fri of two weeks starting on Monday
+        "weekdays": "135",
+        "departure_time": time(8, 30),
+        "duration": timedelta(hours=3, minutes=15),
+        "valid_from": date(2023, 9, 11),
+        "valid_until": date(2023, 9, 24),
+    }
+    defaults.update(params)
+
+    if "route" not in defaults:
+        defaults["route"] = sample_route()
+
+    if "airplane" not in defaults:
+        defaults["airplane"] = sample_airplane()
+
+    return FlightSchedule.objects.create(**defaults)
+
+
+def materialize_url(schedule_id):
+    return reverse(
+        "airport:flightschedule-materialize",
+        args=[schedule_id],
+    )
+
+
+class AuthenticatedFlightScheduleApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "test_pass",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_schedules_forbidden(self):
+        res = self.client.get(FLIGHT_SCHEDULE_URL)
+
+        self.assertEquals(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AdminFlightScheduleApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "admin@admin.com",
+            "test_pass",
+            is_staff=True,
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_create_schedule(self):
+        route = sample_route()
+        airplane = sample_airplane()
+        payload = {
+            "route": route.id,
+            "airplane": airplane.id,
+            "weekdays": "17",
+            "departure_time": "08:30",
+            "duration": "03:15:00",
+            "valid_from": "2023-09-11",
+            "valid_until": "2023-09-24",
+        }
+
+        res = self.client.post(FLIGHT_SCHEDULE_URL, payload)
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(res.data["flights_count"], 0)
+        self.assertEquals(
+            FlightSchedule.objects.get(id=res.data["id"]).weekdays,
+            "17",
+        )
+
+    def test_list_schedules_counts_flights_at_once(self):
+        schedule = sample_schedule()
+        self.client.post(materialize_url(schedule.id))
+
+        with CaptureQueriesContext(connection) as single_queries:
+            self.client.get(FLIGHT_SCHEDULE_URL)
+
+        sample_schedule(route=schedule.route)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FLIGHT_SCHEDULE_URL)
+
+        self.assertEquals(len(queries), len(single_queries))
+        self.assertEquals(
+            sorted(item["flights_count"] for item in res.data),
+            [0, 6],
+        )
+
+    def test_create_schedule_invalid(self):
+        route = sample_route()
+        airplane = sample_airplane()
+        payload = {
+            "route": route.id,
+            "airplane": airplane.id,
+            "weekdays": "118",
+            "departure_time": "08:30",
+            "duration": "03:15:00",
+            "valid_from": "2023-09-24",
+            "valid_until": "2023-09-11",
+        }
+
+        res = self.client.post(FLIGHT_SCHEDULE_URL, payload)
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("weekdays", res.data)
+
+        res = self.client.post(
+            FLIGHT_SCHEDULE_URL,
+            {**payload, "weekdays": "1"},
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("valid_until", res.data)
+
+    def test_create_schedule_invalid_duration(self):
+        payload = {
+            "route": sample_route().id,
+            "airplane": sample_airplane().id,
+            "weekdays": "1",
+            "departure_time": "08:30",
+            "valid_from": "2023-09-11",
+            "valid_until": "2023-09-24",
+        }
+
+        for duration in ("-1 00:00:00", "00:00:00", "3 00:00:00"):
+            res = self.client.post(
+                FLIGHT_SCHEDULE_URL,
+                {**payload, "duration": duration},
+            )
+
+            self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("duration", res.data)
+
+        self.assertFalse(FlightSchedule.objects.exists())
+
+    def test_schedule_clean_rejects_invalid_duration(self):
+        schedule = sample_schedule()
+        schedule.duration = timedelta(hours=-1)
+
+        with self.assertRaises(ValidationError) as error:
+            schedule.full_clean()
+
+        self.assertIn("duration", error.exception.message_dict)
+
+    def test_materialize_schedule(self):
+        schedule = sample_schedule()
+        crews = [
+            Crew.objects.create(first_name="A", last_name="B"),
+            Crew.objects.create(first_name="C", last_name="D"),
+        ]
+        schedule.crews.add(*crews)
+
+        res = self.client.post(materialize_url(schedule.id))
+
+        flights = Flight.objects.filter(schedule=schedule)
+        first_flight = flights.order_by("departure_time").first()
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(res.data["created_flights"], 6)
+        self.assertEquals(flights.count(), 6)
+        self.assertEquals(
+            first_flight.departure_time,
+            timezone.make_aware(datetime(2023, 9, 11, 8, 30)),
+        )
+        self.assertEquals(
+            first_flight.arrival_time - first_flight.departure_time,
+            timedelta(hours=3, minutes=15),
+        )
+        self.assertEquals(first_flight.seats_available, 50)
+        self.assertEquals(
+            Flight.crews.through.objects.filter(flight__in=flights).count(),
+            12,
+        )
+
+    def test_materialize_schedule_fills_gaps_only(self):
+        schedule = sample_schedule()
+        self.client.post(materialize_url(schedule.id))
+        Flight.objects.filter(schedule=schedule).order_by(
+            "departure_time"
+        ).first().delete()
+
+        res = self.client.post(materialize_url(schedule.id))
+        res_again = self.client.post(materialize_url(schedule.id))
+
+        self.assertEquals(res.data["created_flights"], 1)
+        self.assertEquals(res_again.status_code, status.HTTP_200_OK)
+        self.assertEquals(res_again.data["created_flights"], 0)
+        self.assertEquals(res_again.data["flights_count"], 6)
+
+    def test_materialize_schedule_overlapping_airplane_flight(self):
+        schedule = sample_schedule()
+        # Overlaps the flight of Wednesday, 2023-09-13 08:30 - 11:45
+        flight = Flight.objects.create(
+            route=schedule.route,
+            airplane=schedule.airplane,
+            departure_time=timezone.make_aware(datetime(2023, 9, 13, 10)),
+            arrival_time=timezone.make_aware(datetime(2023, 9, 13, 12)),
+        )
+
+        res = self.client.post(materialize_url(schedule.id))
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(flight.id), res.data["flights"][0])
+        self.assertEquals(schedule.flights.count(), 0)
+
+    def test_materialize_schedule_overlapping_crew_flight(self):
+        schedule = sample_schedule()
+        crew = Crew.objects.create(first_name="A", last_name="B")
+        schedule.crews.add(crew)
+        flight = Flight.objects.create(
+            route=schedule.route,
+            airplane=sample_airplane(),
+            departure_time=timezone.make_aware(datetime(2023, 9, 22, 7)),
+            arrival_time=timezone.make_aware(datetime(2023, 9, 22, 9)),
+        )
+        flight.crews.add(crew)
+
+        res = self.client.post(materialize_url(schedule.id))
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(len(res.data["flights"]), 1)
+        self.assertEquals(schedule.flights.count(), 0)
+
+    def test_materialize_schedule_too_long(self):
+        schedule = sample_schedule()
+        # Saved before the duration was validated
+        FlightSchedule.objects.filter(id=schedule.id).update(
+            duration=timedelta(days=3),
+        )
+        schedule.refresh_from_db()
+
+        res = self.client.post(materialize_url(schedule.id))
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("duration", res.data)
+        self.assertEquals(schedule.flights.count(), 0)
+
+    def test_materialize_flight_schedules_command_skips_invalid(self):
+        schedule = sample_schedule()
+        invalid_schedule = sample_schedule(
+            route=schedule.route,
+            airplane=sample_airplane(),
+        )
+        FlightSchedule.objects.filter(id=invalid_schedule.id).update(
+            duration=timedelta(days=3),
+        )
+        out = StringIO()
+        err = StringIO()
+
+        call_command(
+            "materialize_flight_schedules",
+            stdout=out,
+            stderr=err,
+        )
+
+        self.assertEquals(schedule.flights.count(), 6)
+        self.assertEquals(invalid_schedule.flights.count(), 0)
+        self.assertIn(f"schedule {invalid_schedule.id}", err.getvalue())
+        self.assertIn("6 flights created", out.getvalue())
+
+    def test_materialize_flight_schedules_command(self):
+        schedule = sample_schedule()
+        out = StringIO()
+
+        call_command(
+            "materialize_flight_schedules",
+            "--batch-size",
+            "4",
+            stdout=out,
+        )
+
+        self.assertEquals(schedule.flights.count(), 6)
+        self.assertIn("6 flights created", out.getvalue())
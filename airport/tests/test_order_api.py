@@ -0,0 +1,616 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from airport.holds import create_hold, get_hold
+from airport.jobs import claim_order_jobs, process_order_job, save_failed_job
+from airport.models import (
+    Crew,
+    Flight,
+    IdempotencyKey,
+    Order,
+    OrderJob,
+    Route,
+    Ticket,
+)
+from airport.serializers import OrderSerializer
+from airport.tests.test_airplane_api import sample_airplane
+from airport.tests.test_route_api import sample_route
+
+ORDER_URL = reverse("airport:order-list")
+ASYNC_ORDER_URL = f"{ORDER_URL}?async=1"
+
+
+def sample_flight(**params):
+    defaults = {
+        "departure_time": "2023-09-15 12:00+03:00",
+        "arrival_time": "2023-09-15 15:30+03:00",
+    }
+    defaults.update(params)
+
+    if "route" not in defaults:
+        defaults["route"] = sample_route()
+
+    if "airplane" not in defaults:
+        defaults["airplane"] = sample_airplane()
+
+    return Flight.objects.create(**defaults)
+
+
+def sample_order(user, flight, seats):
+    order = Order.objects.create(user=user)
+
+    for row, seat in seats:
+        Ticket.objects.create(order=order, flight=flight, row=row, seat=seat)
+
+    return order
+
+
+def job_url(job_id):
+    return reverse("airport:order-job-status", args=[job_id])
+
+
+def process_queued_orders():
+    call_command("process_order_jobs", "--once", stdout=StringIO())
+
+
+def order_payload(flight, seats):
+    return {
+        "tickets": [
+            {"flight": flight.id, "row": row, "seat": seat}
+            for row, seat in seats
+        ]
+    }
+
+
+class UnauthenticatedOrderApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        res = self.client.get(ORDER_URL)
+
+        self.assertEquals(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedOrderApiTests(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "test_pass",
+        )
+        self.client.force_authenticate(self.user)
+        self.flight = sample_flight()
+        cache.clear()
+
+    def test_create_order(self):
+        seats = [(1, 1), (1, 2), (2, 1)]
+
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, seats),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(
+            set(
+                Ticket.objects.filter(order_id=res.data["id"])
+                .values_list("row", "seat")
+            ),
+            set(seats),
+        )
+
+    def test_create_order_queries_do_not_grow_with_tickets(self):
+        with CaptureQueriesContext(connection) as small_order:
+            self.client.post(
+                ORDER_URL,
+                order_payload(self.flight, [(1, 1), (1, 2)]),
+                format="json",
+            )
+
+        with CaptureQueriesContext(connection) as group_order:
+            self.client.post(
+                ORDER_URL,
+                order_payload(
+                    self.flight,
+                    [(row, seat) for row in (3, 4, 5) for seat in (1, 2, 3)],
+                ),
+                format="json",
+            )
+
+        self.assertEquals(Ticket.objects.count(), 11)
+        self.assertEquals(
+            len(small_order.captured_queries),
+            len(group_order.captured_queries),
+        )
+
+    def test_create_order_with_invalid_seat(self):
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 1), (1, 6)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(
+            res.data["tickets"][1]["seat"],
+            ["The seat number cannot be 6! It must be in range [1, 5]."],
+        )
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_with_taken_seat(self):
+        sample_order(self.user, self.flight, [(2, 2)])
+
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 1), (2, 2)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEquals(
+            res.data["taken_seats"],
+            [{"flight": self.flight.id, "row": 2, "seat": 2}],
+        )
+        self.assertEquals(
+            res.data["suggested_seats"],
+            [{"flight": self.flight.id, "row": 2, "seat": 1}],
+        )
+        self.assertEquals(Ticket.objects.count(), 1)
+
+    def test_create_order_with_seat_taken_concurrently(self):
+        sample_order(self.user, self.flight, [(2, 2)])
+
+        with patch.object(
+            Ticket,
+            "find_taken_seats",
+            side_effect=[set(), {1}],
+        ):
+            res = self.client.post(
+                ORDER_URL,
+                order_payload(self.flight, [(2, 1), (2, 2)]),
+                format="json",
+            )
+
+        self.assertEquals(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEquals(
+            res.data["taken_seats"],
+            [{"flight": self.flight.id, "row": 2, "seat": 2}],
+        )
+        self.assertEquals(
+            res.data["suggested_seats"],
+            [{"flight": self.flight.id, "row": 2, "seat": 3}],
+        )
+        self.assertEquals(Ticket.objects.count(), 1)
+
+    def test_create_order_other_integrity_error_not_seats_taken(self):
+        with patch.object(
+            Ticket.objects,
+            "bulk_create",
+            side_effect=IntegrityError("FOREIGN KEY constraint failed"),
+        ):
+            with self.assertRaises(IntegrityError):
+                self.client.post(
+                    ORDER_URL,
+                    order_payload(self.flight, [(2, 1)]),
+                    format="json",
+                )
+
+        self.assertFalse(Order.objects.exists())
+
+    def test_delete_user_releases_order_seats_once(self):
+        user = get_user_model().objects.create_user("other@test.com", "pass")
+        sample_order(user, self.flight, [(1, 1), (1, 2)])
+
+        with patch.object(
+            Flight,
+            "update_seat_map",
+            wraps=Flight.update_seat_map,
+        ) as update_seat_map:
+            user.delete()
+
+        self.flight.refresh_from_db()
+        self.assertEquals(update_seat_map.call_count, 1)
+        self.assertEquals(self.flight.seats_available, 50)
+
+    def test_delete_ticket_releases_its_seat(self):
+        order = sample_order(self.user, self.flight, [(1, 1), (1, 2)])
+
+        order.tickets.get(row=1, seat=1).delete()
+
+        self.flight.refresh_from_db()
+        self.assertEquals(self.flight.seats_available, 49)
+
+    def test_create_order_with_duplicated_seat(self):
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(3, 3), (3, 3)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", res.data["tickets"][1])
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_create_order_with_seat_held_by_another_user(self):
+        create_hold(self.user.id + 1, self.flight.id, [(1, 2)])
+
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 1), (1, 2)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEquals(
+            res.data["taken_seats"],
+            [{"flight": self.flight.id, "row": 1, "seat": 2}],
+        )
+        self.assertEquals(
+            res.data["suggested_seats"],
+            [{"flight": self.flight.id, "row": 1, "seat": 3}],
+        )
+        self.assertFalse(Ticket.objects.exists())
+
+    def test_create_order_from_hold(self):
+        hold, _ = create_hold(self.user.id, self.flight.id, [(1, 1), (1, 2)])
+
+        res = self.client.post(
+            ORDER_URL,
+            {
+                **order_payload(self.flight, [(1, 1), (1, 2)]),
+                "hold": hold["id"],
+            },
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("hold", res.data)
+        self.assertEquals(Ticket.objects.count(), 2)
+        self.assertIsNone(get_hold(hold["id"]))
+
+    def test_create_order_from_hold_of_another_user(self):
+        hold, _ = create_hold(self.user.id + 1, self.flight.id, [(1, 1)])
+
+        res = self.client.post(
+            ORDER_URL,
+            {**order_payload(self.flight, [(1, 1)]), "hold": hold["id"]},
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("hold", res.data)
+
+    def test_create_order_retry_with_idempotency_key(self):
+        payload = order_payload(self.flight, [(1, 1), (1, 2)])
+
+        res = self.client.post(
+            ORDER_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+        retry_res = self.client.post(
+            ORDER_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(retry_res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(retry_res.data, res.data)
+        self.assertEquals(retry_res["Idempotent-Replayed"], "true")
+        self.assertEquals(Order.objects.count(), 1)
+
+    def test_create_order_reused_idempotency_key(self):
+        self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 1)]),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 2)]),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        self.assertEquals(
+            res.status_code,
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+        self.assertEquals(Order.objects.count(), 1)
+
+    def test_create_order_retry_after_failure(self):
+        self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 6)]),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 6)]),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn("Idempotent-Replayed", res)
+
+    def test_idempotency_keys_are_per_user(self):
+        self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 1)]),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("other@test.com", "pass")
+        )
+
+        res = self.client.post(
+            ORDER_URL,
+            order_payload(self.flight, [(1, 2)]),
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(Order.objects.count(), 2)
+
+    def test_create_order_retry_reaching_another_worker(self):
+        payload = order_payload(self.flight, [(1, 1)])
+        self.client.post(
+            ORDER_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+        # The other worker does not share the local memory cache
+        cache.clear()
+
+        res = self.client.post(
+            ORDER_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(res["Idempotent-Replayed"], "true")
+        self.assertEquals(Order.objects.count(), 1)
+
+    def test_create_order_retry_while_in_progress(self):
+        payload = order_payload(self.flight, [(1, 1)])
+        IdempotencyKey.objects.create(
+            user=self.user,
+            scope="order",
+            key="order-1",
+            fingerprint="in-progress",
+        )
+
+        res = self.client.post(
+            ORDER_URL,
+            payload,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="order-1",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+
+    def test_create_order_async(self):
+        res = self.client.post(
+            ASYNC_ORDER_URL,
+            order_payload(self.flight, [(1, 1), (1, 2)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEquals(res["Location"], job_url(res.data["id"]))
+        self.assertEquals(res.data["status"], "Pending")
+        self.assertFalse(Ticket.objects.exists())
+
+        process_queued_orders()
+        job_res = self.client.get(job_url(res.data["id"]))
+
+        self.assertEquals(job_res.data["status"], "Succeeded")
+        self.assertEquals(
+            job_res.data["order"],
+            Order.objects.get(user=self.user).id,
+        )
+        self.assertEquals(len(job_res.data["result"]["tickets"]), 2)
+        self.assertEquals(Ticket.objects.count(), 2)
+
+    def test_async_orders_are_processed_in_order(self):
+        first_res = self.client.post(
+            ASYNC_ORDER_URL,
+            order_payload(self.flight, [(1, 1)]),
+            format="json",
+        )
+        second_res = self.client.post(
+            ASYNC_ORDER_URL,
+            order_payload(self.flight, [(1, 1)]),
+            format="json",
+        )
+
+        process_queued_orders()
+
+        self.assertEquals(
+            OrderJob.objects.get(id=first_res.data["id"]).status,
+            OrderJob.JobStatus.SUCCEEDED,
+        )
+        failed_job = OrderJob.objects.get(id=second_res.data["id"])
+        self.assertEquals(failed_job.status, OrderJob.JobStatus.FAILED)
+        self.assertEquals(
+            failed_job.result["taken_seats"],
+            [{"flight": self.flight.id, "row": 1, "seat": 1}],
+        )
+
+    def test_create_invalid_order_async(self):
+        res = self.client.post(
+            ASYNC_ORDER_URL,
+            order_payload(self.flight, [(11, 1)]),
+            format="json",
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OrderJob.objects.exists())
+
+    def claim_job_twice(self):
+        """The job claimed by a worker and claimed again by another one,
+        as if the first worker had stalled"""
+        self.client.post(
+            ASYNC_ORDER_URL,
+            order_payload(self.flight, [(1, 1)]),
+            format="json",
+        )
+        [stale_job] = claim_order_jobs(10, timedelta(minutes=5))
+        [job] = claim_order_jobs(10, timedelta(seconds=-1))
+        return stale_job, job
+
+    def test_reclaimed_job_not_failed_by_stale_worker(self):
+        stale_job, job = self.claim_job_twice()
+        process_order_job(job)
+
+        saved = save_failed_job(stale_job, {"detail": "Failed."})
+        job.refresh_from_db()
+
+        self.assertFalse(saved)
+        self.assertEquals(job.status, OrderJob.JobStatus.SUCCEEDED)
+        self.assertIsNotNone(job.order)
+
+    def test_reclaimed_job_not_booked_by_stale_worker(self):
+        stale_job, job = self.claim_job_twice()
+
+        process_order_job(stale_job)
+        self.assertFalse(Order.objects.exists())
+        process_order_job(job)
+        job.refresh_from_db()
+
+        self.assertEquals(job.status, OrderJob.JobStatus.SUCCEEDED)
+        self.assertEquals(Order.objects.count(), 1)
+
+    def test_job_failed_by_unexpected_error(self):
+        for seat in (1, 2):
+            self.client.post(
+                ASYNC_ORDER_URL,
+                order_payload(self.flight, [(1, seat)]),
+                format="json",
+            )
+        save = OrderSerializer.save
+
+        def save_or_fail(serializer, **kwargs):
+            if serializer.validated_data["tickets"][0]["seat"] == 1:
+                raise OperationalError("deadlock detected")
+
+            return save(serializer, **kwargs)
+
+        with patch.object(OrderSerializer, "save", save_or_fail):
+            with self.assertLogs("airport.jobs", "ERROR"):
+                process_queued_orders()
+
+        failed_job, job = OrderJob.objects.order_by("id")
+        self.assertEquals(failed_job.status, OrderJob.JobStatus.FAILED)
+        self.assertIsNone(failed_job.order)
+        self.assertEquals(job.status, OrderJob.JobStatus.SUCCEEDED)
+        self.assertEquals(Order.objects.count(), 1)
+
+    def test_retrieve_job_of_another_user(self):
+        job = OrderJob.objects.create(
+            user=get_user_model().objects.create_user(
+                "other@test.com",
+                "test_pass",
+            ),
+            flight=self.flight,
+            payload=order_payload(self.flight, [(1, 1)]),
+        )
+
+        res = self.client.get(job_url(job.id))
+
+        self.assertEquals(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_only_own_orders(self):
+        other_user = get_user_model().objects.create_user(
+            "other@test.com",
+            "test_pass",
+        )
+        sample_order(self.user, self.flight, [(1, 1)])
+        sample_order(other_user, self.flight, [(1, 2)])
+
+        res = self.client.get(ORDER_URL)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data["count"], 1)
+
+    def test_list_orders_with_cursor_pagination(self):
+        orders = [
+            sample_order(self.user, self.flight, [(row, 1)])
+            for row in range(1, 8)
+        ]
+
+        res = self.client.get(ORDER_URL, {"pagination": "cursor"})
+        next_res = self.client.get(res.data["next"])
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertEquals(
+            [order["id"] for order in res.data["results"]]
+            + [order["id"] for order in next_res.data["results"]],
+            [order.id for order in reversed(orders)],
+        )
+        self.assertIsNone(next_res.data["next"])
+
+    def test_list_orders_queries_do_not_grow_with_tickets(self):
+        sample_order(self.user, self.flight, [(1, 1)])
+
+        with CaptureQueriesContext(connection) as one_order:
+            self.client.get(ORDER_URL)
+
+        other_flight = sample_flight(
+            route=Route.objects.create(
+                source=self.flight.route.destination,
+                destination=self.flight.route.source,
+            ),
+            airplane=self.flight.airplane,
+        )
+        crew = Crew.objects.create(
+            first_name="First",
+            last_name="Last",
+            position="PLT",
+        )
+        other_flight.crews.add(crew)
+
+        for row in range(2, 6):
+            sample_order(
+                self.user,
+                other_flight if row % 2 else self.flight,
+                [(row, seat) for seat in range(1, 4)],
+            )
+
+        with self.assertNumQueries(len(one_order.captured_queries)):
+            res = self.client.get(ORDER_URL)
+
+        self.assertEquals(res.data["count"], 5)
+        self.assertEquals(
+            res.data["results"][-1]["tickets"][0]["flight"]["route"],
+            str(self.flight.route),
+        )
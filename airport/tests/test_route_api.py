@@ -1,17 +1,30 @@
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from airport.models import Airport, Route
+from airport.models import (
+    Airport,
+    Route,
+    calculate_distance_between_two_coordinates,
+)
+from airport.response_cache import response_cache
 from airport.serializers import (
     RouteListSerializer,
     RouteDetailSerializer,
 )
 
 ROUTE_URL = reverse("airport:route-list")
+ASYNC_ROUTE_URL = reverse("airport:async-route-list")
 
 
 def sample_airport(**params):
@@ -66,6 +79,7 @@ class AuthenticatedRouteApiTests(TestCase):
             "test_pass",
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_list_routes(self):
         sample_route()
@@ -89,6 +103,258 @@ class AuthenticatedRouteApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_200_OK)
         self.assertEquals(res.data, serializer.data)
 
+    def test_route_distance_is_stored(self):
+        kbp = sample_airport(
+            name="Boryspil",
+            iata_code="KBP",
+            latitude=50.345,
+            longitude=30.8947,
+        )
+        lhr = sample_airport(
+            name="Heathrow",
+            iata_code="LHR",
+            latitude=51.4706,
+            longitude=-0.461941,
+        )
+        route = Route.objects.create(source=kbp, destination=lhr)
+
+        res = self.client.get(detail_url(route.id))
+
+        self.assertAlmostEqual(route.distance_km, 2185.3, delta=1)
+        self.assertEquals(res.data["distance_km"], route.distance_km)
+        self.assertEquals(
+            res.data["distance"],
+            f"{round(route.distance_km, 2)} km",
+        )
+
+    def test_route_distance_follows_airport_coordinates(self):
+        route = sample_route()
+        airport = route.destination
+        airport.latitude = 10
+        airport.save()
+
+        route.refresh_from_db()
+
+        self.assertAlmostEqual(
+            route.distance_km,
+            calculate_distance_between_two_coordinates(
+                route.source.latitude,
+                route.source.longitude,
+                10,
+                airport.longitude,
+            ),
+        )
+
+    def test_filter_and_order_routes_by_distance(self):
+        source = sample_airport(name="Source", iata_code="SRC")
+        far = Route.objects.create(
+            source=source,
+            destination=sample_airport(
+                name="Far",
+                iata_code="FAR",
+                latitude=40,
+                longitude=40,
+            ),
+        )
+        near = Route.objects.create(
+            source=source,
+            destination=sample_airport(
+                name="Near",
+                iata_code="NEA",
+                latitude=2,
+                longitude=3,
+            ),
+        )
+
+        res_ordered = self.client.get(ROUTE_URL, {"ordering": "-distance_km"})
+        res_filtered = self.client.get(ROUTE_URL, {"distance_km__lte": 1000})
+
+        self.assertEquals(
+            [route["id"] for route in res_ordered.data["results"]],
+            [far.id, near.id],
+        )
+        self.assertEquals(
+            [route["id"] for route in res_filtered.data["results"]],
+            [near.id],
+        )
+
+    def test_async_list_routes(self):
+        route = sample_route()
+        params = {"ordering": "-distance_km", "source": route.source_id}
+
+        res = self.client.get(ASYNC_ROUTE_URL, params)
+        sync_res = self.client.get(ROUTE_URL, params)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.json(), sync_res.json())
+
+    def test_async_retrieve_route_detail(self):
+        route = sample_route()
+
+        res = self.client.get(
+            reverse("airport:async-route-detail", args=[route.id])
+        )
+
+        serializer = RouteDetailSerializer(route)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res.data, serializer.data)
+
+    def test_cached_routes_invalidated_by_airport_change(self):
+        route = sample_route()
+
+        res_miss = self.client.get(ROUTE_URL)
+        res_hit = self.client.get(ROUTE_URL)
+        route.source.name = "Renamed"
+        route.source.save()
+        res_changed = self.client.get(ROUTE_URL)
+
+        self.assertEquals(res_miss["X-Cache"], "MISS")
+        self.assertEquals(res_hit["X-Cache"], "HIT")
+        self.assertEquals(res_hit.data, res_miss.data)
+        self.assertEquals(res_changed["X-Cache"], "MISS")
+        self.assertEquals(
+            res_changed.data["results"][0]["source"]["name"],
+            "Renamed",
+        )
+
+    def test_cached_routes_keyed_by_validators(self):
+        sample_route()
+        res = self.client.get(ROUTE_URL)
+        # Saved by another worker, which only invalidates its own cache
+        Airport.objects.filter(iata_code="AAA").update(
+            name="Renamed",
+            updated_at=timezone.now(),
+        )
+
+        res_changed = self.client.get(ROUTE_URL)
+
+        self.assertEquals(res_changed["X-Cache"], "MISS")
+        self.assertNotEquals(res_changed["ETag"], res["ETag"])
+        self.assertEquals(
+            res_changed.data["results"][0]["source"]["name"],
+            "Renamed",
+        )
+
+    def test_cached_routes_keyed_by_query_and_serializer(self):
+        route = sample_route()
+        self.client.get(ROUTE_URL)
+
+        res_fields = self.client.get(ROUTE_URL, {"fields": "id"})
+        res_detail = self.client.get(detail_url(route.id))
+
+        self.assertEquals(res_fields["X-Cache"], "MISS")
+        self.assertEquals(res_fields.data["results"], [{"id": route.id}])
+        self.assertEquals(res_detail["X-Cache"], "MISS")
+
+    def test_expired_routes_served_stale_while_rebuilt(self):
+        sample_route()
+        self.client.get(ROUTE_URL)
+        # Changed by another worker, with the cached routes expiring only
+        Airport.objects.filter(iata_code="AAA").update(name="Renamed")
+        expired_at = time.time() + settings.RESPONSE_CACHE_TTL + 1
+
+        with patch("time.time", return_value=expired_at):
+            # The rebuild lock is held by another worker
+            with patch.object(response_cache.backend, "add", return_value=False):
+                res_stale = self.client.get(ROUTE_URL)
+
+            res_rebuilt = self.client.get(ROUTE_URL)
+            res_hit = self.client.get(ROUTE_URL)
+
+        self.assertEquals(res_stale["X-Cache"], "STALE")
+        self.assertEquals(
+            res_stale.data["results"][0]["source"]["name"],
+            "Test Name A",
+        )
+        self.assertEquals(res_rebuilt["X-Cache"], "MISS")
+        self.assertEquals(
+            res_rebuilt.data["results"][0]["source"]["name"],
+            "Renamed",
+        )
+        self.assertEquals(res_hit["X-Cache"], "HIT")
+
+    @override_settings(RESPONSE_CACHE_LOCK_WAIT=0.1)
+    def test_routes_built_after_waiting_for_rebuild(self):
+        sample_route()
+
+        with patch.object(response_cache.backend, "add", return_value=False):
+            res = self.client.get(ROUTE_URL)
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(res["X-Cache"], "MISS")
+        self.assertEquals(len(res.data["results"]), 1)
+
+    def test_routes_refreshed_early_before_expiry(self):
+        sample_route()
+        built_at = time.time()
+        self.client.get(ROUTE_URL)
+        Airport.objects.filter(iata_code="AAA").update(name="Renamed")
+        expiring_at = built_at + settings.RESPONSE_CACHE_TTL - 0.001
+
+        with patch("time.time", return_value=expiring_at), patch(
+            "random.random",
+            return_value=1 - 1e-12,
+        ):
+            res = self.client.get(ROUTE_URL)
+
+        self.assertEquals(res["X-Cache"], "MISS")
+        self.assertEquals(
+            res.data["results"][0]["source"]["name"],
+            "Renamed",
+        )
+
+    def test_route_detail_modified_by_airport_change(self):
+        route = sample_route()
+        res = self.client.get(detail_url(route.id))
+
+        res_not_modified = self.client.get(
+            detail_url(route.id),
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+        route.destination.city = "Renamed"
+        route.destination.save()
+        res_modified = self.client.get(
+            detail_url(route.id),
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+
+        self.assertEquals(
+            res_not_modified.status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEquals(res_modified.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            res_modified.data["destination"]["city"],
+            "Renamed",
+        )
+
+    def test_backfill_route_distances(self):
+        route = sample_route()
+        distance_km = route.distance_km
+        Route.objects.update(distance_km=None)
+        out = StringIO()
+
+        call_command("backfill_route_distances", stdout=out)
+        route.refresh_from_db()
+
+        self.assertAlmostEqual(route.distance_km, distance_km)
+        self.assertIn("Updated 1 route distances", out.getvalue())
+
+    def test_backfill_route_distances_invalidates_cached_routes(self):
+        route = sample_route()
+        Route.objects.update(distance_km=None)
+        self.client.get(ROUTE_URL)
+
+        call_command("backfill_route_distances", stdout=StringIO())
+        res = self.client.get(ROUTE_URL)
+
+        self.assertEquals(res["X-Cache"], "MISS")
+        self.assertAlmostEqual(
+            res.data["results"][0]["distance_km"],
+            route.distance_km,
+        )
+
     def test_create_route_forbidden(self):
         source = sample_airport(
             name="Test Name A",
@@ -139,6 +405,7 @@ class AdminRouteApiTests(TestCase):
             is_staff=True,
         )
         self.client.force_authenticate(self.user)
+        response_cache.clear()
 
     def test_create_route(self):
         source = sample_airport(
@@ -1,5 +1,12 @@
+from django.urls import path
 from rest_framework import routers
 
+from airport.async_views import (
+    airplane_view,
+    crew_view,
+    airport_view,
+    route_view,
+)
 from airport.views import (
     AirplaneTypeViewSet,
     AirplaneViewSet,
@@ -7,7 +14,9 @@ from airport.views import (
     AirportViewSet,
     RouteViewSet,
     FlightViewSet,
+    FlightScheduleViewSet,
     OrderViewSet,
+    flight_seats_stream,
 )
 
 router = routers.DefaultRouter()
@@ -17,8 +26,39 @@ router.register("crews", CrewViewSet)
 router.register("airports", AirportViewSet)
 router.register("routes", RouteViewSet)
 router.register("flights", FlightViewSet)
+router.register("flight_schedules", FlightScheduleViewSet)
 router.register("orders", OrderViewSet)
 
-urlpatterns = router.urls
+# Native async read-only endpoints for the reference data under ASGI
+async_views = (
+    ("airplanes", "airplane", airplane_view),
+    ("crews", "crew", crew_view),
+    ("airports", "airport", airport_view),
+    ("routes", "route", route_view),
+)
+async_urlpatterns = [
+    url_pattern
+    for prefix, basename, view in async_views
+    for url_pattern in (
+        path(
+            f"async/{prefix}/",
+            view.list,
+            name=f"async-{basename}-list",
+        ),
+        path(
+            f"async/{prefix}/<int:pk>/",
+            view.retrieve,
+            name=f"async-{basename}-detail",
+        ),
+    )
+]
+
+urlpatterns = [
+    path(
+        "flights/<int:pk>/seats/stream/",
+        flight_seats_stream,
+        name="flight-seats-stream",
+    ),
+] + async_urlpatterns + router.urls
 
 app_name = "airport"
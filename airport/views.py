@@ -1,12 +1,53 @@
-from django.db.models import F, Count
+import hashlib
+import json
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Q
+from django.http import (
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import (
+    extend_schema,
+    extend_schema_view,
+    OpenApiParameter,
+)
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    AuthenticationFailed,
+    ValidationError,
+    NotFound,
+)
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from airport.connections import find_connections
+from airport.geo import distance_matrix
+from airport.holds import get_hold, release_hold
 from airport.permissions import IsAdminOrIfAuthenticatedReadOnly
+from airport.response_cache import (
+    flight_scope,
+    flight_seats_scope,
+    response_cache,
+)
+from airport.schedules import materialize_schedule
+from airport.spatial import get_airport_index
+from airport.streams import stream_seats
 from airport.models import (
     AirplaneType,
     Airplane,
@@ -14,7 +55,12 @@ from airport.models import (
     Airport,
     Route,
     Flight,
+    FlightCrew,
+    FlightSchedule,
+    IdempotencyKey,
     Order,
+    OrderJob,
+    MAX_FLIGHT_DURATION,
 )
 from airport.pagination import (
     AirplanePagination,
@@ -32,22 +78,489 @@ from airport.serializers import (
     AirplaneImageSerializer,
     CrewSerializer,
     CrewListSerializer,
+    CrewAvailabilitySerializer,
     CrewDetailSerializer,
     CrewImageSerializer,
     AirportSerializer,
     AirportListSerializer,
     AirportDetailSerializer,
     AirportImageSerializer,
+    NearbyAirportSearchSerializer,
+    NearbyAirportSerializer,
+    DistanceMatrixSearchSerializer,
+    DistanceMatrixSerializer,
     RouteSerializer,
     RouteListSerializer,
     RouteDetailSerializer,
     FlightSerializer,
     FlightListSerializer,
     FlightDetailSerializer,
+    FlightSeatMapSerializer,
+    FlightScheduleSerializer,
+    FlightSearchSerializer,
+    ConnectionSearchSerializer,
+    ConnectionSerializer,
+    SeatHoldSerializer,
+    SeatAllocationSerializer,
+    TicketSeatSerializer,
     OrderSerializer,
     OrderListSerializer,
+    OrderJobSerializer,
 )
 
+SEAT_MAP_ENCODINGS = ("base64", "rle")
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# How long (in seconds) a request is considered in progress,
+# so that a crashed request does not block its key for the whole window
+IDEMPOTENCY_KEY_LOCK_TIMEOUT = 60
+
+
+class IdempotentCreateMixin:
+    """Replay the stored response of a create request
+    that is retried with the same Idempotency-Key header"""
+
+    def create(self, request, *args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+
+        if not idempotency_key:
+            return super().create(request, *args, **kwargs)
+
+        if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError(
+                {
+                    IDEMPOTENCY_KEY_HEADER: "Ensure this header has no more "
+                    f"than {IDEMPOTENCY_KEY_MAX_LENGTH} characters."
+                }
+            )
+
+        fingerprint = hashlib.sha256(
+            json.dumps(request.data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        now = timezone.now()
+        # Expired keys, and keys of requests that crashed while in progress
+        IdempotencyKey.objects.filter(
+            Q(
+                created_at__lt=now
+                - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            )
+            | Q(
+                created_at__lt=now
+                - timedelta(seconds=IDEMPOTENCY_KEY_LOCK_TIMEOUT),
+                response_status__isnull=True,
+            ),
+            user=request.user,
+        ).delete()
+
+        try:
+            with transaction.atomic():
+                stored = IdempotencyKey.objects.create(
+                    user=request.user,
+                    scope=self.basename,
+                    key=idempotency_key,
+                    fingerprint=fingerprint,
+                )
+        except IntegrityError:
+            return self.replay(
+                IdempotencyKey.objects.filter(
+                    user=request.user,
+                    scope=self.basename,
+                    key=idempotency_key,
+                ).first(),
+                fingerprint,
+            )
+
+        try:
+            # The response is stored along with the created objects,
+            # so a crash in between cannot let a retry create them again
+            with transaction.atomic():
+                response = super().create(request, *args, **kwargs)
+                stored.response_status = response.status_code
+                stored.response_data = response.data
+                stored.save(
+                    update_fields=["response_status", "response_data"],
+                )
+        except Exception:
+            stored.delete()
+            raise
+
+        return response
+
+    def replay(self, stored, fingerprint):
+        if stored is None or stored.response_status is None:
+            return Response(
+                {
+                    "detail": "A request with this Idempotency-Key "
+                    "is still being processed."
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        if stored.fingerprint != fingerprint:
+            return Response(
+                {
+                    "detail": "This Idempotency-Key has already been used "
+                    "with a different payload."
+                },
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+
+        return Response(
+            stored.response_data,
+            status=stored.response_status,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+
+class AsyncOrderCreateMixin:
+    """Queue the order for the booking workers when ?async=1 is given"""
+
+    def create(self, request, *args, **kwargs):
+        if request.query_params.get("async") not in ("1", "true"):
+            return super().create(request, *args, **kwargs)
+
+        # Reject invalid payloads and known conflicts right away
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        job = OrderJob.objects.create(
+            user=request.user,
+            flight=serializer.validated_data["tickets"][0]["flight"],
+            payload=request.data,
+        )
+        return Response(
+            OrderJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": reverse(
+                    "airport:order-job-status",
+                    args=[job.id],
+                )
+            },
+        )
+
+
+class SparseQuerysetMixin:
+    """Load only the columns, joins and prefetches needed by the fields
+    left after ?fields= and ?expand= in the sparse fieldset actions"""
+
+    sparse_fieldset_actions = ("list",)
+    # Field name -> related lookups / extra columns it needs
+    sparse_select_related = {}
+    sparse_prefetch_related = {}
+    sparse_only = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        if self.action not in self.sparse_fieldset_actions:
+            return queryset
+
+        return self.get_sparse_queryset(queryset)
+
+    def get_sparse_queryset(self, queryset):
+        model_fields = {
+            field.name: field
+            for field in queryset.model._meta.get_fields()
+            if field.concrete and not field.many_to_many
+        }
+        ordering = [
+            *queryset.model._meta.ordering,
+            *(getattr(self, "ordering", None) or ()),
+            *self.request.query_params.get("ordering", "").split(","),
+        ]
+        only = {"pk"} | {
+            field_name.lstrip("-")
+            for field_name in ordering
+            if field_name.lstrip("-") in model_fields
+        }
+        select_related = set()
+        prefetch_related = set()
+
+        for field_name, field in self.get_serializer().fields.items():
+            if field.source.split(".")[0] in model_fields:
+                only.add(field.source.split(".")[0])
+
+            only.update(self.sparse_only.get(field_name, ()))
+            select_related.update(
+                self.sparse_select_related.get(field_name, ())
+            )
+            prefetch_related.update(
+                self.sparse_prefetch_related.get(field_name, ())
+            )
+
+        return (
+            queryset.select_related(None)
+            .prefetch_related(None)
+            .select_related(*select_related)
+            .prefetch_related(*prefetch_related)
+            .only(*only)
+        )
+
+
+class ConditionalGetMixin:
+    """Answer the list and retrieve requests with 304 Not Modified while
+    their ETag, or the Last-Modified of a retrieved instance, still match,
+    which takes one aggregate query over the filtered queryset and no
+    serializer at all"""
+
+    conditional_actions = ("list", "retrieve")
+    # The updated_at fields of the instances
+    # and of the related ones the responses are built from
+    last_modified_fields = ("updated_at",)
+    # The validators of the request, which the cached responses are keyed
+    # by, so that a worker never sends a body it cached before a change
+    # made by another worker along with the validators taken after it
+    conditional_etag = None
+    conditional_timestamps = None
+
+    def get_conditional_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        if self.action == "retrieve":
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+
+        return queryset
+
+    def get_validators(self, request):
+        """The ETag and the Last-Modified of the response, or Nones
+        when the instance to retrieve does not exist, remembering the
+        ETag and the timestamp of every last_modified_fields.
+
+        Lists have no Last-Modified: deleting their rows changes no
+        timestamp, so only their ETag, built from the count, tells it.
+        """
+        validators = self.get_conditional_queryset().order_by().aggregate(
+            count=Count("pk", distinct=True),
+            **{
+                f"last_modified_{index}": Max(field_name)
+                for index, field_name in enumerate(self.last_modified_fields)
+            },
+        )
+        count = validators.pop("count")
+
+        if not count and self.action == "retrieve":
+            return None, None
+
+        timestamps = [
+            timestamp.isoformat() if timestamp else None
+            for timestamp in validators.values()
+        ]
+        self.conditional_timestamps = dict(
+            zip(self.last_modified_fields, timestamps)
+        )
+        last_modified = (
+            max(filter(None, validators.values()), default=None)
+            if self.action == "retrieve"
+            else None
+        )
+        etag = hashlib.sha256(
+            json.dumps(
+                [
+                    # Image URLs are absolute, so the host is part of it
+                    request.build_absolute_uri(),
+                    self.action,
+                    self.get_serializer_class().__name__,
+                    count,
+                    timestamps,
+                ]
+            ).encode()
+        ).hexdigest()
+        self.conditional_etag = f'W/"{etag}"'
+        return self.conditional_etag, last_modified
+
+    def get_conditional_response(
+        self,
+        get_response,
+        request,
+        *args,
+        **kwargs,
+    ):
+        if self.action not in self.conditional_actions:
+            return get_response(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request)
+
+        if etag is None:
+            return get_response(request, *args, **kwargs)
+
+        if last_modified and (
+            timezone.now() - last_modified < timedelta(seconds=1)
+        ):
+            # HTTP dates drop the fractions of seconds, so the changes made
+            # later in the same second would be answered Not Modified
+            last_modified = None
+
+        last_modified = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified,
+        )
+
+        if response is None:
+            response = get_response(request, *args, **kwargs)
+
+        response["ETag"] = etag
+
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+
+class UncachedResponse(Exception):
+    """Carries a response that is returned without being cached"""
+
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+class CachedResponseMixin:
+    """Serve the list and retrieve responses from the response cache,
+    keyed by the URL, the serializer of the action and the ETag, until an
+    instance of the models the responses are built from is saved or
+    deleted"""
+
+    # The models whose changes invalidate the cached responses
+    cache_models = ()
+
+    def get_cache_request_key(self, request):
+        return json.dumps(
+            [
+                # Image URLs are absolute, so the host is part of the key
+                request.build_absolute_uri(request.path),
+                sorted(request.query_params.lists()),
+                self.action,
+                self.get_serializer_class().__name__,
+                self.conditional_etag,
+            ]
+        )
+
+    def get_cached_response(self, get_response, request, *args, **kwargs):
+        response_key = response_cache.response_key(
+            self.get_cache_request_key(request),
+            self.cache_models,
+        )
+
+        def build():
+            response = get_response(request, *args, **kwargs)
+
+            if response.status_code != status.HTTP_200_OK:
+                raise UncachedResponse(response)
+
+            return response.data
+
+        try:
+            data, cache_state = response_cache.get_or_set(response_key, build)
+        except UncachedResponse as error:
+            return error.response
+
+        return Response(data, headers={"X-Cache": cache_state})
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+
+class FlightDetailCacheMixin:
+    """Serve the flight details from two cached parts: the static one,
+    invalidated by the changes of the flight or of the reference data,
+    and the seat occupancy, invalidated by the ticket changes of the
+    flight only and rebuilt from the seat map of the flight alone"""
+
+    static_cache_scopes = (Route, Airport, Airplane, AirplaneType, Crew)
+    # The conditional timestamp of the seats, which keys the seats part,
+    # while the other timestamps key the static part
+    seats_last_modified_field = "seats_updated_at"
+
+    def get_taken_seats(self, flight_id):
+        flight = (
+            Flight.objects.select_related("airplane")
+            .only("seat_map", "airplane__rows", "airplane__seats_in_row")
+            .filter(pk=flight_id)
+            .first()
+        )
+
+        if flight is None:
+            raise NotFound()
+
+        return TicketSeatSerializer(flight.taken_seats, many=True).data
+
+    def retrieve(self, request, *args, **kwargs):
+        flight_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        timestamps = dict(self.conditional_timestamps or {})
+        seats_updated_at = timestamps.pop(self.seats_last_modified_field, None)
+        static_key = response_cache.response_key(
+            # Image URLs are absolute, so the host is part of the key
+            json.dumps(
+                [request.build_absolute_uri("/"), flight_id, timestamps]
+            ),
+            (*self.static_cache_scopes, flight_scope(flight_id)),
+        )
+        seats_key = response_cache.response_key(
+            json.dumps([flight_id, seats_updated_at]),
+            (flight_seats_scope(flight_id),),
+        )
+        built_seats = []
+
+        def build_static():
+            data = super(FlightDetailCacheMixin, self).retrieve(
+                request,
+                *args,
+                **kwargs,
+            ).data
+            built_seats.append(data.pop("taken_seats"))
+            return data
+
+        def build_seats():
+            # Just built along with the static part, if it was rebuilt
+            if built_seats:
+                return built_seats[0]
+
+            return self.get_taken_seats(flight_id)
+
+        static, _ = response_cache.get_or_set(static_key, build_static)
+        taken_seats, _ = response_cache.get_or_set(
+            seats_key,
+            build_seats,
+            settings.FLIGHT_SEATS_CACHE_TTL,
+        )
+        return Response({**static, "taken_seats": taken_seats})
+
 
 class UploadImageMixin:
     @action(
@@ -67,20 +580,35 @@ class UploadImageMixin:
 
 
 @extend_schema(tags=["AirplaneTypes"])
-class AirplaneTypeViewSet(viewsets.ModelViewSet):
+class AirplaneTypeViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    viewsets.ModelViewSet,
+):
     queryset = AirplaneType.objects.all()
     serializer_class = AirplaneTypeSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    cache_models = (AirplaneType,)
 
 
 @extend_schema(tags=["Airplanes"])
-class AirplaneViewSet(UploadImageMixin, viewsets.ModelViewSet):
+class AirplaneViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    UploadImageMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Airplane.objects.select_related("airplane_type")
     serializer_class = AirplaneSerializer
     pagination_class = AirplanePagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ("airplane_type",)
+    sparse_select_related = {"airplane_type": ("airplane_type",)}
+    sparse_only = {"capacity": ("rows", "seats_in_row")}
+    cache_models = (Airplane, AirplaneType)
+    last_modified_fields = ("updated_at", "airplane_type__updated_at")
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -96,7 +624,12 @@ class AirplaneViewSet(UploadImageMixin, viewsets.ModelViewSet):
 
 
 @extend_schema(tags=["Crews"])
-class CrewViewSet(UploadImageMixin, viewsets.ModelViewSet):
+class CrewViewSet(
+    ConditionalGetMixin,
+    SparseQuerysetMixin,
+    UploadImageMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Crew.objects.all()
     serializer_class = CrewSerializer
     pagination_class = CrewPagination
@@ -105,7 +638,7 @@ class CrewViewSet(UploadImageMixin, viewsets.ModelViewSet):
     filterset_fields = ("position",)
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ("list", "available"):
             return CrewListSerializer
 
         if self.action == "retrieve":
@@ -116,15 +649,78 @@ class CrewViewSet(UploadImageMixin, viewsets.ModelViewSet):
 
         return CrewSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "position",
+                type=OpenApiTypes.STR,
+                enum=Crew.CrewPosition.values,
+                description="The position of the crew members (ex. FO)",
+            ),
+            OpenApiParameter(
+                "start",
+                type=OpenApiTypes.DATETIME,
+                required=True,
+                description="The start of the period",
+            ),
+            OpenApiParameter(
+                "end",
+                type=OpenApiTypes.DATETIME,
+                required=True,
+                description="The end of the period",
+            ),
+            OpenApiParameter(
+                "rest_minutes",
+                type=OpenApiTypes.INT,
+                description="The minimum rest time before and after "
+                "the period (0 by default)",
+            ),
+        ],
+    )
+    @action(methods=["GET"], detail=False, url_path="available")
+    def available(self, request):
+        """Endpoint for the crew members without flights in the period,
+        including the rest time around it"""
+        search_serializer = CrewAvailabilitySerializer(
+            data=request.query_params.dict()
+        )
+        search_serializer.is_valid(raise_exception=True)
+        search = search_serializer.validated_data
+        rest = timedelta(minutes=search["rest_minutes"])
+        busy_from = search["start"] - rest
+        busy_until = search["end"] + rest
+        # NOT EXISTS anti-join over the crew index of the through table
+        flights_in_period = FlightCrew.objects.filter(
+            crew=OuterRef("pk"),
+            flight__departure_time__lt=busy_until,
+            flight__departure_time__gt=busy_from - MAX_FLIGHT_DURATION,
+            flight__arrival_time__gt=busy_from,
+        )
+        crews = self.get_queryset().filter(~Exists(flights_in_period))
+
+        if "position" in search:
+            crews = crews.filter(position=search["position"])
+
+        page = self.paginate_queryset(crews)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 @extend_schema(tags=["Airports"])
-class AirportViewSet(UploadImageMixin, viewsets.ModelViewSet):
+class AirportViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    UploadImageMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Airport.objects.all()
     serializer_class = AirportSerializer
     pagination_class = AirportPagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ("city", "country")
+    cache_models = (Airport,)
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -138,15 +734,146 @@ class AirportViewSet(UploadImageMixin, viewsets.ModelViewSet):
 
         return AirportSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "lat",
+                type=OpenApiTypes.FLOAT,
+                required=True,
+                description="Latitude of the point in degrees",
+            ),
+            OpenApiParameter(
+                "lon",
+                type=OpenApiTypes.FLOAT,
+                required=True,
+                description="Longitude of the point in degrees",
+            ),
+            OpenApiParameter(
+                "radius_km",
+                type=OpenApiTypes.FLOAT,
+                description="The search radius in kilometers (200 by default)",
+            ),
+            OpenApiParameter(
+                "limit",
+                type=OpenApiTypes.INT,
+                description="The number of airports (10 by default)",
+            ),
+        ],
+        responses=NearbyAirportSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="nearby")
+    def nearby(self, request):
+        """Endpoint for the airports within the radius
+        of the point, the nearest first"""
+        search_serializer = NearbyAirportSearchSerializer(
+            data=request.query_params.dict()
+        )
+        search_serializer.is_valid(raise_exception=True)
+        search = search_serializer.validated_data
+        nearest = get_airport_index().nearby(
+            search["lat"],
+            search["lon"],
+            search["radius_km"],
+            search["limit"],
+        )
+        airports = self.get_queryset().in_bulk(
+            [airport_id for airport_id, _ in nearest]
+        )
+
+        for airport_id, distance_km in nearest:
+            if airport_id in airports:
+                airports[airport_id].distance_km = round(distance_km, 2)
+
+        serializer = NearbyAirportSerializer(
+            [
+                airports[airport_id]
+                for airport_id, _ in nearest
+                if airport_id in airports
+            ],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "iata",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="Comma-separated IATA codes (ex. KBP,LHR,JFK)",
+            ),
+        ],
+        responses=DistanceMatrixSerializer,
+    )
+    @action(methods=["GET"], detail=False, url_path="distance-matrix")
+    def distance_matrix(self, request):
+        """Endpoint for the distances in kilometers between
+        all pairs of the given airports"""
+        search_serializer = DistanceMatrixSearchSerializer(
+            data=request.query_params.dict()
+        )
+        search_serializer.is_valid(raise_exception=True)
+        iata_codes = search_serializer.validated_data["iata"]
+        coordinates = {
+            iata_code: (latitude, longitude)
+            for iata_code, latitude, longitude in Airport.objects.filter(
+                iata_code__in=iata_codes
+            ).values_list("iata_code", "latitude", "longitude")
+        }
+        unknown_codes = [
+            iata_code
+            for iata_code in iata_codes
+            if iata_code not in coordinates
+        ]
+
+        if unknown_codes:
+            raise ValidationError(
+                {"iata": f"Unknown IATA codes: {', '.join(unknown_codes)}."}
+            )
+
+        latitudes, longitudes = zip(
+            *(coordinates[iata_code] for iata_code in iata_codes)
+        )
+        serializer = DistanceMatrixSerializer(
+            {
+                "iata_codes": iata_codes,
+                "distances_km": distance_matrix(latitudes, longitudes)
+                .round(2)
+                .tolist(),
+            }
+        )
+        return Response(serializer.data)
+
 
 @extend_schema(tags=["Routes"])
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(
+    ConditionalGetMixin,
+    CachedResponseMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Route.objects.select_related("source", "destination")
     serializer_class = RouteSerializer
     pagination_class = RoutePagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_fields = ("source", "destination")
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
+    filterset_fields = {
+        "source": ["exact"],
+        "destination": ["exact"],
+        "distance_km": ["gte", "lte"],
+    }
+    ordering_fields = ("distance_km",)
+    sparse_select_related = {
+        "source": ("source",),
+        "destination": ("destination",),
+    }
+    cache_models = (Route, Airport)
+    last_modified_fields = (
+        "updated_at",
+        "source__updated_at",
+        "destination__updated_at",
+    )
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -159,7 +886,12 @@ class RouteViewSet(viewsets.ModelViewSet):
 
 
 @extend_schema(tags=["Flights"])
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(
+    ConditionalGetMixin,
+    FlightDetailCacheMixin,
+    SparseQuerysetMixin,
+    viewsets.ModelViewSet,
+):
     queryset = (
         Flight.objects
         .select_related(
@@ -168,35 +900,451 @@ class FlightViewSet(viewsets.ModelViewSet):
             "airplane__airplane_type",
         )
         .prefetch_related("crews")
-        .annotate(
-            tickets_available=(
-                F("airplane__rows") * F("airplane__seats_in_row")
-                - Count("tickets")
-            )
-        )
     )
     serializer_class = FlightSerializer
     pagination_class = FlightPagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_fields = ("route", "departure_time", "arrival_time")
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
+    filterset_fields = {
+        "route": ["exact"],
+        "departure_time": ["exact"],
+        "arrival_time": ["exact"],
+        "seats_available": ["exact", "gte", "lte"],
+    }
+    ordering_fields = ("departure_time", "arrival_time", "seats_available")
+    ordering = ("-departure_time", "-id")
+    # The actions ordering their own queryset, in both pagination modes
+    action_orderings = {"search": ("departure_time", "id")}
+    sparse_fieldset_actions = ("list", "search")
+    sparse_select_related = {
+        "route": ("route__source", "route__destination"),
+        "airplane_name": ("airplane",),
+        "airplane_capacity": ("airplane",),
+        "airplane": ("airplane__airplane_type",),
+    }
+    sparse_prefetch_related = {"crews": ("crews",)}
+    # The aggregate would scan all the filtered flights of a list,
+    # which the cursor pagination is there to avoid
+    conditional_actions = ("retrieve",)
+    # Crew assignments touch updated_at of the flight,
+    # and seat changes its seats_updated_at
+    last_modified_fields = (
+        "updated_at",
+        "seats_updated_at",
+        "route__updated_at",
+        "route__source__updated_at",
+        "route__destination__updated_at",
+        "airplane__updated_at",
+        "airplane__airplane_type__updated_at",
+        "crews__updated_at",
+    )
+
+    def get_queryset(self):
+        if self.action in (
+            "seat_map",
+            "hold_seats",
+            "release_seats_hold",
+            "allocate_seats",
+        ):
+            return Flight.objects.select_related("airplane").only(
+                "seat_map",
+                "airplane__rows",
+                "airplane__seats_in_row",
+            )
+
+        return super(FlightViewSet, self).get_queryset()
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ("list", "search"):
             return FlightListSerializer
 
         if self.action == "retrieve":
             return FlightDetailSerializer
 
+        if self.action == "seat_map":
+            return FlightSeatMapSerializer
+
+        if self.action == "hold_seats":
+            return SeatHoldSerializer
+
+        if self.action == "allocate_seats":
+            return SeatAllocationSerializer
+
         return FlightSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "source",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="IATA code of the departure airport (ex. KBP)",
+            ),
+            OpenApiParameter(
+                "destination",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="IATA code of the arrival airport (ex. LHR)",
+            ),
+            OpenApiParameter(
+                "date_from",
+                type=OpenApiTypes.DATE,
+                required=True,
+                description="The first departure date",
+            ),
+            OpenApiParameter(
+                "date_to",
+                type=OpenApiTypes.DATE,
+                description="The last departure date (date_from by default)",
+            ),
+            OpenApiParameter(
+                "min_seats",
+                type=OpenApiTypes.INT,
+                description="The minimum number of available seats",
+            ),
+        ],
+        responses=FlightListSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="search")
+    def search(self, request):
+        """Endpoint for searching flights between two airports
+        departing within a date window"""
+        search_serializer = FlightSearchSerializer(
+            data=request.query_params.dict()
+        )
+        search_serializer.is_valid(raise_exception=True)
+        search = search_serializer.validated_data
+        routes = Route.objects.filter(
+            source__iata_code=search["source"],
+            destination__iata_code=search["destination"],
+        )
+        flights = (
+            self.get_queryset()
+            .filter(
+                route__in=routes,
+                departure_time__gte=timezone.make_aware(
+                    datetime.combine(search["date_from"], time.min)
+                ),
+                departure_time__lt=timezone.make_aware(
+                    datetime.combine(
+                        search["date_to"] + timedelta(days=1),
+                        time.min,
+                    )
+                ),
+                seats_available__gte=search["min_seats"],
+            )
+            .order_by(*self.action_orderings["search"])
+        )
+
+        page = self.paginate_queryset(flights)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "source",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="IATA code of the departure airport (ex. KBP)",
+            ),
+            OpenApiParameter(
+                "destination",
+                type=OpenApiTypes.STR,
+                required=True,
+                description="IATA code of the arrival airport (ex. LHR)",
+            ),
+            OpenApiParameter(
+                "date_from",
+                type=OpenApiTypes.DATE,
+                required=True,
+                description="The first departure date",
+            ),
+            OpenApiParameter(
+                "date_to",
+                type=OpenApiTypes.DATE,
+                description="The last departure date (date_from by default)",
+            ),
+            OpenApiParameter(
+                "min_seats",
+                type=OpenApiTypes.INT,
+                description="The minimum number of available seats",
+            ),
+            OpenApiParameter(
+                "max_legs",
+                type=OpenApiTypes.INT,
+                description="The maximum number of flights (3 by default)",
+            ),
+            OpenApiParameter(
+                "min_connection",
+                type=OpenApiTypes.INT,
+                description="The minimum connection time in minutes "
+                "(60 by default)",
+            ),
+            OpenApiParameter(
+                "max_connection",
+                type=OpenApiTypes.INT,
+                description="The maximum connection time in minutes "
+                "(1440 by default)",
+            ),
+            OpenApiParameter(
+                "limit",
+                type=OpenApiTypes.INT,
+                description="The number of itineraries (10 by default)",
+            ),
+        ],
+        responses=ConnectionSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="connections")
+    def connections(self, request):
+        """Endpoint for the earliest arriving itineraries between
+        two airports, including the ones with connecting flights"""
+        search_serializer = ConnectionSearchSerializer(
+            data=request.query_params.dict()
+        )
+        search_serializer.is_valid(raise_exception=True)
+        search = search_serializer.validated_data
+        airports = dict(
+            Airport.objects.filter(
+                iata_code__in=(search["source"], search["destination"])
+            ).values_list("iata_code", "id")
+        )
+
+        if len(airports) < 2:
+            return Response([])
+
+        itineraries = find_connections(
+            source_id=airports[search["source"]],
+            destination_id=airports[search["destination"]],
+            departure_after=timezone.make_aware(
+                datetime.combine(search["date_from"], time.min)
+            ),
+            departure_before=timezone.make_aware(
+                datetime.combine(search["date_to"], time.max)
+            ),
+            max_legs=search["max_legs"],
+            min_connection=timedelta(minutes=search["min_connection"]),
+            max_connection=timedelta(minutes=search["max_connection"]),
+            seats=search["min_seats"],
+            limit=search["limit"],
+        )
+        flights = self.get_queryset().in_bulk(
+            {flight_id for legs in itineraries for flight_id in legs}
+        )
+        connections = [
+            {
+                "departure_time": flights[legs[0]].departure_time,
+                "arrival_time": flights[legs[-1]].arrival_time,
+                "legs": [flights[flight_id] for flight_id in legs],
+            }
+            for legs in itineraries
+            if all(flight_id in flights for flight_id in legs)
+        ]
+
+        serializer = ConnectionSerializer(connections, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "encoding",
+                type=OpenApiTypes.STR,
+                enum=SEAT_MAP_ENCODINGS,
+                description=(
+                    "base64 of the occupancy bitset (default) "
+                    "or run lengths of alternating free/taken seats"
+                ),
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=True, url_path="seat-map")
+    def seat_map(self, request, pk=None):
+        """Endpoint for the compact seat occupancy map of the flight"""
+        encoding = request.query_params.get("encoding", "base64")
+
+        if encoding not in SEAT_MAP_ENCODINGS:
+            raise ValidationError(
+                {
+                    "encoding": "Must be one of "
+                    f"{', '.join(SEAT_MAP_ENCODINGS)}."
+                }
+            )
+
+        serializer = self.get_serializer(
+            self.get_object(),
+            context={**self.get_serializer_context(), "encoding": encoding},
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="holds",
+        permission_classes=[IsAuthenticated],
+    )
+    def hold_seats(self, request, pk=None):
+        """Endpoint for holding seats of the flight for a short time"""
+        serializer = self.get_serializer(
+            data=request.data,
+            context={
+                **self.get_serializer_context(),
+                "flight": self.get_object(),
+            },
+        )
+
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        methods=["DELETE"],
+        detail=True,
+        url_path=r"holds/(?P<hold_id>[0-9a-f]+)",
+        permission_classes=[IsAuthenticated],
+    )
+    def release_seats_hold(self, request, pk=None, hold_id=None):
+        """Endpoint for releasing the seats held for the flight"""
+        hold = get_hold(hold_id)
+
+        if (
+            hold is None
+            or hold["user"] != request.user.id
+            or str(hold["flight"]) != pk
+        ):
+            raise NotFound()
+
+        release_hold(hold)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter("passengers", type=OpenApiTypes.INT),
+            OpenApiParameter("together", type=OpenApiTypes.BOOL),
+            OpenApiParameter("window", type=OpenApiTypes.BOOL),
+            OpenApiParameter("front", type=OpenApiTypes.BOOL),
+        ],
+        methods=["GET"],
+    )
+    @extend_schema(request=SeatAllocationSerializer, methods=["POST"])
+    @action(
+        methods=["GET", "POST"],
+        detail=True,
+        url_path="allocate-seats",
+        permission_classes=[IsAuthenticated],
+    )
+    def allocate_seats(self, request, pk=None):
+        """Endpoint for finding (GET) or booking (POST)
+        the best free seats for a party of passengers"""
+        serializer = self.get_serializer(
+            data=(
+                request.query_params.dict()
+                if request.method == "GET"
+                else request.data
+            ),
+            context={
+                **self.get_serializer_context(),
+                "flight": self.get_object(),
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+
+        if request.method == "GET":
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        order_serializer = OrderSerializer(
+            data={
+                "tickets": [
+                    {"flight": pk, **seat}
+                    for seat in serializer.validated_data["seats"]
+                ]
+            },
+            context=self.get_serializer_context(),
+        )
+        order_serializer.is_valid(raise_exception=True)
+        order_serializer.save(user=request.user)
+        return Response(order_serializer.data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(tags=["FlightSchedules"])
+class FlightScheduleViewSet(viewsets.ModelViewSet):
+    queryset = FlightSchedule.objects.select_related(
+        "route",
+        "airplane",
+    ).prefetch_related("crews")
+    serializer_class = FlightScheduleSerializer
+    permission_classes = (IsAdminUser,)
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = ("route", "airplane")
+
+    def get_queryset(self):
+        # The flights of all the schedules of the page counted at once
+        return self.queryset.annotate(flights_count=Count("flights"))
+
+    def perform_create(self, serializer):
+        schedule = serializer.save()
+        # A new schedule has no flights until it is materialized
+        schedule.flights_count = 0
+
+    @extend_schema(request=None, responses=FlightScheduleSerializer)
+    @action(methods=["POST"], detail=True, url_path="materialize")
+    def materialize(self, request, pk=None):
+        """Endpoint for creating the missing flights of the schedule"""
+        created = materialize_schedule(
+            self.get_object(),
+            error_to_raise=ValidationError,
+        )
+        # Fetched again to count the created flights
+        serializer = self.get_serializer(self.get_object())
+
+        return Response(
+            {**serializer.data, "created_flights": created},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
 
+@extend_schema_view(
+    create=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "async",
+                type=OpenApiTypes.BOOL,
+                description=(
+                    "Queue the order and return its job (202) "
+                    "instead of booking it right away"
+                ),
+            ),
+            OpenApiParameter(
+                IDEMPOTENCY_KEY_HEADER,
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description=(
+                    "A unique key of the request: retries with the same key "
+                    "get the original response replayed"
+                ),
+            ),
+        ],
+    ),
+)
 @extend_schema(tags=["Orders"])
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(
+    IdempotentCreateMixin,
+    AsyncOrderCreateMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Order.objects.prefetch_related(
-        "tickets__flight__airplane",
-        "tickets__flight__crews",
-        "tickets__flight__route",
+        "tickets",
+        # One flight query for all the tickets of the page, carrying
+        # the route airports and the airplane rendered by the list
+        Prefetch(
+            "tickets__flight",
+            queryset=Flight.objects.select_related(
+                "route__source",
+                "route__destination",
+                "airplane",
+            )
+            .prefetch_related("crews")
+            .defer("seat_map"),
+        ),
     )
     serializer_class = OrderSerializer
     pagination_class = OrderPagination
@@ -211,7 +1359,68 @@ class OrderViewSet(viewsets.ModelViewSet):
         if self.action == "list":
             return OrderListSerializer
 
+        if self.action == "job_status":
+            return OrderJobSerializer
+
         return OrderSerializer
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path=r"jobs/(?P<job_id>\d+)",
+    )
+    def job_status(self, request, job_id=None):
+        """Endpoint for polling the status of a queued order"""
+        job = get_object_or_404(OrderJob, pk=job_id, user=request.user)
+        serializer = self.get_serializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+async def flight_seats_stream(request, pk):
+    """Server-Sent Events stream of the seats available on the flight.
+
+    It is a plain async view, as DRF views are synchronous and would hold
+    a thread for the whole lifetime of the stream under ASGI.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI, Django reads an async streaming response to its end
+        # before sending it, and the stream never ends
+        return JsonResponse(
+            {"detail": "The seat stream is only served over ASGI."},
+            status=501,
+        )
+
+    try:
+        authentication = await sync_to_async(
+            JWTAuthentication().authenticate
+        )(request)
+    except AuthenticationFailed as error:
+        return JsonResponse({"detail": str(error.detail)}, status=401)
+
+    if authentication is None:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=401,
+        )
+
+    seats_available = await Flight.objects.filter(pk=pk).values_list(
+        "seats_available",
+        flat=True,
+    ).afirst()
+
+    if seats_available is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    response = StreamingHttpResponse(
+        stream_seats(pk, seats_available),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
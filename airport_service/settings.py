@@ -95,6 +95,102 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    # The seat holds: a shared cache, such as the Redis of docker-compose,
+    # whenever several processes serve the API, as a hold made in the
+    # local memory of one process is not seen by the others
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
+    # The responses of the reference data endpoints: an in-process LRU
+    # by default, or a shared cache to build each response once for all
+    # the workers. The responses are keyed by the ETag of their request,
+    # so a change made by another worker is never served from it
+    "responses": {
+        "BACKEND": os.environ.get(
+            "RESPONSE_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("RESPONSE_CACHE_LOCATION", "responses"),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(
+                os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 10000)
+            ),
+        },
+    },
+}
+
+RESPONSE_CACHE_ALIAS = "responses"
+
+# How long (in seconds) the responses of the reference data are cached
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+
+# How long (in seconds) the seat occupancy of the flight details is cached,
+# keyed by the time of the last seat change of the flight
+FLIGHT_SEATS_CACHE_TTL = int(os.environ.get("FLIGHT_SEATS_CACHE_TTL", 5))
+
+# How long (in seconds) an expired response is still served while a single
+# worker rebuilds it, how long that worker holds the rebuild lock at most,
+# and how long the workers without a stale copy wait for the rebuilt one
+RESPONSE_CACHE_STALE_TTL = int(
+    os.environ.get("RESPONSE_CACHE_STALE_TTL", 60)
+)
+RESPONSE_CACHE_LOCK_TIMEOUT = int(
+    os.environ.get("RESPONSE_CACHE_LOCK_TIMEOUT", 10)
+)
+RESPONSE_CACHE_LOCK_WAIT = float(
+    os.environ.get("RESPONSE_CACHE_LOCK_WAIT", 2)
+)
+
+# The longest flight allowed, which bounds the crew and airplane
+# double-booking lookups
+MAX_FLIGHT_DURATION_HOURS = int(
+    os.environ.get("MAX_FLIGHT_DURATION_HOURS", 24)
+)
+
+# How long (in seconds) seats stay held for a checkout
+SEAT_HOLD_TTL = int(os.environ.get("SEAT_HOLD_TTL", 300))
+
+# How many seats a single hold may take, and how many holds
+# a user may have active at once
+SEAT_HOLD_MAX_SEATS = int(os.environ.get("SEAT_HOLD_MAX_SEATS", 10))
+SEAT_HOLD_MAX_PER_USER = int(os.environ.get("SEAT_HOLD_MAX_PER_USER", 3))
+
+# How often (in seconds) the in-memory connection index is rebuilt
+# to pick up the flight changes made by other processes
+CONNECTION_INDEX_TTL = int(os.environ.get("CONNECTION_INDEX_TTL", 300))
+
+# How many days ahead the connection index holds the upcoming flights,
+# so the connections departing later than that are not found
+CONNECTION_INDEX_HORIZON_DAYS = int(
+    os.environ.get("CONNECTION_INDEX_HORIZON_DAYS", 365)
+)
+
+# How often (in seconds) the in-memory airport spatial index is rebuilt
+# to pick up the airport changes made by other processes
+AIRPORT_INDEX_TTL = int(os.environ.get("AIRPORT_INDEX_TTL", 300))
+
+# How often (in seconds) the seat streams of a worker poll the watched
+# flights for the seat changes made by other processes, and how long
+# an idle stream waits before sending a keep-alive comment
+SEAT_STREAM_POLL_INTERVAL = float(
+    os.environ.get("SEAT_STREAM_POLL_INTERVAL", 2)
+)
+SEAT_STREAM_HEARTBEAT_INTERVAL = float(
+    os.environ.get("SEAT_STREAM_HEARTBEAT_INTERVAL", 15)
+)
+
+# How long (in seconds) the responses of Idempotency-Key requests are replayed
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 